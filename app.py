@@ -1,15 +1,37 @@
 # Flask application for patient triage system
-from flask import Flask, render_template, jsonify, request
+import time
+IMPORT_STARTED = time.perf_counter()
+
+from flask import Flask, Response, g, render_template, jsonify, request, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-from model import generate_triage, generate_treatment_plan
-from pymongo import MongoClient
+from model import (
+    client_status as model_client_status, generate_assessment, generate_treatment_plan,
+    get_model_call_stats, gemini_breaker, triage_cache
+)
+from triage_rules import get_rule_stats, record_retriage, rule_based_triage, rule_based_triage_batch
+from triage_worker import TriageWorkerPool
+from intake import build_patient_record, build_patient_update, model_inputs, triage_key
+from patient_queries import (
+    DEFAULT_EXPORT_COLUMNS, MAX_PAGE_SIZE, apply_cursor, build_patient_filter,
+    build_projection, encode_cursor, ensure_patient_indexes, iter_csv, iter_ndjson,
+    parse_page_size, sort_order
+)
+from pymongo import MongoClient, ReturnDocument
+import os
+import threading
 from datetime import datetime, timedelta
-from busyness_predictor import BusynessPredictor
-import requests
+from geolocation import get_location_stats, lookup_location
+from reference_options import OptionsCache, VALID_CATEGORIES, seed_reference_options
+from patient_events import RESYNC, PatientEventBus, format_sse, serialize
+from patient_queue import PatientPriorityQueue
 import pytz
 from bson import ObjectId
+from pymongo.errors import BulkWriteError
+from concurrent.futures import ThreadPoolExecutor
 import json
-from map import find_nearest_emergency_rooms
+from map import client_status as maps_client_status, find_nearest_emergency_rooms, get_emergency_room_stats
+import metrics
 
 # Custom JSON encoder to handle ObjectId
 class MongoJSONEncoder(json.JSONEncoder):
@@ -18,84 +40,140 @@ class MongoJSONEncoder(json.JSONEncoder):
             return str(obj)
         return super().default(obj)
 
+# JSON responses with serialization time recorded as a metrics stage
+class TimedJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        with metrics.timed('json_serialize'):
+            return super().dumps(obj, **kwargs)
+
 # Initialize Flask app with CORS support
 app = Flask(__name__)
 app.json_encoder = MongoJSONEncoder
+app.json = TimedJSONProvider(app)
 CORS(app)
 
-# Reference options for multi-select fields
-reference_options = {
-    "allergies": [
-        "Penicillin", "Latex", "Peanuts", "Shellfish", "Dairy", 
-        "Eggs", "Soy", "Tree Nuts", "Wheat/Gluten"
-    ],
-    "substance_use": ["Alcohol", "Tobacco", "Recreational Drugs"],
-    "family_history": [
-        "Heart Disease", "Diabetes", "Cancer", "High Blood Pressure", 
-        "Stroke", "Mental Health Conditions", "Asthma", "Arthritis"
-    ],
-    "symptoms": [
-        "Fever", "Cough", "Shortness of breath", "Fatigue", "Headache", 
-        "Muscle aches", "Sore throat", "Loss of taste/smell", "Nausea", "Diarrhea"
-    ]
-}
-
-# Reference options for multi-select fields
-reference_options = {
-    "allergies": [
-        "Penicillin", "Latex", "Peanuts", "Shellfish", "Dairy", 
-        "Eggs", "Soy", "Tree Nuts", "Wheat/Gluten"
-    ],
-    "substance_use": ["Alcohol", "Tobacco", "Recreational Drugs"],
-    "family_history": [
-        "Heart Disease", "Diabetes", "Cancer", "High Blood Pressure", 
-        "Stroke", "Mental Health Conditions", "Asthma", "Arthritis"
-    ],
-    "symptoms": [
-        "Fever", "Cough", "Shortness of breath", "Fatigue", "Headache", 
-        "Muscle aches", "Sore throat", "Loss of taste/smell", "Nausea", "Diarrhea"
-    ]
-}
+# Requests slower than this print their per-stage breakdown (0 disables)
+SLOW_REQUEST_MS = float(os.getenv('SLOW_REQUEST_MS', '0'))
 
-# MongoDB connection setup 
-try:
-    # Connect to local MongoDB instance
-    client = MongoClient("mongodb://localhost:27017/")
-    
-    # Create or get the database
-    db = client["patientdb"]
-    
-    # Create or get the collection
-    if "patients" not in db.list_collection_names():
-        patients_collection = db.create_collection("patients")
-        print("Created new patients collection")
-    else:
-        patients_collection = db["patients"]
-    
-    # Create or update reference options collection
-    if "reference_options" not in db.list_collection_names():
-        reference_options_collection = db.create_collection("reference_options")
-        print("Created new reference_options collection")
-    else:
-        reference_options_collection = db["reference_options"]
-        
-    # Insert reference options if collection is empty
-    if reference_options_collection.count_documents({}) == 0:
-        for category, options in reference_options.items():
-            reference_options_collection.insert_one({
-                "category": category,
-                "options": options
-            })
-        print("Inserted reference options into database")
-    
-    # Verify connection
-    client.admin.command('ping')
-    print("Successfully connected to MongoDB and initialized database")
-    
-except Exception as e:
-    print("MongoDB connection/initialization error:", str(e))
-    print("Please ensure MongoDB is running on localhost:27017")
-    raise Exception("Failed to initialize MongoDB. Application cannot start without database connection.")
+@app.before_request
+def start_request_metrics():
+    g.metrics_start = time.perf_counter()
+    g.metrics_token = metrics.begin_request()
+
+# Milliseconds from the start of importing this module, reported by /healthz
+startup_timings = {"import_ms": None, "first_request_ms": None}
+
+@app.after_request
+def record_request_metrics(response):
+    if startup_timings["first_request_ms"] is None:
+        startup_timings["first_request_ms"] = round((time.perf_counter() - IMPORT_STARTED) * 1000, 1)
+        print(f"First request served {startup_timings['first_request_ms']} ms after import started")
+    metrics.record_request(
+        request.endpoint, request.method, request.path, response.status_code,
+        time.perf_counter() - g.metrics_start, metrics.end_request(g.pop('metrics_token')),
+        SLOW_REQUEST_MS
+    )
+    return response
+
+@app.teardown_request
+def reset_request_metrics(exc):
+    # after_request is skipped when a view raises
+    token = g.pop('metrics_token', None)
+    if token is not None:
+        metrics.end_request(token)
+
+# MongoDB setup runs on the first request that needs it (see init_db), so
+# importing this module or forking workers opens no connections
+MONGO_URI = os.getenv('MONGO_URI', "mongodb://localhost:27017/")
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+
+mongo_client = None
+db = None
+patients_collection = None
+options_cache = None
+_db_lock = threading.Lock()
+_db_error = None
+
+# Live patient changes for SSE subscribers, from a change stream when available
+patient_events = PatientEventBus()
+
+# In-memory queue of waiting patients, rebuilt from Mongo and kept current from events
+patient_queue = PatientPriorityQueue(
+    aging_minutes_per_level=float(os.getenv('QUEUE_AGING_MINUTES_PER_LEVEL', '60')),
+    max_aging_levels=float(os.getenv('QUEUE_MAX_AGING_LEVELS', '2'))
+)
+patient_events.add_listener(patient_queue.handle_event)
+
+def init_db():
+    """
+    Connect to MongoDB and prepare collections, indexes, the options cache and
+    the in-memory queue. Runs once per process; safe to call repeatedly and
+    retried on the next call if it failed.
+    """
+    global mongo_client, db, patients_collection, options_cache, _db_error
+    if patients_collection is not None:
+        return
+    with _db_lock:
+        if patients_collection is not None:
+            return
+        client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS)
+        try:
+            client.admin.command('ping')
+            database = client["patientdb"]
+
+            # Insert any missing reference option categories
+            reference_options_collection = database["reference_options"]
+            if seed_reference_options(reference_options_collection):
+                print("Inserted reference options into database")
+
+            # Indexes backing filtered/paginated patient listing (creates the collection if needed)
+            patients = database["patients"]
+            ensure_patient_indexes(patients)
+            patient_queue.rebuild(patients)
+
+            # Optionally persist the triage response cache so it survives restarts
+            if os.getenv('TRIAGE_CACHE_MONGO', 'false').lower() in ('1', 'true', 'yes'):
+                triage_cache.attach_collection(database["triage_cache"])
+                print("Triage cache persistent tier enabled")
+        except Exception as e:
+            _db_error = str(e)
+            print("MongoDB connection/initialization error:", str(e))
+            client.close()
+            raise
+
+        # Watchers start only once everything above succeeded, so a retry never doubles them
+        cache = OptionsCache(reference_options_collection)
+        cache.watch_changes()
+        patient_events.watch_collection(patients)
+        if TRIAGE_RECOVERY_INTERVAL_SECONDS > 0:
+            schedule_triage_recovery(TRIAGE_RECOVERY_INTERVAL_SECONDS)
+        if BUSYNESS_RETRAIN_INTERVAL_HOURS > 0:
+            from busyness_training import schedule_retraining  # pandas/scikit-learn
+            schedule_retraining(database, BUSYNESS_MODEL_PATH, BUSYNESS_RETRAIN_INTERVAL_HOURS * 3600)
+
+        mongo_client, db, options_cache = client, database, cache
+        _db_error = None
+        # Set last: routes treat a non-None patients_collection as initialized
+        patients_collection = patients
+        print("Successfully connected to MongoDB and initialized database")
+
+# Endpoints that must answer without the database
+NO_DB_ENDPOINTS = {'healthz', 'readyz', 'get_metrics', 'static'}
+
+@app.before_request
+def ensure_db():
+    if patients_collection is not None or request.endpoint in NO_DB_ENDPOINTS:
+        return None
+    try:
+        init_db()
+    except Exception:
+        return jsonify({
+            "status": "error",
+            "message": "Database unavailable"
+        }), 503
+
+# How long browsers may reuse reference options before revalidating
+OPTIONS_MAX_AGE_SECONDS = int(os.getenv('OPTIONS_MAX_AGE_SECONDS', '60'))
 
 # Route for landing page
 @app.route('/')
@@ -112,32 +190,47 @@ def post_data():
     data = request.json
     return jsonify({"received": data, "status": "success"})
 
+def options_response(payload, etag):
+    """JSON response with ETag/Cache-Control that answers If-None-Match with 304"""
+    response = jsonify(payload)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f'public, max-age={OPTIONS_MAX_AGE_SECONDS}'
+    return response.make_conditional(request)
+
+# API endpoint to get all reference options in one response
+@app.route('/api/options', methods=['GET'])
+def get_all_options():
+    """Get predefined options for every dropdown/checkbox field."""
+    try:
+        options, etag = options_cache.get_all()
+        return options_response({
+            "status": "success",
+            "options": options
+        }, etag)
+
+    except Exception as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 500
+
 # API endpoint to get reference options  
 @app.route('/api/options/<category>', methods=['GET'])
 def get_options(category):
     """Get predefined options for dropdown/checkbox fields."""
     try:
         # Check if category is valid
-        valid_categories = ['allergies', 'substance_use', 'family_history', 'symptoms']
-        if category not in valid_categories:
+        if category not in VALID_CATEGORIES:
             return jsonify({
                 "status": "error", 
                 "message": f"Invalid category: {category}"
             }), 400
-            
-        # Get options from database
-        option_data = reference_options_collection.find_one({"category": category})
-        
-        if option_data:
-            options = option_data.get("options", [])
-        else:
-            # Fallback to hardcoded options if not in database
-            options = reference_options.get(category, [])
-            
-        return jsonify({
+
+        options, etag = options_cache.get(category)
+        return options_response({
             "status": "success",
             "options": options
-        })
+        }, etag)
         
     except Exception as e:
         return jsonify({
@@ -145,6 +238,130 @@ def get_options(category):
             "message": str(e)
         }), 500
 
+def triage_fields(treatment_plan, timings, assessment=None):
+    """
+    Fields to $set on the patient record once the model calls are done
+    Args:
+        treatment_plan (str): Generated treatment plan
+        timings (dict): Model call timings in milliseconds
+        assessment (dict): model.generate_assessment result, or None if the local rules already set the ESI
+    """
+    fields = {"triageTimings": timings}
+    if assessment is not None:
+        fields.update({
+            "priority": assessment["esi"],
+            "esi": str(assessment["esi"]),
+            "esi_explanation": assessment["explanation"],
+            "triageSource": assessment["source"],
+            "triageUsage": assessment["usage"]
+        })
+
+    # A fallback estimate stays provisional so the next update or the recovery sweep re-triages it
+    provisional = assessment is not None and assessment["source"] == "fallback"
+    fields.update({
+        "treatmentPlan": treatment_plan,
+        "triage_status": "provisional" if provisional else "complete",
+        "triageCompletedAt": datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
+    })
+    return fields
+
+def compute_triage_fields(inputs, esi_settled=False):
+    """
+    Run the model calls for one patient
+    Args:
+        inputs (list): Model inputs as returned by intake.model_inputs
+        esi_settled (bool): True if the local rules already set the ESI
+    Returns:
+        dict: Fields to $set on the patient record
+    """
+    if esi_settled:
+        # ESI already settled by the local rules, only the plan is needed
+        start = time.perf_counter()
+        treatment_plan = generate_treatment_plan(*inputs)
+        plan_ms = round((time.perf_counter() - start) * 1000, 1)
+        return triage_fields(treatment_plan, {"treatment_plan_ms": plan_ms, "total_ms": plan_ms})
+
+    assessment = generate_assessment(*inputs, use_rules=False)
+    return triage_fields(assessment["treatment_plan"], assessment["timings"], assessment)
+
+def run_triage_job(patient_id, job):
+    """Fill in the triage fields of a patient inserted as pending_triage"""
+    # Results are only written while the patient still has the inputs this job triages
+    query = {'_id': ObjectId(patient_id)}
+    if job.get('triage_key'):
+        query['triageKey'] = job['triage_key']
+    patients_collection.update_one(query, {'$set': {'triage_status': 'in_progress'}})
+
+    try:
+        fields = compute_triage_fields(job['model_inputs'], esi_settled=bool(job.get('esi')))
+    except Exception as e:
+        patients_collection.update_one(
+            query,
+            {'$set': {'triage_status': 'failed', 'triage_error': str(e)}}
+        )
+        raise
+
+    with metrics.timed('mongo_update'):
+        if 'priority' in fields:
+            # A priority set by hand (priorityOverride) is kept; only the ESI is refreshed
+            result = patients_collection.update_one({**query, 'priorityOverride': {'$ne': True}}, {'$set': fields})
+            if not result.matched_count:
+                fields.pop('priority')
+        if 'priority' not in fields:
+            result = patients_collection.update_one(query, {'$set': fields})
+    if result.matched_count:  # Patient may have been relocated or re-triaged meanwhile
+        patient_events.publish('update', patient_id, fields=serialize(fields))
+    print(f"Triage complete for patient {patient_id}:", fields["triageTimings"])
+
+def run_triage_inline(patient_id, job):
+    """
+    run_triage_job in the request thread, for when the queue is full
+    Returns:
+        bool: False if triage failed; the stored patient is left as the job left it
+    """
+    try:
+        run_triage_job(patient_id, job)
+        return True
+    except Exception as e:
+        print(f"Inline triage of patient {patient_id} failed: {str(e)}")
+        return False
+
+# Limits for bulk intake
+BATCH_MAX_SIZE = int(os.getenv('BATCH_MAX_SIZE', '200'))
+BATCH_MAX_PARALLEL = int(os.getenv('BATCH_MAX_PARALLEL', '8'))
+
+# Comment sent on idle SSE connections so proxies and clients keep them open
+SSE_HEARTBEAT_SECONDS = float(os.getenv('SSE_HEARTBEAT_SECONDS', '15'))
+
+# Documents fetched per cursor round trip when exporting
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '1000'))
+
+# Background pool that triages patients after the intake request has returned
+triage_pool = TriageWorkerPool(
+    run_triage_job,
+    num_workers=int(os.getenv('TRIAGE_WORKERS', '4')),
+    max_queue_size=int(os.getenv('TRIAGE_QUEUE_MAX', '500'))
+)
+
+# Triages to redo: a provisional estimate written while the model was unavailable, or a failed job.
+# The next update that touches triage re-queues them, and so does a sweep of waiting patients
+# every TRIAGE_RECOVERY_INTERVAL_SECONDS (0 = off) while the Gemini breaker is closed
+RETRY_TRIAGE_STATUSES = ('provisional', 'failed')
+TRIAGE_RECOVERY_INTERVAL_SECONDS = float(os.getenv('TRIAGE_RECOVERY_INTERVAL_SECONDS', '300'))
+TRIAGE_RECOVERY_BATCH = int(os.getenv('TRIAGE_RECOVERY_BATCH', '50'))
+
+# Existing cache/queue/counter stats, exported as gauges on /metrics
+metrics.register_gauges('triage_cache', 'Triage response cache', triage_cache.stats)
+metrics.register_gauges('gemini_breaker', 'Gemini circuit breaker', gemini_breaker.stats)
+metrics.register_gauges('triage_fast_path', 'Local ESI rules', get_rule_stats)
+metrics.register_gauges('triage_queue', 'Background triage queue', triage_pool.stats)
+metrics.register_gauges('patient_queue', 'Waiting-patient priority queue', patient_queue.stats)
+metrics.register_gauges('location_cache', 'IP location cache', get_location_stats)
+metrics.register_gauges('emergency_room_cache', 'Nearest-ER cache', get_emergency_room_stats)
+metrics.register_gauges(
+    'patient_stream', 'Live patient stream', lambda: {"subscribers": patient_events.subscriber_count()}
+)
+
 # Main patient data endpoint - handles both GET and POST requests
 @app.route('/api/patients', methods=['GET', 'POST'])
 def patient_data():
@@ -153,122 +370,22 @@ def patient_data():
             post_data = request.get_json()
             print("Received data:", post_data)  # Debug print
             
-            # Extract personal information
-            firstName = post_data.get('firstName')
-            lastName = post_data.get('lastName')
-            age = post_data.get('age')
-            dateOfBirth = post_data.get('dateOfBirth')
-            phoneNumber = post_data.get('phoneNumber')
-            timeEntered = datetime.now().strftime("%Y-%m-%dT%H:%M:%S")  # ISO format for frontend
-            dateOfVisit = datetime.now().strftime("%Y-%m-%d")
-            
-            # Extract vitals information
-            vitals = post_data.get('vitals', {})
-            
-            # Process blood pressure specially if it's in the structured format
-            if vitals.get('bloodPressure') and isinstance(vitals['bloodPressure'], dict):
-                bp_systolic = vitals['bloodPressure'].get('systolic')
-                bp_diastolic = vitals['bloodPressure'].get('diastolic')
-                if bp_systolic and bp_diastolic:
-                    bloodPressure = f"{bp_systolic}/{bp_diastolic}"
-                else:
-                    bloodPressure = "N/A"
-            else:
-                bloodPressure = "N/A"
-
-            # Process symptoms
-            symptoms = post_data.get('symptoms', {})
-            symptom_text = ""
-            if symptoms:
-                # Check if symptoms is a string or object
-                if isinstance(symptoms, str):
-                    symptom_text = symptoms
-                else:
-                    selected_symptoms = symptoms.get('selected', [])
-                    notes = symptoms.get('notes', '')
-                    if isinstance(selected_symptoms, list):
-                        symptom_text = ", ".join(selected_symptoms)
-                    else:
-                        symptom_text = str(selected_symptoms)
-                    
-                    if notes:
-                        symptom_text += f". Additional notes: {notes}"
-
-            # Extract additional fields
-            allergies = post_data.get('allergies', [])
-            medications = post_data.get('medications', [])
-            medicalHistory = post_data.get('medicalHistory', [])
-            notes = post_data.get('notes', '')
-            
-            # Extract multi-select fields
-            substance_use = post_data.get('substance_use', [])
-            family_history = post_data.get('family_history', [])
+            # Normalize the form payload (vitals, blood pressure, symptom text)
+            patient_record = build_patient_record(post_data)
+            inputs = model_inputs(patient_record)
 
-            try:
-                # Generate ESI
-                model_response = generate_triage(
-                    vitals.get('temperature'), 
-                    vitals.get('pulse'), 
-                    vitals.get('respirationRate'), 
-                    bloodPressure, 
-                    symptom_text
-                ).split(" - ")
-                esi_number = ''.join(c for c in model_response[0] if c.isdigit())
-                esi_explanation = model_response[1]
-            except Exception as e:
-                print("Error in generate_triage:", str(e))
-                return jsonify({
-                    "status": "error",
-                    "message": f"Error generating triage: {str(e)}"
-                }), 500
-
-            try:
-                # Generate ESI
-                treatment_response = generate_treatment_plan(
-                    vitals.get('temperature'), 
-                    vitals.get('pulse'), 
-                    vitals.get('respirationRate'), 
-                    bloodPressure, 
-                    symptom_text
-                )
-                print("TREATMENT RESPONSE: ", treatment_response)
-            except Exception as e:
-                print("Error in generate_treatment_plan:", str(e))
-                return jsonify({
-                    "status": "error",
-                    "message": f"Error generating treatment plan: {str(e)}"
-                }), 500
-            # Create patient record for database
-            patient_record = {
-                "firstName": firstName,
-                "lastName": lastName,
-                "age": age,
-                "dateOfBirth": dateOfBirth,
-                "phoneNumber": phoneNumber,
-                "timeEntered": timeEntered,
-                "dateOfVisit": dateOfVisit,
-                "vitals": vitals,
-                "bloodPressure": bloodPressure,
-                "symptoms": symptoms,
-                "symptom_text": symptom_text,  # Keep the text version for searching
-                "allergies": allergies,
-                "medications": medications,
-                "medicalHistory": medicalHistory,
-                "notes": notes,
-                "status": "waiting",  # Default status
-                "priority": int(esi_number),  # Use ESI as initial priority
-                "esi": esi_number,
-                "esi_explanation": esi_explanation,
-                # Add multi-select fields
-                "substance_use": substance_use,
-                "family_history": family_history,
-                "treatmentPlan": treatment_response  # Add treatment plan
-            }
+            # Clear-cut cases get their ESI right away, the triage workers fill in the rest
+            fast_path = rule_based_triage(*inputs)
+            if fast_path:
+                patient_record["esi"] = str(fast_path[0])
+                patient_record["priority"] = fast_path[0]  # Use ESI as initial priority
+                patient_record["esi_explanation"] = fast_path[1]
 
             # Store patient record in MongoDB
             try:
                 # Add to database
-                result = patients_collection.insert_one(patient_record)
+                with metrics.timed('mongo_insert'):
+                    result = patients_collection.insert_one(patient_record)
                 patient_record['_id'] = str(result.inserted_id)  # Convert ObjectId to string
             except Exception as e:
                 print("Database error:", str(e))
@@ -277,11 +394,28 @@ def patient_data():
                     "message": "Failed to save patient record"
                 }), 500
 
+            patient_id = patient_record['_id']
+            patient_events.publish('insert', patient_id, patient=serialize(patient_record))
+            job = {"model_inputs": inputs, "esi": patient_record["esi"], "triage_key": patient_record["triageKey"]}
+            if not triage_pool.submit(patient_id, job):
+                # Queue is full: triage inline rather than leave the patient untriaged
+                print(f"Triage queue full, triaging patient {patient_id} inline")
+                if run_triage_inline(patient_id, job):
+                    patient_record = patients_collection.find_one({'_id': ObjectId(patient_id)})
+                    patient_record['_id'] = str(patient_record['_id'])
+                    return jsonify({
+                        "status": "success",
+                        "message": "Patient data received!",
+                        "patient": patient_record
+                    })
+                # The patient is saved either way; a failed triage must not invite a duplicate retry
+
             return jsonify({
                 "status": "success",
-                "message": "Patient data received!",
-                "patient": patient_record
-            })
+                "message": "Patient data received, triage in progress",
+                "patient": patient_record,
+                "triage_status_url": f"/api/patients/{patient_id}/triage-status"
+            }), 202
 
         except Exception as e:
             print("Error processing request:", str(e))
@@ -290,21 +424,375 @@ def patient_data():
                 "message": f"Server error: {str(e)}"
             }), 500
 
-    # GET method - retrieve all patients
+    # GET method - list patients, optionally filtered, projected and paginated
     elif request.method == 'GET':
         try:
-            # Convert MongoDB cursor to list and handle ObjectId serialization
-            patients = list(patients_collection.find())
+            query = build_patient_filter(request.args)
+            projection = build_projection(request.args)
+            page_size = parse_page_size(request.args)
+            cursor = request.args.get('cursor')
+            descending = request.args.get('order') == 'desc'
+        except ValueError as e:
+            return jsonify({
+                "status": "error",
+                "message": str(e)
+            }), 400
+
+        try:
+            # Without limit/cursor keep returning a plain list for the dashboard
+            if page_size is None and not cursor:
+                with metrics.timed('mongo_find'):
+                    patients = list(patients_collection.find(query, projection))
+                for patient in patients:
+                    patient['_id'] = str(patient['_id'])  # Convert ObjectId to string
+                return jsonify(patients)
+
+            page_size = page_size or MAX_PAGE_SIZE
+            if projection is not None:
+                projection['timeEntered'] = 1  # Needed to build the next cursor
+            if cursor:
+                query = apply_cursor(query, cursor, descending)
+
+            # Fetch one extra document to know whether there is a next page
+            with metrics.timed('mongo_find'):
+                patients = list(
+                    patients_collection.find(query, projection)
+                    .sort(sort_order(request.args))
+                    .limit(page_size + 1)
+                )
+            has_more = len(patients) > page_size
+            patients = patients[:page_size]
+            next_cursor = encode_cursor(patients[-1]) if has_more else None
             for patient in patients:
                 patient['_id'] = str(patient['_id'])  # Convert ObjectId to string
-            
-            return jsonify(patients)
+
+            return jsonify({
+                "status": "success",
+                "patients": patients,
+                "count": len(patients),
+                "next_cursor": next_cursor
+            })
+        except ValueError as e:
+            return jsonify({
+                "status": "error",
+                "message": str(e)
+            }), 400
         except Exception as e:
             return jsonify({
                 "status": "error",
                 "message": "Failed to retrieve patients"
             }), 500
 
+# Streaming export of patient records for audits and analytics
+@app.route('/api/patients/export', methods=['GET'])
+def export_patients():
+    try:
+        query = build_patient_filter(request.args)
+        projection = build_projection(request.args)
+    except ValueError as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 400
+
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({
+            "status": "error",
+            "message": f"Invalid format: {export_format}"
+        }), 400
+
+    # Documents are read from the cursor in batches and written out one by one,
+    # so memory use does not depend on the size of the collection
+    cursor = (
+        patients_collection.find(query, projection)
+        .sort(sort_order(request.args))
+        .batch_size(EXPORT_BATCH_SIZE)
+    )
+
+    if export_format == 'csv':
+        columns = list(projection) if projection else DEFAULT_EXPORT_COLUMNS
+        if projection and '_id' not in columns:
+            columns.insert(0, '_id')
+        body, mimetype = iter_csv(cursor, columns), 'text/csv'
+    else:
+        body, mimetype = iter_ndjson(cursor), 'application/x-ndjson'
+
+    filename = f"patients-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{export_format}"
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+# Live patient updates: an initial snapshot, then only inserts/updates/deletes.
+# Each client here holds a server thread blocked on its subscription, so this
+# is the development fallback; asgi.py serves the same stream from an async
+# generator that awaits PatientEventBus.subscribe_async() without a thread
+@app.route('/api/patients/stream', methods=['GET'])
+def stream_patients():
+    try:
+        query = build_patient_filter(request.args)
+        projection = build_projection(request.args)
+    except ValueError as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 400
+
+    # Subscribe before reading the snapshot so no change falls in between
+    subscription = patient_events.subscribe()
+    last_event_id = request.headers.get('Last-Event-ID')
+
+    def snapshot():
+        patients = [serialize(patient) for patient in patients_collection.find(query, projection)]
+        return format_sse('snapshot', {"patients": patients}, patient_events.sequence)
+
+    def generate():
+        try:
+            # Reconnecting clients get the events they missed if still in history
+            missed = patient_events.replay_since(last_event_id) if last_event_id else None
+            if missed is None:
+                yield snapshot()
+            else:
+                for event in missed:
+                    yield format_sse(event['type'], event, event['id'])
+
+            while True:
+                event = subscription.get(timeout=SSE_HEARTBEAT_SECONDS)
+                if event is None:
+                    yield ": keep-alive\n\n"
+                elif event is RESYNC:
+                    yield snapshot()
+                else:
+                    yield format_sse(event['type'], event, event['id'])
+        finally:
+            patient_events.unsubscribe(subscription)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Bulk intake endpoint for mass-casualty and transfer cohorts
+@app.route('/api/patients/batch', methods=['POST'])
+def patient_batch():
+    start = time.perf_counter()
+    try:
+        post_data = request.get_json()
+        payloads = post_data.get('patients') if isinstance(post_data, dict) else post_data
+        if not isinstance(payloads, list) or not payloads:
+            return jsonify({
+                "status": "error",
+                "message": "Expected a non-empty list of patients"
+            }), 400
+        if len(payloads) > BATCH_MAX_SIZE:
+            return jsonify({
+                "status": "error",
+                "message": f"Batch too large: {len(payloads)} patients (max {BATCH_MAX_SIZE})"
+            }), 400
+
+        # Normalize every payload, keeping per-patient validation errors
+        results = [None] * len(payloads)
+        records = {}
+        for index, payload in enumerate(payloads):
+            try:
+                records[index] = build_patient_record(payload)
+            except Exception as e:
+                results[index] = {"index": index, "status": "error", "message": str(e)}
+
+        # Settle clear-cut cases for the whole batch in one vectorized pass
+        indexes = list(records)
+        inputs = {index: model_inputs(records[index]) for index in indexes}
+        fast_paths = rule_based_triage_batch([inputs[index] for index in indexes])
+        for index, fast_path in zip(indexes, fast_paths):
+            if fast_path:
+                records[index]["esi"] = str(fast_path[0])
+                records[index]["priority"] = fast_path[0]
+                records[index]["esi_explanation"] = fast_path[1]
+
+        # Model calls with bounded parallelism
+        model_start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=BATCH_MAX_PARALLEL) as pool:
+            futures = {
+                index: pool.submit(
+                    metrics.propagate(compute_triage_fields), inputs[index], bool(records[index]["esi"])
+                )
+                for index in indexes
+            }
+            for index, future in futures.items():
+                try:
+                    records[index].update(future.result())
+                except Exception as e:
+                    print(f"Batch triage failed for patient {index}: {str(e)}")
+                    results[index] = {
+                        "index": index,
+                        "status": "error",
+                        "message": f"Error generating triage: {str(e)}"
+                    }
+                    del records[index]
+        model_ms = round((time.perf_counter() - model_start) * 1000, 1)
+
+        # Single round trip for all triaged records
+        insert_start = time.perf_counter()
+        insert_indexes = sorted(records)
+        failed_inserts = {}
+        if insert_indexes:
+            try:
+                with metrics.timed('mongo_insert_many'):
+                    patients_collection.insert_many(
+                        [records[index] for index in insert_indexes], ordered=False
+                    )
+            except BulkWriteError as e:
+                for error in e.details.get('writeErrors', []):
+                    failed_inserts[insert_indexes[error['index']]] = error.get('errmsg', 'Write failed')
+        insert_ms = round((time.perf_counter() - insert_start) * 1000, 1)
+
+        for index in insert_indexes:
+            if index in failed_inserts:
+                print(f"Batch insert failed for patient {index}: {failed_inserts[index]}")
+                results[index] = {
+                    "index": index,
+                    "status": "error",
+                    "message": "Failed to save patient record"
+                }
+            else:
+                records[index]['_id'] = str(records[index]['_id'])
+                results[index] = {"index": index, "status": "success", "patient": records[index]}
+                patient_events.publish('insert', records[index]['_id'], patient=serialize(records[index]))
+
+        inserted = sum(1 for result in results if result["status"] == "success")
+        wall_ms = round((time.perf_counter() - start) * 1000, 1)
+        return jsonify({
+            "status": "success" if inserted == len(payloads) else "partial",
+            "results": results,
+            "summary": {
+                "received": len(payloads),
+                "inserted": inserted,
+                "failed": len(payloads) - inserted,
+                "fast_path": sum(1 for fast_path in fast_paths if fast_path),
+                "model_ms": model_ms,
+                "insert_ms": insert_ms,
+                "wall_time_ms": wall_ms,
+                "patients_per_second": round(len(payloads) / (wall_ms / 1000), 1) if wall_ms else None
+            }
+        }), 200 if inserted == len(payloads) else 207
+
+    except Exception as e:
+        print("Error processing batch:", str(e))
+        return jsonify({
+            "status": "error",
+            "message": f"Server error: {str(e)}"
+        }), 500
+
+# Next patient to be seen according to the in-memory priority queue
+@app.route('/api/queue/next', methods=['GET'])
+def get_next_patient():
+    return jsonify({
+        "status": "success",
+        "patient": patient_queue.peek()
+    })
+
+# Waiting patients in queue order
+@app.route('/api/queue', methods=['GET'])
+def get_queue():
+    try:
+        limit = int(request.args.get('limit', 20))
+    except ValueError:
+        return jsonify({
+            "status": "error",
+            "message": "limit must be an integer"
+        }), 400
+    if limit < 1:
+        return jsonify({
+            "status": "error",
+            "message": "limit must be positive"
+        }), 400
+
+    return jsonify({
+        "status": "success",
+        "patients": patient_queue.top(min(limit, MAX_PAGE_SIZE)),
+        # Without a change stream this queue only reflects this process's own changes
+        "queue": {**patient_queue.stats(), "change_stream_active": patient_events.change_stream_active}
+    })
+
+# Latency histograms, error/fallback counters and stats in Prometheus text format
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# Triage response cache statistics
+@app.route('/api/triage/cache', methods=['GET'])
+def get_triage_cache_stats():
+    return jsonify({
+        "status": "success",
+        "cache": triage_cache.stats()
+    })
+
+# Gemini circuit breaker state and call outcomes (retries, hedges, fallbacks)
+@app.route('/api/triage/model', methods=['GET'])
+def get_model_stats():
+    return jsonify({
+        "status": "success",
+        "model": get_model_call_stats(),
+        # Waiting patients still to be re-triaged, see recover_triage
+        "retriage_pending": {
+            status: patients_collection.count_documents({'status': 'waiting', 'triage_status': status})
+            for status in RETRY_TRIAGE_STATUSES
+        }
+    })
+
+# Triage progress for a single patient
+@app.route('/api/patients/<string:patient_id>/triage-status', methods=['GET'])
+def get_triage_status(patient_id):
+    try:
+        patient = patients_collection.find_one(
+            {'_id': ObjectId(patient_id)},
+            {
+                'triage_status': 1, 'esi': 1, 'priority': 1, 'esi_explanation': 1,
+                'treatmentPlan': 1, 'triageTimings': 1, 'triage_error': 1
+            }
+        )
+        if not patient:
+            return jsonify({
+                "status": "error",
+                "message": "Patient not found"
+            }), 404
+
+        patient['_id'] = str(patient['_id'])
+        # Records created before asynchronous intake have no triage_status
+        triage_status = patient.pop('triage_status', 'complete')
+        return jsonify({
+            "status": "success",
+            "patient_id": patient['_id'],
+            "triage_status": triage_status,
+            "queue_position": triage_pool.position(patient['_id']),
+            "triage": patient
+        })
+
+    except Exception as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 500
+
+# Depth and age of the background triage queue
+@app.route('/api/triage/queue', methods=['GET'])
+def get_triage_queue_stats():
+    return jsonify({
+        "status": "success",
+        "queue": triage_pool.stats()
+    })
+
+# Counters for intakes settled by the local ESI rules
+@app.route('/api/triage/fast-path', methods=['GET'])
+def get_triage_fast_path_stats():
+    return jsonify({
+        "status": "success",
+        "fast_path": get_rule_stats()
+    })
+
 # Message handling endpoint
 @app.route('/api/message', methods=['GET', 'POST'])
 def handle_message():
@@ -314,9 +802,134 @@ def handle_message():
         return jsonify({"response": f"Server received: {message}"})
     return jsonify({"message": "Hello from Flask!"})
 
-@app.route('/api/patients/<patient_id>', methods=['PUT'])
+# Stored fields returned by a patient update (also everything queue_retriage reads)
+UPDATE_PROJECTION = [
+    "firstName", "lastName", "age", "vitals", "bloodPressure", "symptoms", "symptom_text",
+    "notes", "status", "priority", "esi", "esi_explanation", "treatmentPlan",
+    "triage_status", "triageKey", "priorityOverride"
+]
+
+def queue_retriage(patient_id, patient):
+    """
+    Queue a re-triage if the patient's stored triage inputs no longer match the
+    ones last triaged (triageKey), or if the last triage was a provisional
+    estimate or failed. Like intake, clear-cut cases get their ESI from the
+    local rules right away and only wait for the treatment plan.
+    Args:
+        patient (dict): Stored patient, with at least the UPDATE_PROJECTION fields; updated in place
+    Returns:
+        bool: True if a re-triage was queued
+    """
+    object_id = ObjectId(patient_id)
+    evaluated_key = fast_path = None
+    # Compare-and-set on the previous key, so concurrent updates queue one job for the latest inputs
+    for _ in range(3):
+        inputs = model_inputs(patient)
+        key = triage_key(inputs)
+        retry = patient.get('triage_status') in RETRY_TRIAGE_STATUSES
+        if key == patient.get('triageKey') and not retry:
+            return False
+
+        fields = {"triageKey": key, "triage_status": "pending_triage"}
+        # The rules only run again if a concurrent update changed the inputs
+        if key != evaluated_key:
+            fast_path = rule_based_triage(*inputs, record=False)
+            evaluated_key = key
+        current = {'_id': object_id, 'triageKey': patient.get('triageKey')}
+        if retry:
+            current['triage_status'] = patient['triage_status']
+        if fast_path:
+            fields.update({
+                "esi": str(fast_path[0]),
+                "esi_explanation": fast_path[1]
+            })
+            # A priority set by hand is kept; only the ESI is refreshed
+            if not patient.get('priorityOverride'):
+                fields["priority"] = fast_path[0]
+                current['priorityOverride'] = {'$ne': True}
+        result = patients_collection.update_one(current, {'$set': fields})
+        if result.modified_count:
+            break
+        stored = patients_collection.find_one({'_id': object_id}, UPDATE_PROJECTION)
+        if stored is None:
+            return False
+        patient.clear()
+        patient.update(stored)
+    else:
+        return False
+
+    record_retriage(fast_path[0] if fast_path else None)
+    patient.update(fields)
+    patient_events.publish('update', patient_id, fields=serialize(fields))
+    job = {"model_inputs": inputs, "esi": fields.get("esi"), "triage_key": key}
+    if not triage_pool.submit(patient_id, job):
+        print(f"Triage queue full, re-triaging patient {patient_id} inline")
+        run_triage_inline(patient_id, job)
+    return True
+
+def recover_triage():
+    """
+    Re-queue the longest-waiting patients whose last triage was provisional or failed
+    Returns:
+        int: Number of patients re-queued (0 while the Gemini breaker is not closed)
+    """
+    requeued = 0
+    patients = patients_collection.find(
+        {'status': 'waiting', 'triage_status': {'$in': list(RETRY_TRIAGE_STATUSES)}},
+        UPDATE_PROJECTION
+    ).sort('timeEntered', 1).limit(TRIAGE_RECOVERY_BATCH)
+    for patient in patients:
+        # Stop as soon as the model is failing again; the rest wait for the next sweep
+        if gemini_breaker.state != "closed":
+            break
+        if queue_retriage(str(patient['_id']), patient):
+            requeued += 1
+    return requeued
+
+def schedule_triage_recovery(interval_seconds):
+    """Run recover_triage every interval_seconds in one background thread"""
+    def run():
+        while True:
+            time.sleep(interval_seconds)
+            try:
+                requeued = recover_triage()
+                if requeued:
+                    print(f"Re-queued {requeued} provisional or failed triages")
+            except Exception as e:
+                print(f"Triage recovery sweep failed: {str(e)}")
+
+    threading.Thread(target=run, name="triage-recovery", daemon=True).start()
+
+def apply_priority(object_id, patient, priority):
+    """
+    Apply the priority of an update payload. A different level on a triaged
+    patient is a manual override (priorityOverride) that re-triage keeps; None
+    clears the override and restores the ESI level. Anything else is ignored:
+    the form sends the current priority back, and pending patients get theirs from triage.
+    Args:
+        patient (dict): Stored patient after the rest of the update; updated in place
+    Returns:
+        dict: Fields that were set
+    """
+    if priority is None:
+        if not patient.get('esi'):
+            return {}
+        fields = {"priority": int(patient['esi'])}
+        query = {'_id': object_id, 'esi': patient['esi'], 'priorityOverride': {'$ne': True}}
+    else:
+        fields = {"priority": priority, "priorityOverride": True}
+        query = {
+            '_id': object_id,
+            'priority': {'$nin': [None, priority]},
+            'triage_status': {'$nin': ['pending_triage', 'in_progress']}
+        }
+    if not patients_collection.update_one(query, {'$set': fields}).modified_count:
+        return {}
+    patient.update(fields)
+    return fields
+
 # Endpoint to update patient information
-@app.route('/api/patients/<int:patient_id>', methods=['PUT'])
+@app.route('/api/patients/<patient_id>', methods=['PUT'])
 def update_patient(patient_id):
     try:
         data = request.get_json()
@@ -325,54 +938,60 @@ def update_patient(patient_id):
         # Convert string ID to ObjectId for MongoDB
         object_id = ObjectId(patient_id)
         
-        # Process special fields if needed
-        if 'vitals' in data and 'bloodPressure' in data['vitals'] and isinstance(data['vitals']['bloodPressure'], dict):
-            bp = data['vitals']['bloodPressure']
-            if 'systolic' in bp and 'diastolic' in bp:
-                data['bloodPressure'] = f"{bp['systolic']}/{bp['diastolic']}"
-        
-        # Process symptoms if needed
-        if 'symptoms' in data:
-            symptoms = data['symptoms']
-            if isinstance(symptoms, dict) and 'selected' in symptoms:
-                selected = symptoms['selected']
-                notes = symptoms.get('notes', '')
-                symptom_text = ", ".join(selected) if isinstance(selected, list) else str(selected)
-                if notes:
-                    symptom_text += f". Additional notes: {notes}"
-                data['symptom_text'] = symptom_text
+        # Blood pressure and symptom text are derived exactly as at intake
+        try:
+            update, touches_triage = build_patient_update(data)
+        except ValueError as e:
+            return jsonify({
+                "status": "error",
+                "message": str(e)
+            }), 400
+        if not update:
+            return jsonify({
+                "status": "error",
+                "message": "No fields to update"
+            }), 400
         
-        # Update the patient record
-        result = patients_collection.update_one(
-            {'_id': object_id},
-            {'$set': data}
-        )
+        # The priority is applied on its own below, and null clears a manual override
+        has_priority = 'priority' in update
+        priority = update.pop('priority', None)
+        if has_priority and priority is None:
+            update['priorityOverride'] = False
+
+        # Update and read back the record in one atomic round trip
+        with metrics.timed('mongo_update'):
+            if update:
+                patient = patients_collection.find_one_and_update(
+                    {'_id': object_id},
+                    {'$set': update},
+                    projection=UPDATE_PROJECTION,
+                    return_document=ReturnDocument.AFTER
+                )
+            else:
+                patient = patients_collection.find_one({'_id': object_id}, UPDATE_PROJECTION)
         
-        if result.matched_count == 0:
+        if patient is None:
             return jsonify({
                 "status": "error",
                 "message": "Patient not found"
             }), 404
-            
-        # Get the updated patient record
-        updated_patient = patients_collection.find_one({'_id': object_id})
-        if updated_patient:
-            updated_patient['_id'] = str(updated_patient['_id'])  # Convert ObjectId to string
-            
-        # Update patient information
-        updated_patient = {
-            "id": patient_id,
-            "symptoms": data.get('symptoms'),
-            "notes": data.get('notes'),
-            "status": data.get('status', 'waiting'),
-            "priority": data.get('priority', 3),
-            "treatmentPlan": data.get('treatmentPlan', '')
-        }
-        
+        if has_priority:
+            update.update(apply_priority(object_id, patient, priority))
+
+        if update:
+            patient_events.publish('update', patient_id, fields=serialize(update))
+
+        # Status/notes edits never reach the model; vitals or symptom edits
+        # only do when their normalized form changed
+        retriage = touches_triage and queue_retriage(patient_id, patient)
+
+        patient.pop('_id', None)
+        patient.pop('triageKey', None)
         return jsonify({
             "status": "success",
-            "message": "Patient updated successfully",
-            "patient": updated_patient
+            "message": "Patient updated, re-triage queued" if retriage else "Patient updated successfully",
+            "patient": {"id": patient_id, **serialize(patient)},
+            "retriage": retriage
         })
         
     except Exception as e:
@@ -382,6 +1001,27 @@ def update_patient(patient_id):
             "message": str(e)
         }), 500
     
+# Trained busyness model, see busyness_predictor.py
+BUSYNESS_MODEL_PATH = os.getenv('BUSYNESS_MODEL_PATH', 'busyness_model.bin')
+# Default path of the pickled model from before the mapped artifact format;
+# served until the first retrain publishes BUSYNESS_MODEL_PATH
+LEGACY_BUSYNESS_MODEL_PATH = 'busyness_model.pkl'
+# Retrain from the stored visits this often (0 = only on demand), see busyness_training.py
+BUSYNESS_RETRAIN_INTERVAL_HOURS = float(os.getenv('BUSYNESS_RETRAIN_INTERVAL_HOURS', '0'))
+
+# Longest forecast served by a single range request
+MAX_FORECAST_DAYS = 366
+
+def busyness_model_path():
+    """Model file to serve: BUSYNESS_MODEL_PATH, or the legacy pickle if only that exists"""
+    if (
+        not os.path.exists(BUSYNESS_MODEL_PATH)
+        and not os.getenv('BUSYNESS_MODEL_PATH')
+        and os.path.exists(LEGACY_BUSYNESS_MODEL_PATH)
+    ):
+        return LEGACY_BUSYNESS_MODEL_PATH
+    return BUSYNESS_MODEL_PATH
+
 def get_busyness_prediction(date=None):
     """
     Get busyness prediction for a given date or next 7 days
@@ -391,30 +1031,28 @@ def get_busyness_prediction(date=None):
         dict: Predictions with dates and busyness scores
     """
     try:
-        # Initialize predictor and load the saved model
-        predictor = BusynessPredictor()
-        predictor.load_model('busyness_model.pkl')
+        # Shared predictor, reloaded only when the model file changes
+        from busyness_predictor import get_predictor  # pandas/scikit-learn load on first forecast
+        predictor = get_predictor(busyness_model_path())
         
         if date:
             # Single date prediction
-            prediction = predictor.predict(date)
+            prediction = predictor.predict_cached(date)
             return {
                 "date": date,
                 "predicted_busyness": round(prediction)
             }
         else:
-            # Next 7 days prediction
+            # Next 7 days prediction in one vectorized call
             today = datetime.now()
-            future_dates = [today + timedelta(days=i) for i in range(7)]
-            predictions = []
-            
-            for date in future_dates:
-                date_str = date.strftime('%Y-%m-%d')
-                prediction = predictor.predict(date_str)
-                predictions.append({
+            dates = [(today + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(7)]
+            predictions = [
+                {
                     "date": date_str,
                     "predicted_busyness": round(prediction)
-                })
+                }
+                for date_str, prediction in zip(dates, predictor.predict_many_cached(dates))
+            ]
             
             return predictions
             
@@ -423,20 +1061,66 @@ def get_busyness_prediction(date=None):
         return None
 
 
+def get_busyness_range(start, end):
+    """
+    Get busyness predictions for every day from start to end (inclusive)
+    Args:
+        start (str): First date in YYYY-MM-DD format
+        end (str): Last date in YYYY-MM-DD format
+    Returns:
+        list: Predictions with dates and busyness scores
+    Raises:
+        ValueError: If the range is invalid or longer than MAX_FORECAST_DAYS
+    """
+    start_date = datetime.strptime(start, '%Y-%m-%d')
+    end_date = datetime.strptime(end, '%Y-%m-%d')
+    days = (end_date - start_date).days + 1
+    if days < 1:
+        raise ValueError("end must not be before start")
+    if days > MAX_FORECAST_DAYS:
+        raise ValueError(f"Range too long: {days} days (max {MAX_FORECAST_DAYS})")
+
+    from busyness_predictor import get_predictor
+    predictor = get_predictor(busyness_model_path())
+    dates = [(start_date + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(days)]
+    return [
+        {
+            "date": date_str,
+            "predicted_busyness": round(prediction)
+        }
+        for date_str, prediction in zip(dates, predictor.predict_many_cached(dates))
+    ]
+
+
 @app.route('/api/predict/busyness', methods=['GET'])
 def predict_busyness():
     try:
-        # Get location data first
-        location_response = get_location()
-        if location_response.status_code != 200:
-            return jsonify({
-                "status": "error",
-                "message": "Failed to get location data"
-            }), 500
-            
-        location_data = location_response.get_json()['location']
+        # Timezone of the caller (cached per IP)
+        location_data, _ = lookup_location(request.remote_addr)
         timezone = location_data['timezone']
         
+        # Date range forecast (?start=YYYY-MM-DD&end=YYYY-MM-DD)
+        start = request.args.get('start')
+        end = request.args.get('end')
+        if start or end:
+            if not (start and end):
+                return jsonify({
+                    "status": "error",
+                    "message": "Both start and end are required for a range forecast"
+                }), 400
+            try:
+                predictions = get_busyness_range(start, end)
+            except ValueError as e:
+                return jsonify({
+                    "status": "error",
+                    "message": str(e)
+                }), 400
+            return jsonify({
+                "status": "success",
+                "predictions": predictions,
+                "timezone": timezone
+            })
+
         # Get date parameter from query string (optional)
         date = request.args.get('date')
         if not date:
@@ -472,47 +1156,28 @@ def predict_busyness():
 
 @app.route('/api/location', methods=['GET'])
 def get_location():
-    try:
-        # Get IP address from request
-        ip = request.remote_addr
-        
-        # Use ipinfo.io instead (more reliable free tier)
-        response = requests.get(f'https://ipinfo.io/{ip}/json', 
-                              headers={'Accept': 'application/json'})
-        print("Location API Response:", response.text)  # Debug print
-        data = response.json()
-        
-        # Extract location and timezone data safely
-        loc = data.get('loc', '0,0')
-        if loc and ',' in loc:
-            lat, lon = loc.split(',')
-        else:
-            lat, lon = '0', '0'
-            
-        timezone = data.get('timezone', 'UTC')
-        print(timezone)
-        
-        return jsonify({
-            "status": "success",
-            "location": {
-                "latitude": lat,
-                "longitude": lon,
-                "timezone": timezone,
-                "date": datetime.now().strftime('%Y-%m-%d'),
-                "ip": ip
-            }
-        })
-    except Exception as e:
-        print(f"Location error: {str(e)}")
-        # Fallback to UTC if location service fails
-        return jsonify({
-            "status": "success",
-            "location": {
-                "timezone": "UTC",
-                "date": datetime.now().strftime('%Y-%m-%d'),
-                "ip": ip
-            }
-        })
+    # Get IP address from request
+    ip = request.remote_addr
+
+    # Cached per IP; upstream calls go through a pooled session with timeouts
+    location, timing = lookup_location(ip)
+    location.update({
+        "date": datetime.now().strftime('%Y-%m-%d'),
+        "ip": ip
+    })
+
+    return jsonify({
+        "status": "success",
+        "location": location,
+        "timing": timing
+    })
+
+@app.route('/api/location/stats', methods=['GET'])
+def get_location_cache_stats():
+    return jsonify({
+        "status": "success",
+        "cache": get_location_stats()
+    })
 
 @app.route('/api/emergency-rooms', methods=['GET'])
 def get_emergency_rooms():
@@ -531,6 +1196,8 @@ def relocate_patient(patient_id):
                 "message": "Patient not found or already relocated"
             }), 404
 
+        patient_events.publish('delete', patient_id)
+
         return jsonify({
             "status": "success",
             "message": "Patient relocated successfully (removed from database)"
@@ -543,6 +1210,167 @@ def relocate_patient(patient_id):
             "message": str(e)
         }), 500
 
+# Longest hourly forecast served by one request
+MAX_HOURLY_FORECAST_DAYS = 14
+
+def get_busyness_hours(start, end, timezone):
+    """
+    Get hourly busyness predictions for whole days in the caller's timezone
+    Args:
+        start (str): First day in YYYY-MM-DD format, in timezone
+        end (str): Last day in YYYY-MM-DD format, in timezone (inclusive)
+        timezone (str): IANA timezone name of the caller
+    Returns:
+        list: Predictions with ISO hours (with UTC offset) and busyness scores
+    Raises:
+        ValueError: If the range is invalid, longer than MAX_HOURLY_FORECAST_DAYS,
+        or no hourly model has been trained
+    """
+    start_date = datetime.strptime(start, '%Y-%m-%d')
+    end_date = datetime.strptime(end, '%Y-%m-%d')
+    days = (end_date - start_date).days + 1
+    if days < 1:
+        raise ValueError("end must not be before start")
+    if days > MAX_HOURLY_FORECAST_DAYS:
+        raise ValueError(f"Range too long: {days} days (max {MAX_HOURLY_FORECAST_DAYS})")
+
+    # timeEntered, and so the hourly model, uses the server's local clock
+    tz = pytz.timezone(timezone)
+    first = tz.localize(start_date).astimezone().replace(tzinfo=None)
+    last = tz.localize(end_date + timedelta(days=1)).astimezone().replace(tzinfo=None)
+
+    from busyness_predictor import get_predictor
+    predictions = get_predictor(busyness_model_path()).predict_hours(first, last)
+    return [
+        {
+            "hour": hour.to_pydatetime().astimezone(tz).isoformat(),
+            "predicted_busyness": round(float(prediction), 1)
+        }
+        for hour, prediction in predictions.items()
+    ]
+
+@app.route('/api/predict/busyness/hourly', methods=['GET'])
+def predict_busyness_hourly():
+    try:
+        # Hours are reported in the caller's timezone (cached per IP)
+        location_data, _ = lookup_location(request.remote_addr)
+        timezone = location_data['timezone']
+
+        # ?date=YYYY-MM-DD or ?start=YYYY-MM-DD&end=YYYY-MM-DD, default today
+        start = request.args.get('start') or request.args.get('date')
+        end = request.args.get('end') or request.args.get('date')
+        if bool(request.args.get('start')) != bool(request.args.get('end')):
+            return jsonify({
+                "status": "error",
+                "message": "Both start and end are required for a range forecast"
+            }), 400
+        if not start:
+            start = end = datetime.now(pytz.timezone(timezone)).strftime('%Y-%m-%d')
+
+        try:
+            predictions = get_busyness_hours(start, end, timezone)
+        except ValueError as e:
+            return jsonify({
+                "status": "error",
+                "message": str(e)
+            }), 400
+
+        return jsonify({
+            "status": "success",
+            "predictions": predictions,
+            "peak": max(predictions, key=lambda p: p["predicted_busyness"], default=None),
+            "timezone": timezone
+        })
+
+    except Exception as e:
+        print(f"Error in hourly busyness prediction: {str(e)}")
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 500
+
+# Retrain the busyness model now from the visits stored in MongoDB
+@app.route('/api/predict/busyness/retrain', methods=['POST'])
+def retrain_busyness_model():
+    try:
+        from busyness_training import retrain
+        record = retrain(db, BUSYNESS_MODEL_PATH)
+    except ValueError as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 400
+    except Exception as e:
+        print(f"Error retraining busyness model: {str(e)}")
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 500
+
+    if record is None:
+        return jsonify({
+            "status": "error",
+            "message": "Retraining already in progress"
+        }), 409
+    return jsonify({
+        "status": "success",
+        "model": record
+    })
+
+# Version of the busyness model being served and the latest retraining runs
+@app.route('/api/predict/busyness/model', methods=['GET'])
+def get_busyness_model():
+    try:
+        from busyness_predictor import get_predictor
+        from busyness_training import VERSIONS_COLLECTION, last_run
+        predictor = get_predictor(busyness_model_path())
+        versions = list(db[VERSIONS_COLLECTION].find({}, {'_id': 0}).sort('version', -1).limit(5))
+        return jsonify({
+            "status": "success",
+            "version": predictor.version,
+            "hourly": predictor.hourly_model is not None,
+            "last_run": last_run(),
+            "recent_versions": versions,
+            "retrain_interval_hours": BUSYNESS_RETRAIN_INTERVAL_HOURS
+        })
+    except Exception as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 500
+
+# Liveness: the process is up and serving requests
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    return jsonify({
+        "status": "ok",
+        "startup": startup_timings
+    })
+
+# Readiness: MongoDB is reachable and initialized; the other dependencies are
+# reported but optional, since their routes degrade to fallbacks without them
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    try:
+        init_db()
+        mongo_client.admin.command('ping')
+        mongo = {"status": "ready"}
+    except Exception as e:
+        mongo = {"status": "unavailable", "error": _db_error or str(e)}
+
+    ready = mongo["status"] == "ready"
+    return jsonify({
+        "status": "ready" if ready else "not_ready",
+        "checks": {
+            "mongo": mongo,
+            "genai": model_client_status(),
+            "maps": maps_client_status(),
+            "busyness_model": "ready" if os.path.exists(busyness_model_path()) else "missing"
+        }
+    }), 200 if ready else 503
+
+startup_timings["import_ms"] = round((time.perf_counter() - IMPORT_STARTED) * 1000, 1)
+
 # Start Flask server
 if __name__ == "__main__":
     print("Starting Flask server on port 3000...")  # Debug log
@@ -0,0 +1,458 @@
+# ASGI entry point for production serving. The high-traffic routes (patient
+# list/intake, the live patient stream, reference options, busyness forecast,
+# location, emergency rooms) are async Quart handlers on motor, the async
+# GenAI client and httpx, so a request waiting on Mongo, the model or the next
+# patient event holds no thread. Every other route falls through to the Flask
+# app in app.py.
+#
+#     uvicorn asgi:application --host 0.0.0.0 --port 3000
+#
+# Add --workers N only with a replica set: the patient event bus and queue
+# are per process and agree across workers only through a change stream.
+import asyncio
+import os
+import time
+from datetime import datetime
+
+import pytz
+from a2wsgi import WSGIMiddleware
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from quart import Quart, Response, g, jsonify, request
+from werkzeug.exceptions import HTTPException
+
+import app as flask_module
+import metrics
+from geolocation import close_async_client, lookup_location_async
+from intake import build_patient_record, model_inputs
+from map import find_nearest_emergency_rooms
+from model import generate_assessment_async, generate_treatment_plan_async
+from patient_events import RESYNC, format_sse, serialize
+from patient_queries import (
+    MAX_PAGE_SIZE, apply_cursor, build_patient_filter, build_projection,
+    encode_cursor, parse_page_size, sort_order
+)
+from reference_options import VALID_CATEGORIES
+from triage_rules import rule_based_triage
+
+quart_app = Quart(__name__, static_folder=None)
+
+# Model calls awaited at once by background triage tasks in one worker;
+# further intakes wait on the semaphore without holding a thread
+ASYNC_TRIAGE_CONCURRENCY = int(os.getenv('ASYNC_TRIAGE_CONCURRENCY', '64'))
+
+# Seconds to let background triage finish when the server shuts down
+ASYNC_SHUTDOWN_GRACE_SECONDS = float(os.getenv('ASYNC_SHUTDOWN_GRACE_SECONDS', '30'))
+
+mongo_client = None
+patients_collection = None
+_triage_semaphore = None
+_triage_tasks = set()
+
+
+@quart_app.before_serving
+async def connect():
+    global mongo_client, patients_collection, _triage_semaphore
+    mongo_client = AsyncIOMotorClient(os.getenv('MONGO_URI', "mongodb://localhost:27017/"))
+    patients_collection = mongo_client["patientdb"]["patients"]
+    _triage_semaphore = asyncio.Semaphore(ASYNC_TRIAGE_CONCURRENCY)
+
+
+@quart_app.after_serving
+async def disconnect():
+    if _triage_tasks:
+        print(f"Waiting for {len(_triage_tasks)} background triage tasks")
+        await asyncio.wait(list(_triage_tasks), timeout=ASYNC_SHUTDOWN_GRACE_SECONDS)
+    await close_async_client()
+    mongo_client.close()
+
+
+@quart_app.before_request
+async def start_request_metrics():
+    g.metrics_start = time.perf_counter()
+    g.metrics_token = metrics.begin_request()
+
+
+@quart_app.before_request
+async def ensure_db():
+    # Same lazy Mongo setup as the Flask app; the routes here share its options cache and queue
+    if flask_module.patients_collection is None:
+        try:
+            await asyncio.to_thread(flask_module.init_db)
+        except Exception:
+            return jsonify({
+                "status": "error",
+                "message": "Database unavailable"
+            }), 503
+
+
+@quart_app.after_request
+async def finish_request(response):
+    metrics.record_request(
+        request.endpoint, request.method, request.path, response.status_code,
+        time.perf_counter() - g.metrics_start, metrics.end_request(g.pop('metrics_token')),
+        flask_module.SLOW_REQUEST_MS
+    )
+    # Same permissive CORS policy as flask_cors on the Flask app
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    if request.method == 'OPTIONS':
+        response.headers['Access-Control-Allow-Methods'] = response.headers.get('Allow', '')
+        requested = request.headers.get('Access-Control-Request-Headers')
+        if requested:
+            response.headers['Access-Control-Allow-Headers'] = requested
+    return response
+
+
+async def options_response(payload, etag):
+    """JSON response with ETag/Cache-Control that answers If-None-Match with 304"""
+    response = jsonify(payload)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f'public, max-age={flask_module.OPTIONS_MAX_AGE_SECONDS}'
+    return await response.make_conditional(request)
+
+
+# The options cache is in memory; it only touches Mongo right after an invalidation
+@quart_app.route('/api/options', methods=['GET'])
+async def get_all_options():
+    try:
+        options, etag = flask_module.options_cache.get_all()
+        return await options_response({
+            "status": "success",
+            "options": options
+        }, etag)
+
+    except Exception as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 500
+
+
+@quart_app.route('/api/options/<category>', methods=['GET'])
+async def get_options(category):
+    try:
+        if category not in VALID_CATEGORIES:
+            return jsonify({
+                "status": "error",
+                "message": f"Invalid category: {category}"
+            }), 400
+
+        options, etag = flask_module.options_cache.get(category)
+        return await options_response({
+            "status": "success",
+            "options": options
+        }, etag)
+
+    except Exception as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 500
+
+
+async def compute_triage_fields_async(inputs, esi_settled=False):
+    """Async compute_triage_fields from app.py"""
+    if esi_settled:
+        start = time.perf_counter()
+        treatment_plan = await generate_treatment_plan_async(*inputs)
+        plan_ms = round((time.perf_counter() - start) * 1000, 1)
+        return flask_module.triage_fields(treatment_plan, {"treatment_plan_ms": plan_ms, "total_ms": plan_ms})
+
+    assessment = await generate_assessment_async(*inputs, use_rules=False)
+    return flask_module.triage_fields(assessment["treatment_plan"], assessment["timings"], assessment)
+
+
+async def run_triage_job_async(patient_id, job):
+    """Async run_triage_job from app.py, bounded by ASYNC_TRIAGE_CONCURRENCY"""
+    query = {'_id': ObjectId(patient_id)}
+    if job.get('triage_key'):
+        query['triageKey'] = job['triage_key']
+    async with _triage_semaphore:
+        await patients_collection.update_one(query, {'$set': {'triage_status': 'in_progress'}})
+        try:
+            fields = await compute_triage_fields_async(job['model_inputs'], esi_settled=bool(job.get('esi')))
+        except Exception as e:
+            print(f"Triage job {patient_id} failed: {str(e)}")
+            await patients_collection.update_one(
+                query,
+                {'$set': {'triage_status': 'failed', 'triage_error': str(e)}}
+            )
+            return
+
+        with metrics.timed('mongo_update'):
+            result = await patients_collection.update_one(query, {'$set': fields})
+    if result.matched_count:  # Patient may have been relocated or re-triaged meanwhile
+        flask_module.patient_events.publish('update', patient_id, fields=serialize(fields))
+    print(f"Triage complete for patient {patient_id}:", fields["triageTimings"])
+
+
+def start_triage(patient_id, job):
+    task = asyncio.get_running_loop().create_task(run_triage_job_async(patient_id, job))
+    _triage_tasks.add(task)
+    task.add_done_callback(_triage_tasks.discard)
+
+
+metrics.register_gauges('async_triage', 'Background triage tasks in this ASGI worker', lambda: {
+    "tasks": len(_triage_tasks),
+    "concurrency": ASYNC_TRIAGE_CONCURRENCY
+})
+
+
+@quart_app.route('/api/patients', methods=['GET', 'POST'])
+async def patient_data():
+    if request.method == 'POST':
+        try:
+            post_data = await request.get_json()
+
+            # Normalize the form payload (vitals, blood pressure, symptom text)
+            patient_record = build_patient_record(post_data)
+            inputs = model_inputs(patient_record)
+
+            # Clear-cut cases get their ESI right away, a background task fills in the rest
+            fast_path = rule_based_triage(*inputs)
+            if fast_path:
+                patient_record["esi"] = str(fast_path[0])
+                patient_record["priority"] = fast_path[0]  # Use ESI as initial priority
+                patient_record["esi_explanation"] = fast_path[1]
+
+            try:
+                with metrics.timed('mongo_insert'):
+                    result = await patients_collection.insert_one(patient_record)
+                patient_record['_id'] = str(result.inserted_id)  # Convert ObjectId to string
+            except Exception as e:
+                print("Database error:", str(e))
+                return jsonify({
+                    "status": "error",
+                    "message": "Failed to save patient record"
+                }), 500
+
+            patient_id = patient_record['_id']
+            flask_module.patient_events.publish('insert', patient_id, patient=serialize(patient_record))
+            start_triage(patient_id, {
+                "model_inputs": inputs, "esi": patient_record["esi"], "triage_key": patient_record["triageKey"]
+            })
+
+            return jsonify({
+                "status": "success",
+                "message": "Patient data received, triage in progress",
+                "patient": patient_record,
+                "triage_status_url": f"/api/patients/{patient_id}/triage-status"
+            }), 202
+
+        except Exception as e:
+            print("Error processing request:", str(e))
+            return jsonify({
+                "status": "error",
+                "message": f"Server error: {str(e)}"
+            }), 500
+
+    # GET method - list patients, optionally filtered, projected and paginated
+    try:
+        query = build_patient_filter(request.args)
+        projection = build_projection(request.args)
+        page_size = parse_page_size(request.args)
+        cursor = request.args.get('cursor')
+        descending = request.args.get('order') == 'desc'
+    except ValueError as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 400
+
+    try:
+        # Without limit/cursor keep returning a plain list for the dashboard
+        if page_size is None and not cursor:
+            with metrics.timed('mongo_find'):
+                patients = await patients_collection.find(query, projection).to_list(length=None)
+            for patient in patients:
+                patient['_id'] = str(patient['_id'])
+            return jsonify(patients)
+
+        page_size = page_size or MAX_PAGE_SIZE
+        if projection is not None:
+            projection['timeEntered'] = 1  # Needed to build the next cursor
+        if cursor:
+            query = apply_cursor(query, cursor, descending)
+
+        # Fetch one extra document to know whether there is a next page
+        with metrics.timed('mongo_find'):
+            patients = await (
+                patients_collection.find(query, projection)
+                .sort(sort_order(request.args))
+                .limit(page_size + 1)
+                .to_list(length=None)
+            )
+        has_more = len(patients) > page_size
+        patients = patients[:page_size]
+        next_cursor = encode_cursor(patients[-1]) if has_more else None
+        for patient in patients:
+            patient['_id'] = str(patient['_id'])
+
+        return jsonify({
+            "status": "success",
+            "patients": patients,
+            "count": len(patients),
+            "next_cursor": next_cursor
+        })
+    except ValueError as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            "status": "error",
+            "message": "Failed to retrieve patients"
+        }), 500
+
+
+# Live patient updates, as /api/patients/stream in app.py; each client is an
+# async generator awaiting its own event queue, so open streams hold no thread
+@quart_app.route('/api/patients/stream', methods=['GET'])
+async def stream_patients():
+    try:
+        query = build_patient_filter(request.args)
+        projection = build_projection(request.args)
+    except ValueError as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 400
+
+    events = flask_module.patient_events
+    # Subscribe before reading the snapshot so no change falls in between
+    subscription = events.subscribe_async()
+    last_event_id = request.headers.get('Last-Event-ID')
+
+    async def snapshot():
+        patients = await patients_collection.find(query, projection).to_list(length=None)
+        return format_sse('snapshot', {"patients": [serialize(patient) for patient in patients]}, events.sequence)
+
+    async def generate():
+        try:
+            # Reconnecting clients get the events they missed if still in history
+            missed = events.replay_since(last_event_id) if last_event_id else None
+            if missed is None:
+                yield await snapshot()
+            else:
+                for event in missed:
+                    yield format_sse(event['type'], event, event['id'])
+
+            while True:
+                event = await subscription.get(timeout=flask_module.SSE_HEARTBEAT_SECONDS)
+                if event is None:
+                    yield ": keep-alive\n\n"
+                elif event is RESYNC:
+                    yield await snapshot()
+                else:
+                    yield format_sse(event['type'], event, event['id'])
+        finally:
+            events.unsubscribe(subscription)
+
+    response = Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+    # Streams stay open until the client goes away, past Quart's RESPONSE_TIMEOUT
+    response.timeout = None
+    return response
+
+
+# Forecasts are CPU-bound model evaluations (memoized per date); they run in
+# the default executor so the event loop keeps serving other requests
+@quart_app.route('/api/predict/busyness', methods=['GET'])
+async def predict_busyness():
+    try:
+        location_data, _ = await lookup_location_async(request.remote_addr)
+        timezone = location_data['timezone']
+
+        start = request.args.get('start')
+        end = request.args.get('end')
+        if start or end:
+            if not (start and end):
+                return jsonify({
+                    "status": "error",
+                    "message": "Both start and end are required for a range forecast"
+                }), 400
+            try:
+                predictions = await asyncio.to_thread(flask_module.get_busyness_range, start, end)
+            except ValueError as e:
+                return jsonify({
+                    "status": "error",
+                    "message": str(e)
+                }), 400
+            return jsonify({
+                "status": "success",
+                "predictions": predictions,
+                "timezone": timezone
+            })
+
+        date = request.args.get('date')
+        if not date:
+            date = datetime.now(pytz.timezone(timezone)).strftime('%Y-%m-%d')
+
+        predictions = await asyncio.to_thread(flask_module.get_busyness_prediction, date)
+        if predictions is None:
+            return jsonify({
+                "status": "error",
+                "message": "Failed to generate predictions"
+            }), 500
+        if not isinstance(predictions, list):
+            predictions = [predictions]
+
+        return jsonify({
+            "status": "success",
+            "predictions": predictions,
+            "timezone": timezone
+        })
+
+    except Exception as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 500
+
+
+@quart_app.route('/api/location', methods=['GET'])
+async def get_location():
+    ip = request.remote_addr
+    location, timing = await lookup_location_async(ip)
+    location.update({
+        "date": datetime.now().strftime('%Y-%m-%d'),
+        "ip": ip
+    })
+
+    return jsonify({
+        "status": "success",
+        "location": location,
+        "timing": timing
+    })
+
+
+# googlemaps has no async client; results are cached per location bucket, so
+# the worker thread is only held for the occasional upstream call
+@quart_app.route('/api/emergency-rooms', methods=['GET'])
+async def get_emergency_rooms():
+    return jsonify(await asyncio.to_thread(find_nearest_emergency_rooms))
+
+
+# Everything not routed above is served by the Flask app on a thread pool
+WSGI_THREADS = int(os.getenv('WSGI_THREADS', '32'))
+flask_asgi = WSGIMiddleware(flask_module.app, workers=WSGI_THREADS)
+_async_routes = quart_app.url_map.bind('localhost')
+
+
+def _is_async_route(scope):
+    try:
+        _async_routes.match(scope['path'], method=scope['method'])
+        return True
+    except HTTPException:
+        return False
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and not _is_async_route(scope):
+        await flask_asgi(scope, receive, send)
+    else:
+        await quart_app(scope, receive, send)
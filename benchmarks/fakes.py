@@ -0,0 +1,197 @@
+# Local stand-ins for the external services the Flask app talks to:
+# Gemini (google-genai), Google Maps Places, IP geolocation and ipinfo.io
+import asyncio
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class LatencyDistribution:
+    """
+    Samples simulated upstream latency in seconds from a spec string:
+        'constant:0.8'           always 0.8 s
+        'uniform:0.5,1.5'        uniform between 0.5 and 1.5 s
+        'lognormal:0.8,0.4'      median 0.8 s, sigma 0.4 (long right tail)
+    """
+
+    def __init__(self, spec, seed=None):
+        kind, _, params = spec.partition(':')
+        self.kind = kind
+        self.params = [float(p) for p in params.split(',') if p]
+        self.spec = spec
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        if kind not in ('constant', 'uniform', 'lognormal'):
+            raise ValueError(f"Unknown latency distribution: {spec}")
+
+    def sample(self):
+        with self._lock:
+            if self.kind == 'constant':
+                return self.params[0]
+            if self.kind == 'uniform':
+                return self._random.uniform(self.params[0], self.params[1])
+            median, sigma = self.params
+            return self._random.lognormvariate(0, sigma) * median
+
+
+class _UsageMetadata:
+    def __init__(self, prompt_tokens, output_tokens):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = output_tokens
+        self.total_token_count = prompt_tokens + output_tokens
+
+
+class FakeGenerateResponse:
+    def __init__(self, text, prompt_tokens):
+        self.text = text
+        self.usage_metadata = _UsageMetadata(prompt_tokens, len(text.split()))
+
+
+def _config_value(config, name):
+    # Generation config may be a plain dict or a google.genai types object
+    if isinstance(config, dict):
+        return config.get(name)
+    return getattr(config, name, None)
+
+
+def _prompt_text(contents):
+    if isinstance(contents, str):
+        return contents
+    parts = []
+    for item in contents or []:
+        if isinstance(item, dict):
+            parts.append(str(item.get("text", "")))
+        else:
+            parts.append(str(item))
+    return " ".join(parts)
+
+
+class _FakeModels:
+    def __init__(self, client):
+        self._client = client
+
+    def generate_content(self, model=None, contents=None, config=None):
+        return self._client._respond(contents, config)
+
+
+class _FakeAsyncModels:
+    def __init__(self, client):
+        self._client = client
+
+    async def generate_content(self, model=None, contents=None, config=None):
+        return await self._client._respond_async(contents, config)
+
+
+class _FakeAio:
+    def __init__(self, client):
+        self.models = _FakeAsyncModels(client)
+
+
+class FakeGenAIClient:
+    """
+    Drop-in for google.genai.Client (including client.aio) with simulated
+    latency and an optional error rate. Answers the triage and
+    treatment-plan prompts with plausible canned responses.
+    """
+
+    def __init__(self, latency='lognormal:0.8,0.4', error_rate=0.0, seed=None):
+        self.latency = LatencyDistribution(latency, seed=seed)
+        self.error_rate = error_rate
+        self.models = _FakeModels(self)
+        self.aio = _FakeAio(self)
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _respond(self, contents, config):
+        time.sleep(self.latency.sample())
+        return self._build_response(contents, config)
+
+    async def _respond_async(self, contents, config):
+        await asyncio.sleep(self.latency.sample())
+        return self._build_response(contents, config)
+
+    def _build_response(self, contents, config):
+        with self._lock:
+            self.calls += 1
+            failed = self._random.random() < self.error_rate
+            esi = self._random.choice([2, 3, 3, 3, 4])
+        if failed:
+            raise RuntimeError("Simulated upstream error")
+
+        prompt = _prompt_text(contents)
+        system_instruction = _config_value(config, "system_instruction") or ""
+        prompt_tokens = len(prompt.split()) + len(str(system_instruction).split())
+        if _config_value(config, "response_mime_type") == "application/json":
+            text = json.dumps({
+                "esi": esi,
+                "explanation": "Simulated assessment of the presenting vitals and symptoms",
+                "treatment_plan": "Monitor vitals and provide symptomatic treatment."
+            })
+        elif "Emergency Severity Index" in prompt or "triage level" in prompt:
+            text = f"{esi} - Simulated assessment of the presenting vitals and symptoms"
+        else:
+            text = "Monitor vitals and provide symptomatic treatment."
+        return FakeGenerateResponse(text, prompt_tokens)
+
+
+class FakeMapsClient:
+    """Drop-in for googlemaps.Client.places_nearby with simulated latency"""
+
+    def __init__(self, latency='constant:0.3', seed=None):
+        self.latency = LatencyDistribution(latency, seed=seed)
+        self.calls = 0
+
+    def places_nearby(self, location=None, radius=None, keyword=None, type=None):
+        self.calls += 1
+        time.sleep(self.latency.sample())
+        return {"results": [
+            {
+                "name": f"General Hospital {i}",
+                "vicinity": f"{100 + i} Main St",
+                "place_id": f"fake-place-{i}"
+            }
+            for i in range(8)
+        ]}
+
+
+def fake_locator(latlng=(34.0522, -118.2437)):
+    """Replacement for the geocoder.ip('me') lookup"""
+    return lambda: list(latlng)
+
+
+class IpinfoStubServer:
+    """Local HTTP server answering ipinfo.io-style /<ip>/json requests"""
+
+    def __init__(self, latency='constant:0.05', timezone='America/Los_Angeles', seed=None):
+        latency_dist = LatencyDistribution(latency, seed=seed)
+        payload = json.dumps({"loc": "34.0522,-118.2437", "timezone": timezone}).encode('utf-8')
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(latency_dist.sample())
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url_template(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/{{ip}}/json"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
@@ -0,0 +1,176 @@
+"""
+Compare the pickled busyness model with the memory-mapped artifact
+(busyness_artifact.py): checks that both give bit-identical predictions,
+then starts N worker processes per format that each load the model and
+reports load time and per-worker resident memory (RSS and PSS, which
+splits shared pages between the processes mapping them).
+
+    python benchmarks/model_artifact.py --workers 4
+    python benchmarks/model_artifact.py --model old_busyness_model.pkl --workers 8
+
+Without --model a model is trained from emergency_visits_realistic.csv,
+plus an hourly model on synthetic counts so both forests are covered.
+Memory figures need Linux (/proc/self/smaps_rollup).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+
+def memory_kb():
+    """RSS and PSS of this process in kB (None where /proc is unavailable)"""
+    usage = {"rss_kb": None, "pss_kb": None}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("Rss", "Pss"):
+                    usage[f"{key.lower()}_kb"] = int(value.split()[0])
+    except OSError:
+        pass
+    return usage
+
+
+def child(model_path):
+    """One worker: load the model, wait until every worker has, then report memory"""
+    from busyness_predictor import BusynessPredictor  # pandas/scikit-learn, common to both formats
+    before = memory_kb()
+    started = time.perf_counter()
+    predictor = BusynessPredictor()
+    predictor.load_model(model_path)
+    predictor.predict('2025-01-01')
+    load_ms = (time.perf_counter() - started) * 1000
+    print("loaded", flush=True)
+    sys.stdin.readline()
+    after = memory_kb()
+    print(json.dumps({
+        "load_ms": round(load_ms, 1),
+        "rss_kb": after["rss_kb"],
+        "pss_kb": after["pss_kb"],
+        "rss_delta_kb": after["rss_kb"] - before["rss_kb"] if after["rss_kb"] is not None else None,
+        "pss_delta_kb": after["pss_kb"] - before["pss_kb"] if after["pss_kb"] is not None else None
+    }), flush=True)
+
+
+def run_workers(model_path, workers):
+    """Start all workers, measure once every one of them has the model loaded"""
+    processes = [
+        subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--child", model_path],
+            cwd=REPO_DIR, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+        )
+        for _ in range(workers)
+    ]
+    for process in processes:
+        while process.stdout.readline().strip() != "loaded":
+            if process.poll() is not None:
+                raise RuntimeError(f"worker exited with {process.returncode}")
+    results = []
+    for process in processes:
+        process.stdin.write("measure\n")
+        process.stdin.flush()
+    for process in processes:
+        lines = [line for line in process.stdout.read().splitlines() if line.startswith("{")]
+        results.append(json.loads(lines[-1]))
+        process.wait()
+    return results
+
+
+def train(directory):
+    import numpy as np
+    import pandas as pd
+    from busyness_predictor import BusynessPredictor
+
+    data = pd.read_csv(os.path.join(REPO_DIR, "emergency_visits_realistic.csv")).rename(columns={
+        "date_time": "date",
+        "number_of_people": "busyness_score"
+    })
+    predictor = BusynessPredictor()
+    predictor.train(data)
+
+    hours = pd.date_range("2024-01-01", periods=60 * 24, freq="h")
+    rng = np.random.default_rng(42)
+    surge = np.where((hours.hour >= 17) & (hours.hour <= 20), 6, 0)
+    predictor.train_hourly(pd.DataFrame({"date": hours, "visits": rng.poisson(2, len(hours)) + surge}))
+    predictor.version = "benchmark"
+
+    model_path = os.path.join(directory, "source.pkl")
+    predictor.save_model(model_path, format="pickle")
+    return model_path
+
+
+def check_identical(pickle_path, mapped_path):
+    """Predictions of both formats over ten years of days and a month of hours"""
+    import numpy as np
+    import pandas as pd
+    from busyness_predictor import BusynessPredictor
+
+    original, mapped = BusynessPredictor(), BusynessPredictor()
+    original.load_model(pickle_path)
+    mapped.load_model(mapped_path)
+    days = pd.date_range("2020-01-01", "2029-12-31", freq="D")
+    checks = {"days": (original.predict_many(days), mapped.predict_many(days))}
+    if original.hourly_model is not None:
+        checks["hours"] = (
+            original.predict_hours("2025-01-01", "2025-02-01").to_numpy(),
+            mapped.predict_hours("2025-01-01", "2025-02-01").to_numpy()
+        )
+    return {name: (len(a), bool(np.array_equal(a, b))) for name, (a, b) in checks.items()}
+
+
+def summarize(label, path, results):
+    def median(field):
+        values = [result[field] for result in results if result[field] is not None]
+        return statistics.median(values) if values else float("nan")
+
+    print(f"{label:<8} {os.path.getsize(path) / 1024:>9.0f} {median('load_ms'):>9.1f} "
+          f"{median('rss_delta_kb') / 1024:>10.1f} {median('pss_delta_kb') / 1024:>10.1f} "
+          f"{sum(result['pss_kb'] or 0 for result in results) / 1024:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--model", help="existing model (either format); trained from the CSV if omitted")
+    parser.add_argument("--child", metavar="MODEL", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child)
+        return
+
+    from busyness_artifact import MappedForest
+    from busyness_predictor import BusynessPredictor
+
+    with tempfile.TemporaryDirectory(prefix="busyness-artifact-") as directory:
+        source = BusynessPredictor()
+        source_path = args.model or train(directory)
+        source.load_model(source_path)
+        if isinstance(source.model, MappedForest):
+            sys.exit("--model must be a pickled model: the mapped format cannot be converted back")
+
+        pickle_path = os.path.join(directory, "busyness_model.pkl")
+        mapped_path = os.path.join(directory, "busyness_model.bin")
+        source.save_model(pickle_path, format="pickle")
+        source.save_model(mapped_path)
+
+        for name, (count, identical) in check_identical(pickle_path, mapped_path).items():
+            print(f"{name}: {count} predictions, {'identical' if identical else 'MISMATCH'}")
+
+        print(f"\n{args.workers} workers per format (medians; PSS total is the sum over workers)")
+        print(f"{'format':<8} {'size KiB':>9} {'load ms':>9} {'RSS+ MiB':>10} {'PSS+ MiB':>10} {'PSS total':>10}")
+        summarize("pickle", pickle_path, run_workers(pickle_path, args.workers))
+        summarize("mapped", mapped_path, run_workers(mapped_path, args.workers))
+
+
+if __name__ == "__main__":
+    main()
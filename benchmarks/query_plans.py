@@ -0,0 +1,111 @@
+"""
+Check that patient listings are served in index order: loads synthetic
+patients into a scratch database, creates PATIENT_INDEXES and runs
+explain() for each filter/sort/cursor shape GET /api/patients issues,
+reporting the index used and whether the plan has an in-memory SORT stage.
+
+    python benchmarks/query_plans.py --mongo mongodb://localhost:27017/
+
+Needs a real MongoDB (mongomock has no query planner). The scratch
+database is dropped afterwards.
+"""
+import argparse
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from patient_queries import apply_cursor, build_patient_filter, encode_cursor, ensure_patient_indexes, sort_order  # noqa: E402
+
+SHAPES = {
+    "all": {},
+    "status": {"status": "waiting"},
+    "status_in": {"status": "waiting,in-progress"},
+    "priority": {"priority": "1"},
+    "priority_in": {"priority": "1,2"},
+    "status_priority": {"status": "waiting", "priority": "2"},
+    "status_since": {"status": "waiting", "since": "2025-01-02"},
+}
+
+
+def seed(collection, count, rng):
+    start = datetime(2025, 1, 1)
+    collection.insert_many([
+        {
+            "timeEntered": (start + timedelta(seconds=rng.randrange(7 * 86400))).strftime("%Y-%m-%dT%H:%M:%S"),
+            "status": rng.choice(["waiting", "in-progress", "discharged"]),
+            "priority": rng.randint(1, 5),
+            "esi": str(rng.randint(1, 5))
+        }
+        for _ in range(count)
+    ])
+
+
+def stages(plan):
+    """Every stage name in a (possibly nested) explain plan"""
+    found = [plan.get("stage")]
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            found += stages(plan[key])
+    for child in plan.get("inputStages", []):
+        found += stages(child)
+    return found
+
+
+def index_names(plan):
+    names = [plan["indexName"]] if "indexName" in plan else []
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            names += index_names(plan[key])
+    for child in plan.get("inputStages", []):
+        names += index_names(child)
+    return names
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo", default="mongodb://localhost:27017/")
+    parser.add_argument("--patients", type=int, default=20000)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    from pymongo import MongoClient
+
+    client = MongoClient(args.mongo)
+    database = client["triage_query_plans"]
+    collection = database["patients"]
+    try:
+        seed(collection, args.patients, random.Random(args.seed))
+        ensure_patient_indexes(collection)
+
+        failures = 0
+        print(f"{'shape':<16} {'order':<5} {'page':<6} {'sort':<5} index")
+        for name, params in SHAPES.items():
+            for order in ("asc", "desc"):
+                request_args = dict(params, order=order)
+                query = build_patient_filter(request_args)
+                sort = sort_order(request_args)
+                first = list(collection.find(query).sort(sort).limit(args.limit))
+                pages = {"first": query}
+                if first:
+                    pages["next"] = apply_cursor(query, encode_cursor(first[-1]), order == "desc")
+                for page, page_query in pages.items():
+                    plan = collection.find(page_query).sort(sort).limit(args.limit + 1).explain()
+                    winning = plan["queryPlanner"]["winningPlan"]
+                    in_memory = "SORT" in stages(winning)
+                    failures += in_memory
+                    print(f"{name:<16} {order:<5} {page:<6} {'yes' if in_memory else 'no':<5} "
+                          f"{', '.join(sorted(set(index_names(winning)))) or '(collection scan)'}")
+        print(f"\n{failures} plan(s) with an in-memory SORT stage")
+        sys.exit(1 if failures else 0)
+    finally:
+        client.drop_database(database.name)
+
+
+if __name__ == "__main__":
+    main()
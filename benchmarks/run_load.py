@@ -0,0 +1,393 @@
+"""
+Load test for the Flask API with local stand-ins for every external service.
+
+Runs app.py in-process behind a threaded werkzeug server, with a fake
+Gemini client (configurable latency), fake Google Maps/geolocation, a local
+ipinfo stub and either an in-memory Mongo (mongomock) or a real MongoDB,
+then drives a weighted mix of requests and reports p50/p95/p99 latency and
+throughput per endpoint.
+
+    python benchmarks/run_load.py --duration 30 --concurrency 16 --output results.json
+    python benchmarks/run_load.py --compare results.json   # diff against a previous run
+    python benchmarks/run_load.py --server asgi             # async mode (asgi.py) under uvicorn
+
+Needs the app's requirements plus mongomock (and mongomock-motor for
+--server asgi) for --mongo memory (pip install -r benchmarks/requirements.txt).
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from fakes import FakeGenAIClient, FakeMapsClient, IpinfoStubServer, fake_locator  # noqa: E402
+
+DEFAULT_MIX = "intake=20,list=35,update=15,busyness=10,options=10,queue=5,emergency_rooms=5"
+
+SYMPTOM_SETS = [
+    ["Fever", "Cough", "Fatigue"],  # flu surge: repeated presentations exercise the triage cache
+    ["Fever", "Cough", "Fatigue"],
+    ["Headache"],
+    ["Shortness of breath"],
+    ["Nausea", "Diarrhea"],
+    ["Sore throat"],
+    ["Muscle aches", "Fever"],
+]
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def parse_mix(spec):
+    mix = {}
+    for item in spec.split(','):
+        name, _, weight = item.partition('=')
+        mix[name.strip()] = float(weight)
+    unknown = set(mix) - set(OPERATIONS)
+    if unknown:
+        raise ValueError(f"Unknown operations in mix: {', '.join(sorted(unknown))}")
+    return mix
+
+
+def random_intake(rng):
+    return {
+        "firstName": rng.choice(["Ana", "Ben", "Chen", "Dara", "Eli"]),
+        "lastName": rng.choice(["Lopez", "Smith", "Okafor", "Kim", "Patel"]),
+        "age": rng.randint(1, 95),
+        "vitals": {
+            "temperature": rng.choice([98.6, 99.1, 100.4, 101.2, 102.0]),
+            "pulse": rng.choice([72, 88, 96, 110, 124]),
+            "respirationRate": rng.choice([14, 16, 18, 22]),
+            "bloodPressure": {
+                "systolic": rng.choice([110, 120, 135, 150]),
+                "diastolic": rng.choice([70, 80, 90]),
+            },
+        },
+        "symptoms": {"selected": rng.choice(SYMPTOM_SETS), "notes": ""},
+    }
+
+
+class LoadContext:
+    """State shared by the worker threads"""
+
+    def __init__(self, base_url, seed):
+        self.base_url = base_url
+        self.patient_ids = []
+        self.lock = threading.Lock()
+        self.seed = seed
+
+    def remember(self, patient_id):
+        with self.lock:
+            self.patient_ids.append(patient_id)
+
+    def pick_patient(self, rng):
+        with self.lock:
+            return rng.choice(self.patient_ids) if self.patient_ids else None
+
+
+def op_intake(session, ctx, rng):
+    response = session.post(f"{ctx.base_url}/api/patients", json=random_intake(rng))
+    if response.ok:
+        ctx.remember(response.json()["patient"]["_id"])
+    return response
+
+
+def op_list(session, ctx, rng):
+    return session.get(f"{ctx.base_url}/api/patients", params={"status": "waiting", "limit": 50})
+
+
+def op_update(session, ctx, rng):
+    patient_id = ctx.pick_patient(rng)
+    if patient_id is None:
+        return op_intake(session, ctx, rng)
+    return session.put(
+        f"{ctx.base_url}/api/patients/{patient_id}",
+        json={"status": rng.choice(["waiting", "in-progress"]), "notes": "benchmark update"}
+    )
+
+
+def op_busyness(session, ctx, rng):
+    return session.get(f"{ctx.base_url}/api/predict/busyness")
+
+
+def op_options(session, ctx, rng):
+    return session.get(f"{ctx.base_url}/api/options")
+
+
+def op_queue(session, ctx, rng):
+    return session.get(f"{ctx.base_url}/api/queue", params={"limit": 10})
+
+
+def op_emergency_rooms(session, ctx, rng):
+    return session.get(f"{ctx.base_url}/api/emergency-rooms")
+
+
+OPERATIONS = {
+    "intake": op_intake,
+    "list": op_list,
+    "update": op_update,
+    "busyness": op_busyness,
+    "options": op_options,
+    "queue": op_queue,
+    "emergency_rooms": op_emergency_rooms,
+}
+
+
+def prepare_environment(args):
+    """Point the app at local stand-ins; must run before app is imported"""
+    ipinfo = IpinfoStubServer(latency=args.ipinfo_latency, seed=args.seed).start()
+    os.environ["IPINFO_URL"] = ipinfo.url_template
+    os.environ.setdefault("GOOGLE_API_KEY", "benchmark-fake-key")
+    os.environ.setdefault("MAPS_API_KEY", "AIzaBenchmarkFakeKey000000000000000000000")
+
+    if args.mongo == "memory":
+        try:
+            import mongomock
+        except ImportError:
+            sys.exit("--mongo memory needs mongomock (pip install -r benchmarks/requirements.txt)")
+        import pymongo
+        # One in-memory server shared by every client the app creates
+        shared = mongomock.MongoClient()
+        pymongo.MongoClient = lambda *_, **__: shared
+    else:
+        os.environ["MONGO_URI"] = args.mongo
+
+    if not os.getenv("BUSYNESS_MODEL_PATH"):
+        model_path = os.path.join(tempfile.mkdtemp(prefix="triage-bench-"), "busyness_model.bin")
+        train_busyness_model(model_path)
+        os.environ["BUSYNESS_MODEL_PATH"] = model_path
+    return ipinfo
+
+
+def train_busyness_model(model_path):
+    import pandas as pd
+    from busyness_predictor import BusynessPredictor
+
+    data = pd.read_csv(os.path.join(REPO_DIR, 'emergency_visits_realistic.csv'))
+    data = data.rename(columns={'date_time': 'date', 'number_of_people': 'busyness_score'})
+    predictor = BusynessPredictor()
+    predictor.train(data)
+    predictor.save_model(model_path)
+
+
+def start_app(args):
+    import logging
+    import map as maps_module
+    import model
+    import app as app_module
+    from werkzeug.serving import make_server
+
+    # Per-request access logs would swamp the report
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    genai = FakeGenAIClient(latency=args.genai_latency, error_rate=args.genai_error_rate, seed=args.seed)
+    model.configure(genai)
+    maps_module.configure(maps_client=FakeMapsClient(latency=args.maps_latency, seed=args.seed),
+                          locator=fake_locator())
+
+    if args.server == 'asgi':
+        return start_asgi(args, app_module), genai
+
+    server = make_server('127.0.0.1', 0, app_module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, genai
+
+
+class AsgiServer:
+    """uvicorn running asgi.application in a background thread"""
+
+    def __init__(self, application):
+        import uvicorn
+
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            self.server_port = probe.getsockname()[1]
+        self._server = uvicorn.Server(uvicorn.Config(
+            application, host='127.0.0.1', port=self.server_port, log_level='warning'
+        ))
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.05)
+        return self
+
+    def shutdown(self):
+        self._server.should_exit = True
+        self._thread.join(timeout=10)
+
+
+def start_asgi(args, app_module):
+    if args.mongo == "memory":
+        # Share the in-memory database between the Flask routes and motor
+        import motor.motor_asyncio
+        import pymongo
+        from mongomock_motor import AsyncMongoMockClient
+        motor.motor_asyncio.AsyncIOMotorClient = (
+            lambda *_, **__: AsyncMongoMockClient(mock_mongo_client=pymongo.MongoClient())
+        )
+    import asgi
+    return AsgiServer(asgi.application).start()
+
+
+def run_load(base_url, mix, args):
+    import requests
+
+    ctx = LoadContext(base_url, args.seed)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    samples = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    lock = threading.Lock()
+    deadline = time.monotonic() + args.duration
+
+    def worker(worker_id):
+        rng = random.Random(args.seed * 1000 + worker_id)
+        session = requests.Session()
+        while time.monotonic() < deadline:
+            name = rng.choices(names, weights)[0]
+            start = time.perf_counter()
+            try:
+                response = OPERATIONS[name](session, ctx, rng)
+                ok = response.status_code < 400
+            except Exception:
+                ok = False
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            with lock:
+                samples[name].append(elapsed_ms)
+                if not ok:
+                    errors[name] += 1
+
+    # Seed a few patients so updates have something to work on
+    seed_session = requests.Session()
+    seed_rng = random.Random(args.seed)
+    for _ in range(5):
+        op_intake(seed_session, ctx, seed_rng)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(worker, range(args.concurrency)))
+    wall = time.perf_counter() - started
+
+    endpoints = {}
+    for name in names:
+        values = sorted(samples[name])
+        endpoints[name] = {
+            "requests": len(values),
+            "errors": errors[name],
+            "rps": round(len(values) / wall, 2),
+            "mean_ms": round(sum(values) / len(values), 2) if values else None,
+            "p50_ms": round(percentile(values, 50), 2) if values else None,
+            "p95_ms": round(percentile(values, 95), 2) if values else None,
+            "p99_ms": round(percentile(values, 99), 2) if values else None,
+            "max_ms": round(values[-1], 2) if values else None,
+        }
+    total = sum(len(v) for v in samples.values())
+    return endpoints, {"requests": total, "rps": round(total / wall, 2), "wall_seconds": round(wall, 2)}
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def print_report(results, baseline=None):
+    print(f"\n{'endpoint':<16}{'reqs':>7}{'err':>6}{'rps':>9}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for name, stats in results["endpoints"].items():
+        line = (f"{name:<16}{stats['requests']:>7}{stats['errors']:>6}{stats['rps']:>9}"
+                f"{stats['p50_ms'] or 0:>10.1f}{stats['p95_ms'] or 0:>10.1f}{stats['p99_ms'] or 0:>10.1f}")
+        previous = (baseline or {}).get("endpoints", {}).get(name)
+        if previous and previous.get("p95_ms") and stats.get("p95_ms"):
+            change = (stats["p95_ms"] - previous["p95_ms"]) / previous["p95_ms"] * 100
+            line += f"   p95 {change:+.1f}% vs baseline"
+        print(line)
+    total = results["total"]
+    print(f"\ntotal: {total['requests']} requests in {total['wall_seconds']} s ({total['rps']} req/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=20, help="seconds of load")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent clients")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="weighted operations, name=weight,...")
+    parser.add_argument("--genai-latency", default="lognormal:0.8,0.4", help="fake Gemini latency distribution")
+    parser.add_argument("--genai-error-rate", type=float, default=0.0, help="fraction of fake Gemini calls that fail")
+    parser.add_argument("--maps-latency", default="constant:0.3", help="fake Places latency distribution")
+    parser.add_argument("--ipinfo-latency", default="constant:0.05", help="ipinfo stub latency distribution")
+    parser.add_argument("--server", choices=("wsgi", "asgi"), default="wsgi",
+                        help="threaded werkzeug (app.py) or uvicorn (asgi.py)")
+    parser.add_argument("--mongo", default="memory", help="'memory' for mongomock, or a MongoDB URI")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--compare", help="previous results JSON to compare against")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    prepare_environment(args)
+    server, genai = start_app(args)
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    endpoints, total = run_load(base_url, mix, args)
+
+    import requests
+    triage_queue = requests.get(f"{base_url}/api/triage/queue").json().get("queue")
+    server.shutdown()
+
+    results = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "config": {
+            "duration": args.duration,
+            "concurrency": args.concurrency,
+            "server": args.server,
+            "mix": mix,
+            "genai_latency": args.genai_latency,
+            "genai_error_rate": args.genai_error_rate,
+            "maps_latency": args.maps_latency,
+            "ipinfo_latency": args.ipinfo_latency,
+            "mongo": "memory" if args.mongo == "memory" else "uri",
+            "seed": args.seed,
+        },
+        "endpoints": endpoints,
+        "total": total,
+        "genai_calls": genai.calls,
+        "triage_queue": triage_queue,
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Cold-start timing: import app.py in fresh interpreters and serve a first
+request, reporting import time and import-to-first-response time.
+
+    python benchmarks/startup.py --runs 5
+    python benchmarks/startup.py --path /api/options   # first request that needs Mongo
+
+MongoDB is in-memory (mongomock) unless --mongo gives a URI; no API keys are needed.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+
+def child(path, mongo):
+    """Runs in the fresh interpreter; prints one JSON line of timings"""
+    started = time.perf_counter()
+    sys.path.insert(0, REPO_DIR)
+    if mongo == "memory":
+        import mongomock
+        import pymongo
+        shared = mongomock.MongoClient()
+        pymongo.MongoClient = lambda *_, **__: shared
+    else:
+        os.environ["MONGO_URI"] = mongo
+
+    import app as app_module
+    imported = time.perf_counter()
+    response = app_module.app.test_client().get(path)
+    responded = time.perf_counter()
+    print(json.dumps({
+        "import_ms": round((imported - started) * 1000, 1),
+        "first_request_ms": round((responded - imported) * 1000, 1),
+        "import_to_first_response_ms": round((responded - started) * 1000, 1),
+        "status": response.status_code
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--path", default="/healthz", help="first request to serve")
+    parser.add_argument("--mongo", default="memory", help="'memory' for mongomock, or a MongoDB URI")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.path, args.mongo)
+        return
+
+    # No API keys: startup must not depend on them
+    env = {key: value for key, value in os.environ.items() if key not in ("GOOGLE_API_KEY", "MAPS_API_KEY")}
+    runs = []
+    for _ in range(args.runs):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", "--path", args.path, "--mongo", args.mongo],
+            env=env, cwd=REPO_DIR, capture_output=True, text=True, check=True
+        ).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    for field in ("import_ms", "first_request_ms", "import_to_first_response_ms"):
+        values = [run[field] for run in runs]
+        print(f"{field:<30} median {statistics.median(values):>8.1f}   min {min(values):>8.1f}   max {max(values):>8.1f}")
+    print(f"first response status: {', '.join(str(run['status']) for run in runs)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+# Compact busyness model artifact: the fitted scaler and tree arrays are
+# stored as flat, aligned numeric buffers that every worker memory-maps
+# read-only, so the pages are shared through the OS page cache instead of
+# each process unpickling its own copy of the forest
+#
+# Layout:
+#   MAGIC (8 bytes) | format version (uint32) | header length (uint32)
+#   | SHA-256 of header + payload (32 bytes) | JSON header, padded to ALIGNMENT
+#   | payload: one ALIGNMENT-aligned buffer per array listed in the header
+import hashlib
+import json
+import mmap
+import struct
+
+import numpy as np
+
+MAGIC = b'TRIAGEBM'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+_PREAMBLE = struct.Struct('<8sII32s')
+
+
+class ArtifactError(ValueError):
+    """The file is not a readable busyness model artifact"""
+
+
+def is_artifact(filepath):
+    """True if filepath starts with the artifact magic (False for pickles)"""
+    with open(filepath, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+class MappedScaler:
+    """StandardScaler.transform over stored mean_/scale_, with the same float64 arithmetic"""
+
+    def __init__(self, mean, scale):
+        self.mean_ = mean
+        self.scale_ = scale
+
+    def transform(self, X):
+        X = np.array(X, dtype=np.float64)
+        X -= self.mean_
+        X /= self.scale_
+        return X
+
+
+class MappedForest:
+    """
+    Prediction for a fitted RandomForestRegressor (or ExtraTrees/DecisionTree
+    regressor) from flattened node arrays. Matches sklearn exactly: inputs are
+    cast to float32 as in tree prediction, each node compares against its
+    float64 threshold, and per-tree outputs are summed in tree order before
+    dividing by the number of trees. Missing-value routing is not supported.
+    """
+
+    def __init__(self, roots, feature, threshold, left, right, value, max_depth):
+        self.roots = roots
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.max_depth = max_depth
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        n_samples = X.shape[0]
+        rows = np.arange(n_samples)
+        # Current node of every (tree, sample) pair, all walked one level at a time
+        nodes = np.repeat(self.roots[:, np.newaxis], n_samples, axis=1)
+        for _ in range(self.max_depth):
+            left = self.left[nodes]
+            internal = left != -1
+            if not internal.any():
+                break
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(internal, np.where(go_left, left, self.right[nodes]), nodes)
+
+        leaf_values = self.value[nodes]
+        y_hat = np.zeros(n_samples, dtype=np.float64)
+        for tree_values in leaf_values:
+            y_hat += tree_values
+        y_hat /= self.n_trees
+        return y_hat
+
+
+def _forest_arrays(model):
+    """Concatenate every tree's node arrays, with child indices made global"""
+    estimators = getattr(model, 'estimators_', [model])
+    roots, features, thresholds, lefts, rights, values = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for estimator in estimators:
+        tree = estimator.tree_
+        if tree.n_outputs != 1:
+            raise ArtifactError("Only single-output regressors can be stored")
+        left = tree.children_left.astype(np.int32)
+        right = tree.children_right.astype(np.int32)
+        roots.append(offset)
+        features.append(np.maximum(tree.feature, 0).astype(np.int32))
+        thresholds.append(tree.threshold.astype(np.float64))
+        lefts.append(np.where(left == -1, -1, left + offset).astype(np.int32))
+        rights.append(np.where(right == -1, -1, right + offset).astype(np.int32))
+        values.append(tree.value[:, 0, 0].astype(np.float64))
+        offset += tree.node_count
+        max_depth = max(max_depth, tree.max_depth)
+    return {
+        'roots': np.array(roots, dtype=np.int32),
+        'feature': np.concatenate(features),
+        'threshold': np.concatenate(thresholds),
+        'left': np.concatenate(lefts),
+        'right': np.concatenate(rights),
+        'value': np.concatenate(values)
+    }, max_depth
+
+
+def _pad(length):
+    return (-length) % ALIGNMENT
+
+
+def save(predictor, filepath):
+    """Write predictor's daily (and hourly, if trained) model and scaler to filepath"""
+    arrays = {}
+    models = {}
+    for name, model, scaler in (
+        ('daily', predictor.model, predictor.scaler),
+        ('hourly', predictor.hourly_model, predictor.hourly_scaler)
+    ):
+        if model is None:
+            continue
+        forest, max_depth = _forest_arrays(model)
+        for key, array in forest.items():
+            arrays[f'{name}.{key}'] = array
+        arrays[f'{name}.mean'] = np.asarray(scaler.mean_, dtype=np.float64)
+        arrays[f'{name}.scale'] = np.asarray(scaler.scale_, dtype=np.float64)
+        models[name] = {'max_depth': int(max_depth)}
+
+    layout = {}
+    payload = bytearray()
+    for key, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        layout[key] = {'offset': len(payload), 'dtype': array.dtype.str, 'shape': list(array.shape)}
+        payload += array.tobytes()
+        payload += b'\0' * _pad(len(payload))
+
+    header = json.dumps({'version': predictor.version, 'models': models, 'arrays': layout}).encode('utf-8')
+    header += b' ' * _pad(_PREAMBLE.size + len(header))
+    checksum = hashlib.sha256(header + payload).digest()
+
+    with open(filepath, 'wb') as f:
+        f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header), checksum))
+        f.write(header)
+        f.write(payload)
+
+
+def load(filepath, verify=True):
+    """
+    Memory-map an artifact written by save()
+    Returns:
+        dict: 'model', 'scaler', 'hourly_model', 'hourly_scaler' (None if absent) and 'version'
+    Raises:
+        ArtifactError: On a bad magic, unknown format version or checksum mismatch
+    """
+    with open(filepath, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if len(buffer) < _PREAMBLE.size:
+        raise ArtifactError(f"{filepath}: truncated artifact")
+    magic, format_version, header_length, checksum = _PREAMBLE.unpack_from(buffer)
+    if magic != MAGIC:
+        raise ArtifactError(f"{filepath}: not a busyness model artifact")
+    if format_version != FORMAT_VERSION:
+        raise ArtifactError(f"{filepath}: unsupported artifact format {format_version}")
+
+    view = memoryview(buffer)
+    if verify and hashlib.sha256(view[_PREAMBLE.size:]).digest() != checksum:
+        raise ArtifactError(f"{filepath}: checksum mismatch")
+    header = json.loads(bytes(view[_PREAMBLE.size:_PREAMBLE.size + header_length]))
+    payload_start = _PREAMBLE.size + header_length
+
+    def array(key):
+        spec = header['arrays'][key]
+        dtype = np.dtype(spec['dtype'])
+        count = int(np.prod(spec['shape']))
+        return np.frombuffer(buffer, dtype=dtype, count=count, offset=payload_start + spec['offset'])
+
+    result = {'model': None, 'scaler': None, 'hourly_model': None, 'hourly_scaler': None,
+              'version': header.get('version')}
+    for name, spec in header['models'].items():
+        prefix = '' if name == 'daily' else f'{name}_'
+        result[f'{prefix}model'] = MappedForest(
+            array(f'{name}.roots'), array(f'{name}.feature'), array(f'{name}.threshold'),
+            array(f'{name}.left'), array(f'{name}.right'), array(f'{name}.value'),
+            spec['max_depth']
+        )
+        result[f'{prefix}scaler'] = MappedScaler(array(f'{name}.mean'), array(f'{name}.scale'))
+    return result
@@ -0,0 +1,255 @@
+"""
+Model selection for BusynessPredictor: time-series cross-validation of a
+grid of tree regressors, run in parallel across cores, reporting accuracy
+next to fit time, artifact size and prediction latency so the chosen model
+meets a serving latency budget.
+
+    python busyness_model_selection.py --output model_selection.json
+    python busyness_model_selection.py --latency-budget-us 300 --save busyness_model.bin
+
+Only models busyness_artifact can store are searched (random forests,
+extra trees and single decision trees), so any candidate can be deployed.
+Runs are reproducible: every model is seeded from --seed and the folds
+are fixed by the data order.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import sklearn
+from joblib import Parallel, delayed
+from sklearn.ensemble import ExtraTreesRegressor, RandomForestRegressor
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from sklearn.model_selection import TimeSeriesSplit
+from sklearn.preprocessing import StandardScaler
+from sklearn.tree import DecisionTreeRegressor
+
+from busyness_predictor import BusynessPredictor
+
+# Hyperparameter grid per model family; the current production model is
+# RandomForestRegressor(n_estimators=100) with default depth
+SEARCH_SPACE = {
+    "random_forest": (RandomForestRegressor, {
+        "n_estimators": [10, 25, 50, 100],
+        "max_depth": [6, 10, None],
+        "min_samples_leaf": [1, 5]
+    }),
+    "extra_trees": (ExtraTreesRegressor, {
+        "n_estimators": [10, 25, 50, 100],
+        "max_depth": [6, 10, None],
+        "min_samples_leaf": [1, 5]
+    }),
+    "decision_tree": (DecisionTreeRegressor, {
+        "max_depth": [4, 6, 8, 10],
+        "min_samples_leaf": [1, 5, 10]
+    })
+}
+
+
+def candidates(seed):
+    """Every (family, params) combination in SEARCH_SPACE, in a fixed order"""
+    result = []
+    for family, (_, grid) in SEARCH_SPACE.items():
+        for values in itertools.product(*grid.values()):
+            params = dict(zip(grid, values))
+            params["random_state"] = seed
+            result.append((family, params))
+    return result
+
+
+def estimator_from_report(report_path):
+    """Unfitted estimator for the model a report chose; None without a report or a choice"""
+    if not report_path or not os.path.exists(report_path):
+        return None
+    with open(report_path) as f:
+        chosen = json.load(f).get("chosen")
+    if not chosen:
+        return None
+    return SEARCH_SPACE[chosen["family"]][0](**chosen["params"])
+
+
+def load_history(csv_path):
+    data = pd.read_csv(csv_path).rename(columns={
+        'date_time': 'date',
+        'number_of_people': 'busyness_score'
+    })
+    return data.sort_values('date').reset_index(drop=True)
+
+
+def evaluate(family, params, X, y, n_splits):
+    """
+    Time-series CV scores for one candidate, then a timed refit on all data
+    Runs in a worker process; every model is single-threaded so the search
+    parallelizes across candidates
+    """
+    estimator_class = SEARCH_SPACE[family][0]
+    folds = []
+    for train_index, test_index in TimeSeriesSplit(n_splits=n_splits).split(X):
+        scaler = StandardScaler().fit(X[train_index])
+        model = estimator_class(**params).fit(scaler.transform(X[train_index]), y[train_index])
+        y_pred = model.predict(scaler.transform(X[test_index]))
+        folds.append({
+            "rmse": float(np.sqrt(mean_squared_error(y[test_index], y_pred))),
+            "mae": float(mean_absolute_error(y[test_index], y_pred)),
+            "r2": float(r2_score(y[test_index], y_pred))
+        })
+
+    predictor = BusynessPredictor(model=estimator_class(**params))
+    started = time.perf_counter()
+    predictor.model.fit(predictor.scaler.fit_transform(X), y)
+    fit_seconds = time.perf_counter() - started
+    return family, params, folds, fit_seconds, predictor
+
+
+def measure_latency(predictor, directory, name, repeats):
+    """
+    Artifact size, and single-date latency through the mapped artifact as
+    served: end to end (pandas feature preparation included) and for the
+    model alone, which is the part the candidates differ in
+    """
+    path = os.path.join(directory, f"{name}.bin")
+    predictor.save_model(path)
+    served = BusynessPredictor()
+    served.load_model(path)
+
+    dates = pd.date_range("2025-01-01", periods=repeats, freq="D")
+    rows = served.scaler.transform(served.prepare_features(pd.DataFrame({'date': dates})))
+    model_only = []
+    for row in rows:
+        started = time.perf_counter()
+        served.model.predict(row[np.newaxis, :])
+        model_only.append(time.perf_counter() - started)
+    end_to_end = []
+    for date in dates.strftime('%Y-%m-%d'):
+        started = time.perf_counter()
+        served.predict(date)
+        end_to_end.append(time.perf_counter() - started)
+    return {
+        "artifact_kb": round(os.path.getsize(path) / 1024, 1),
+        "model_p50_us": round(statistics.median(model_only) * 1e6, 1),
+        "model_p95_us": round(float(np.percentile(model_only, 95)) * 1e6, 1),
+        "predict_p50_us": round(statistics.median(end_to_end) * 1e6, 1)
+    }
+
+
+def run_search(data, seed=42, n_splits=5, n_jobs=-1, latency_repeats=100, latency_budget_us=None):
+    """
+    Evaluate every candidate and pick the most accurate one within the budget
+    Returns:
+        (dict, BusynessPredictor): The report, and the chosen model refit on all data
+    """
+    X = BusynessPredictor().prepare_features(data.copy())
+    feature_names = list(X.columns)
+    X = X.to_numpy(dtype=np.float64)
+    y = data['busyness_score'].to_numpy(dtype=np.float64)
+
+    started = time.perf_counter()
+    evaluated = Parallel(n_jobs=n_jobs)(
+        delayed(evaluate)(family, params, X, y, n_splits) for family, params in candidates(seed)
+    )
+    search_seconds = time.perf_counter() - started
+
+    results = []
+    predictors = []
+    # Latency is measured one model at a time, after the search, so cores are not contended
+    with tempfile.TemporaryDirectory(prefix="busyness-selection-") as directory:
+        for index, (family, params, folds, fit_seconds, predictor) in enumerate(evaluated):
+            results.append({
+                "family": family,
+                "params": params,
+                "cv_rmse": round(statistics.mean(fold["rmse"] for fold in folds), 3),
+                "cv_rmse_std": round(statistics.pstdev(fold["rmse"] for fold in folds), 3),
+                "cv_mae": round(statistics.mean(fold["mae"] for fold in folds), 3),
+                "cv_r2": round(statistics.mean(fold["r2"] for fold in folds), 4),
+                "fit_seconds": round(fit_seconds, 4),
+                **measure_latency(predictor, directory, f"candidate-{index}", latency_repeats)
+            })
+            predictors.append(predictor)
+
+    order = sorted(range(len(results)), key=lambda i: (results[i]["cv_rmse"], results[i]["model_p50_us"]))
+    eligible = [i for i in order if latency_budget_us is None or results[i]["model_p50_us"] <= latency_budget_us]
+    chosen = eligible[0] if eligible else None
+    baseline = next(
+        (i for i, result in enumerate(results)
+         if result["family"] == "random_forest" and result["params"]["n_estimators"] == 100
+         and result["params"]["max_depth"] is None and result["params"]["min_samples_leaf"] == 1),
+        None
+    )
+
+    report = {
+        "created_at": datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        "config": {
+            "seed": seed,
+            "cv_splits": n_splits,
+            "days": len(data),
+            "first_day": str(data['date'].iloc[0])[:10],
+            "last_day": str(data['date'].iloc[-1])[:10],
+            "features": feature_names,
+            "latency_budget_us": latency_budget_us,
+            "n_jobs": n_jobs,
+            "cpu_count": os.cpu_count(),
+            "python": platform.python_version(),
+            "sklearn": sklearn.__version__
+        },
+        "search_seconds": round(search_seconds, 2),
+        "baseline": results[baseline] if baseline is not None else None,
+        "chosen": results[chosen] if chosen is not None else None,
+        "candidates": [results[i] for i in order]
+    }
+    return report, predictors[chosen] if chosen is not None else None
+
+
+def print_report(report, limit):
+    print(f"{len(report['candidates'])} candidates, {report['config']['cv_splits']}-fold time-series CV "
+          f"over {report['config']['days']} days in {report['search_seconds']:.1f} s")
+    print(f"{'family':<14} {'params':<46} {'cv rmse':>8} {'cv r2':>7} {'fit s':>7} {'KiB':>7} {'model us':>9} {'total us':>9}")
+    for result in report["candidates"][:limit]:
+        params = ", ".join(f"{key}={value}" for key, value in result["params"].items() if key != "random_state")
+        print(f"{result['family']:<14} {params:<46} {result['cv_rmse']:>8.2f} {result['cv_r2']:>7.3f} "
+              f"{result['fit_seconds']:>7.3f} {result['artifact_kb']:>7.0f} {result['model_p50_us']:>9.0f} "
+              f"{result['predict_p50_us']:>9.0f}")
+    for label in ("baseline", "chosen"):
+        result = report[label]
+        if result is None:
+            print(f"{label}: none" + (" within the latency budget" if label == "chosen" else ""))
+        else:
+            print(f"{label}: {result['family']} {result['params']} cv rmse {result['cv_rmse']:.2f}, "
+                  f"model p50 {result['model_p50_us']:.0f} us, {result['artifact_kb']:.0f} KiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", default="emergency_visits_realistic.csv", help="daily history (date_time, number_of_people)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--splits", type=int, default=5, help="time-series CV folds")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="worker processes for the search (-1 = all cores)")
+    parser.add_argument("--latency-budget-us", type=float, help="max p50 single-date model latency")
+    parser.add_argument("--latency-repeats", type=int, default=100)
+    parser.add_argument("--output", default="model_selection.json", help="comparison report (JSON)")
+    parser.add_argument("--save", help="write the chosen model to this path")
+    parser.add_argument("--top", type=int, default=15, help="candidates to print")
+    args = parser.parse_args()
+
+    report, chosen = run_search(
+        load_history(args.csv), seed=args.seed, n_splits=args.splits, n_jobs=args.n_jobs,
+        latency_repeats=args.latency_repeats, latency_budget_us=args.latency_budget_us
+    )
+    print_report(report, args.top)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.output}")
+
+    if args.save and chosen is not None:
+        chosen.save_model(args.save)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,28 +5,63 @@ from sklearn.ensemble import RandomForestRegressor
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import mean_squared_error, r2_score
 import pickle
+import os
+import threading
+
+import busyness_artifact
+import metrics
+
+# Upper bound on memoized per-date predictions held by one predictor
+PREDICTION_CACHE_SIZE = 4096
 
 class BusynessPredictor:
-    def __init__(self):
-        self.model = RandomForestRegressor(n_estimators=100, random_state=42)
+    def __init__(self, model=None):
+        # Any single-output tree regressor busyness_artifact can store; see busyness_model_selection.py
+        self.model = model if model is not None else RandomForestRegressor(n_estimators=100, random_state=42)
         self.scaler = StandardScaler()
+        # Hour-of-day model, trained separately from hourly visit counts; None until then
+        self.hourly_model = None
+        self.hourly_scaler = None
+        # Set by busyness_training when a model is retrained; None for the offline CSV model
+        self.version = None
+        # Predictions are deterministic for a given model, so they are memoized
+        # per date; a new predictor is created whenever the model changes
+        self._prediction_cache = {}
         
-    def save_model(self, filepath='busyness_model.pkl'):
-        """Save the trained model and scaler"""
+    def save_model(self, filepath='busyness_model.bin', format='mapped'):
+        """
+        Save the trained model and scaler
+        format: 'mapped' for the memory-mappable artifact (busyness_artifact.py),
+        'pickle' for the whole sklearn objects
+        """
+        if format == 'mapped':
+            busyness_artifact.save(self, filepath)
+            print(f"Model saved to {filepath}")
+            return
         model_data = {
             'model': self.model,
-            'scaler': self.scaler
+            'scaler': self.scaler,
+            'hourly_model': self.hourly_model,
+            'hourly_scaler': self.hourly_scaler,
+            'version': self.version
         }
         with open(filepath, 'wb') as f:
             pickle.dump(model_data, f)
         print(f"Model saved to {filepath}")
     
-    def load_model(self, filepath='busyness_model.pkl'):
-        """Load a trained model and scaler"""
-        with open(filepath, 'rb') as f:
-            model_data = pickle.load(f)
+    def load_model(self, filepath='busyness_model.bin'):
+        """Load a trained model and scaler from either format written by save_model"""
+        with metrics.timed('busyness_model_load'):
+            if busyness_artifact.is_artifact(filepath):
+                model_data = busyness_artifact.load(filepath)
+            else:
+                with open(filepath, 'rb') as f:
+                    model_data = pickle.load(f)
         self.model = model_data['model']
         self.scaler = model_data['scaler']
+        self.hourly_model = model_data.get('hourly_model')
+        self.hourly_scaler = model_data.get('hourly_scaler')
+        self.version = model_data.get('version')
         print(f"Model loaded from {filepath}")
         
     def prepare_features(self, df):
@@ -48,36 +83,70 @@ class BusynessPredictor:
                    'is_month_start', 'is_month_end', 'quarter']
         return df[features]
     
+    def prepare_hourly_features(self, df):
+        """Day-level features plus the hour of day, for hourly timestamps in df['date']"""
+        X = self.prepare_features(df).copy()
+        X['hour'] = df['date'].dt.hour
+        return X
+
     def train(self, data):
         """
         Train the model
         data: DataFrame with columns ['date', 'busyness_score']
+        The last 20% of days are held out for the returned scores, then the
+        model is refit on every day so forecasts use the most recent data
         """
+        data = data.sort_values('date').reset_index(drop=True)
         X = self.prepare_features(data)
         y = data['busyness_score']
         
-        # Scale features
-        X_scaled = self.scaler.fit_transform(X)
-        
-        # Split data
+        # Split chronologically: a random split would train on days after the ones it is scored on
         X_train, X_test, y_train, y_test = train_test_split(
-            X_scaled, y, test_size=0.2, random_state=42
+            X, y, test_size=0.2, shuffle=False
         )
         
-        # Train model
-        self.model.fit(X_train, y_train)
-        
-        # Evaluate
-        y_pred = self.model.predict(X_test)
+        # Train and evaluate on the split
+        self.model.fit(self.scaler.fit_transform(X_train), y_train)
+        y_pred = self.model.predict(self.scaler.transform(X_test))
         mse = mean_squared_error(y_test, y_pred)
         r2 = r2_score(y_test, y_pred)
         
+        # Refit on everything for serving
+        self.model.fit(self.scaler.fit_transform(X), y)
+        
         return {
             'mse': mse,
             'r2': r2,
             'feature_importance': dict(zip(X.columns, self.model.feature_importances_))
         }
-    
+
+    def train_hourly(self, data, n_estimators=100):
+        """
+        Train the hour-of-day model
+        data: DataFrame with columns ['date', 'visits'], one row per hour (including zero-visit hours)
+        Scored on the last 20% of hours, then refit on all of them like train()
+        """
+        data = data.sort_values('date').reset_index(drop=True)
+        X = self.prepare_hourly_features(data)
+        y = data['visits']
+
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=0.2, shuffle=False
+        )
+
+        hourly_scaler = StandardScaler()
+        hourly_model = RandomForestRegressor(n_estimators=n_estimators, random_state=42)
+        hourly_model.fit(hourly_scaler.fit_transform(X_train), y_train)
+        y_pred = hourly_model.predict(hourly_scaler.transform(X_test))
+        hourly_model.fit(hourly_scaler.fit_transform(X), y)
+
+        self.hourly_model, self.hourly_scaler = hourly_model, hourly_scaler
+        return {
+            'mse': mean_squared_error(y_test, y_pred),
+            'r2': r2_score(y_test, y_pred),
+            'feature_importance': dict(zip(X.columns, hourly_model.feature_importances_))
+        }
+
     def predict(self, date):
         """
         Predict busyness for a given date
@@ -93,6 +162,106 @@ class BusynessPredictor:
         
         return self.model.predict(X_scaled)[0]
 
+    def predict_many(self, dates):
+        """
+        Predict busyness for many dates with one feature pass and one forest call
+        dates: iterable of datetime objects or strings that can be converted to datetime
+        Returns: numpy array of predictions in the same order as dates
+        """
+        df = pd.DataFrame({'date': pd.to_datetime(list(dates))})
+        if df.empty:
+            return np.array([])
+        X = self.prepare_features(df)
+        X_scaled = self.scaler.transform(X)
+        return self.model.predict(X_scaled)
+
+    def predict_range(self, start, end):
+        """
+        Predict busyness for every day from start to end (inclusive)
+        Returns: pandas Series of predictions indexed by date
+        """
+        dates = pd.date_range(start=start, end=end, freq='D')
+        return pd.Series(self.predict_many(dates), index=dates)
+
+    def predict_hours(self, start, end):
+        """
+        Predict visits for every hour from start (inclusive) to end (exclusive)
+        in one vectorized call; times are in the clock the model was trained on
+        Returns: pandas Series of predictions indexed by hour
+        Raises:
+            ValueError: If no hourly model has been trained
+        """
+        if self.hourly_model is None:
+            raise ValueError("No hourly busyness model has been trained")
+        hours = pd.date_range(start=pd.Timestamp(start).floor('h'), end=end, freq='h', inclusive='left')
+        if hours.empty:
+            return pd.Series([], index=hours, dtype=float)
+        X = self.prepare_hourly_features(pd.DataFrame({'date': hours}))
+        X_scaled = self.hourly_scaler.transform(X)
+        return pd.Series(self.hourly_model.predict(X_scaled), index=hours)
+
+    def predict_many_cached(self, dates):
+        """
+        Memoized predict_many() keyed on the calendar date
+        dates: iterable of 'YYYY-MM-DD' strings
+        Returns: list of predictions in the same order as dates
+        """
+        dates = list(dates)
+        # Results come from this local dict; the shared cache may be cleared by
+        # another request thread at any point and is only written to here
+        found = {}
+        missing = []
+        for date in dict.fromkeys(dates):
+            prediction = self._prediction_cache.get(date)
+            if prediction is None:
+                missing.append(date)
+            else:
+                found[date] = prediction
+        if missing:
+            computed = dict(zip(missing, self.predict_many(missing)))
+            found.update(computed)
+            if len(self._prediction_cache) + len(missing) > PREDICTION_CACHE_SIZE:
+                self._prediction_cache.clear()
+            self._prediction_cache.update(computed)
+        return [found[date] for date in dates]
+
+    def predict_cached(self, date):
+        """
+        Memoized predict() keyed on the calendar date
+        date: datetime object or string that can be converted to datetime
+        """
+        if isinstance(date, str) and len(date) == 10:
+            key = date  # Already YYYY-MM-DD, skip the pandas parse on the hot path
+        else:
+            key = pd.to_datetime(date).strftime('%Y-%m-%d')
+        prediction = self._prediction_cache.get(key)
+        if prediction is None:
+            prediction = self.predict(key)
+            if len(self._prediction_cache) >= PREDICTION_CACHE_SIZE:
+                self._prediction_cache.clear()
+            self._prediction_cache[key] = prediction
+        return prediction
+
+
+# Process-wide predictors keyed by model path: (predictor, model file mtime)
+_shared_predictors = {}
+_shared_lock = threading.Lock()
+
+def get_predictor(filepath='busyness_model.bin'):
+    """
+    Shared predictor for filepath, loaded on first use and reloaded
+    when the model file's mtime changes
+    """
+    mtime = os.stat(filepath).st_mtime_ns
+    with _shared_lock:
+        entry = _shared_predictors.get(filepath)
+        if entry is None or entry[1] != mtime:
+            predictor = BusynessPredictor()
+            predictor.load_model(filepath)
+            _shared_predictors[filepath] = (predictor, mtime)
+            entry = _shared_predictors[filepath]
+        return entry[0]
+
 # Example usage
 if __name__ == "__main__":
     # Load the emergency visits data
@@ -104,21 +273,20 @@ if __name__ == "__main__":
     
     # Initialize and train the model
     predictor = BusynessPredictor()
-    metrics = predictor.train(data)
+    results = predictor.train(data)
     
     # Save the trained model
     predictor.save_model()
     
     print("Model Performance:")
-    print(f"Mean Squared Error: {metrics['mse']:.2f}")
-    print(f"R² Score: {metrics['r2']:.2f}")
+    print(f"Mean Squared Error: {results['mse']:.2f}")
+    print(f"R² Score: {results['r2']:.2f}")
     print("\nFeature Importance:")
-    for feature, importance in metrics['feature_importance'].items():
+    for feature, importance in results['feature_importance'].items():
         print(f"{feature}: {importance:.3f}")
     
     # Make predictions for next week
-    future_dates = pd.date_range(start='2024-12-01', end='2024-12-07', freq='D')
+    predictions = predictor.predict_range('2024-12-01', '2024-12-07')
     print("\nPredictions for next week:")
-    for date in future_dates:
-        prediction = predictor.predict(date)
+    for date, prediction in predictions.items():
         print(f"{date.strftime('%Y-%m-%d')}: {prediction:.0f} people")
\ No newline at end of file
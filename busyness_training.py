@@ -0,0 +1,314 @@
+# Retraining of the busyness model from live intake data: daily visit counts
+# are aggregated inside MongoDB, merged with the CSV history, and the new
+# model is published atomically over BUSYNESS_MODEL_PATH, where
+# busyness_predictor.get_predictor picks it up on the mtime change
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+import pandas as pd
+from pymongo.errors import DuplicateKeyError
+
+from busyness_model_selection import estimator_from_report
+from busyness_predictor import BusynessPredictor
+import metrics
+
+# Daily counts per dateOfVisit, maintained by $merge (_id: 'YYYY-MM-DD', visits: n)
+DAILY_COUNTS_COLLECTION = 'daily_visit_counts'
+# Hourly counts per timeEntered hour (_id: 'YYYY-MM-DDTHH', visits: n)
+HOURLY_COUNTS_COLLECTION = 'hourly_visit_counts'
+# Watermarks (daily and hourly) and lease for the retraining job, one document per model
+STATE_COLLECTION = 'busyness_training'
+# One record per trained version: metrics, day counts and artifact path
+VERSIONS_COLLECTION = 'busyness_model_versions'
+STATE_ID = 'busyness_model'
+
+BUSYNESS_HISTORY_CSV = os.getenv('BUSYNESS_HISTORY_CSV', 'emergency_visits_realistic.csv')
+BUSYNESS_MODEL_DIR = os.getenv('BUSYNESS_MODEL_DIR', 'busyness_models')
+# Versioned artifacts kept on disk; older ones are deleted after a publish
+BUSYNESS_MODEL_KEEP = int(os.getenv('BUSYNESS_MODEL_KEEP', '5'))
+# Report from busyness_model_selection.py; retraining uses the model it chose
+BUSYNESS_MODEL_SELECTION = os.getenv('BUSYNESS_MODEL_SELECTION', 'model_selection.json')
+# Refuse to train on less history than this
+MIN_TRAINING_DAYS = int(os.getenv('BUSYNESS_MIN_TRAINING_DAYS', '30'))
+# The hourly model is only trained once this many days of timeEntered data exist
+MIN_HOURLY_TRAINING_DAYS = int(os.getenv('BUSYNESS_MIN_HOURLY_TRAINING_DAYS', '14'))
+# A run that crashed releases its lease after this long
+RETRAIN_LEASE_SECONDS = float(os.getenv('BUSYNESS_RETRAIN_LEASE_SECONDS', '900'))
+
+retrains_total = metrics.counter(
+    "busyness_retrains_total", "Busyness model retraining runs by outcome", ("outcome",)
+)
+
+# Outcome of the last run in this process, for the status endpoint
+_last_run = {}
+_last_run_lock = threading.Lock()
+
+
+def aggregate_daily_counts(patients, since=None):
+    """
+    Count visits per dateOfVisit on the server and $merge them into
+    DAILY_COUNTS_COLLECTION; no patient documents leave MongoDB
+    Args:
+        since (str): First day to recount (YYYY-MM-DD); None recounts everything
+    """
+    pipeline = []
+    if since:
+        pipeline.append({'$match': {'dateOfVisit': {'$gte': since}}})
+    pipeline += [
+        {'$group': {'_id': '$dateOfVisit', 'visits': {'$sum': 1}}},
+        {'$match': {'_id': {'$type': 'string'}}},
+        {'$merge': {
+            'into': DAILY_COUNTS_COLLECTION,
+            'on': '_id',
+            'whenMatched': 'replace',
+            'whenNotMatched': 'insert'
+        }}
+    ]
+    with metrics.timed('busyness_aggregate'):
+        list(patients.aggregate(pipeline))
+
+
+def aggregate_hourly_counts(patients, since=None):
+    """
+    Count visits per hour of timeEntered on the server and $merge them into
+    HOURLY_COUNTS_COLLECTION
+    Args:
+        since (str): First day to recount (YYYY-MM-DD); None recounts everything
+    """
+    pipeline = []
+    if since:
+        # timeEntered is an ISO string, so the day prefix compares correctly
+        pipeline.append({'$match': {'timeEntered': {'$gte': since}}})
+    pipeline += [
+        {'$match': {'timeEntered': {'$type': 'string'}}},
+        {'$group': {'_id': {'$substrBytes': ['$timeEntered', 0, 13]}, 'visits': {'$sum': 1}}},
+        {'$merge': {
+            'into': HOURLY_COUNTS_COLLECTION,
+            'on': '_id',
+            'whenMatched': 'replace',
+            'whenNotMatched': 'insert'
+        }}
+    ]
+    with metrics.timed('busyness_aggregate'):
+        list(patients.aggregate(pipeline))
+
+
+def load_hourly_training_data(database, until):
+    """
+    Aggregated hourly counts with the hours nobody arrived filled in as zero,
+    from the start of the first recorded day up to until
+    Args:
+        until (datetime): First hour to leave out, e.g. the current one
+    Returns:
+        DataFrame: columns ['date', 'visits'], one row per hour
+    """
+    rows = list(database[HOURLY_COUNTS_COLLECTION].find(
+        {'_id': {'$lt': until.strftime('%Y-%m-%dT%H')}}, {'visits': 1}
+    ))
+    if not rows:
+        return pd.DataFrame(columns=['date', 'visits'])
+    counts = pd.Series(
+        [row['visits'] for row in rows],
+        index=pd.to_datetime([row['_id'] for row in rows], format='%Y-%m-%dT%H')
+    )
+    hours = pd.date_range(counts.index.min().normalize(), until, freq='h', inclusive='left')
+    counts = counts.groupby(level=0).sum().reindex(hours, fill_value=0)
+    return pd.DataFrame({'date': hours, 'visits': counts.to_numpy()})
+
+
+def load_training_data(database, history_csv=BUSYNESS_HISTORY_CSV, until=None):
+    """
+    CSV history plus the aggregated live counts, one row per day; live counts
+    replace CSV rows for the same day
+    Args:
+        until (str): First day to leave out (YYYY-MM-DD), e.g. today, which is still partial
+    Returns:
+        DataFrame: columns ['date', 'busyness_score'] sorted by date
+    """
+    frames = []
+    if history_csv and os.path.exists(history_csv):
+        frames.append(pd.read_csv(history_csv).rename(columns={
+            'date_time': 'date',
+            'number_of_people': 'busyness_score'
+        })[['date', 'busyness_score']])
+
+    query = {'_id': {'$lt': until}} if until else {}
+    live = list(database[DAILY_COUNTS_COLLECTION].find(query, {'visits': 1}))
+    if live:
+        frames.append(pd.DataFrame(live).rename(columns={
+            '_id': 'date',
+            'visits': 'busyness_score'
+        }))
+
+    if not frames:
+        return pd.DataFrame(columns=['date', 'busyness_score'])
+    data = pd.concat(frames, ignore_index=True)
+    return data.drop_duplicates('date', keep='last').sort_values('date').reset_index(drop=True)
+
+
+def publish_model(artifact_path, model_path):
+    """Copy artifact_path over model_path with an atomic rename, so readers never see a partial file"""
+    directory = os.path.dirname(os.path.abspath(model_path))
+    fd, temp_path = tempfile.mkstemp(prefix='.busyness_model-', suffix='.tmp', dir=directory)
+    os.close(fd)
+    try:
+        shutil.copyfile(artifact_path, temp_path)
+        os.replace(temp_path, model_path)
+    except Exception:
+        os.unlink(temp_path)
+        raise
+
+
+def _prune_versions(model_dir, keep):
+    artifacts = sorted(
+        name for name in os.listdir(model_dir)
+        if name.startswith('busyness_model-') and name.endswith('.bin')
+    )
+    for name in artifacts[:-keep] if keep > 0 else []:
+        os.unlink(os.path.join(model_dir, name))
+
+
+def _acquire_lease(state, owner):
+    """Claim the retraining lease across workers; False if another run holds it"""
+    now = time.time()
+    try:
+        state.find_one_and_update(
+            {'_id': STATE_ID, '$or': [{'lease_until': {'$exists': False}}, {'lease_until': {'$lt': now}}]},
+            {'$set': {'lease_until': now + RETRAIN_LEASE_SECONDS, 'lease_owner': owner}},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        # The state document exists and its lease has not expired
+        return False
+
+
+def _release_lease(state, owner):
+    state.update_one({'_id': STATE_ID, 'lease_owner': owner}, {'$set': {'lease_until': 0}})
+
+
+def retrain(database, model_path, history_csv=BUSYNESS_HISTORY_CSV, model_dir=BUSYNESS_MODEL_DIR):
+    """
+    Aggregate the days since the last run, retrain on the full daily history
+    and publish a new versioned model over model_path
+    Returns:
+        dict: The version record, or None if another worker is already retraining
+    Raises:
+        ValueError: If there are fewer than MIN_TRAINING_DAYS days of history
+    """
+    state = database[STATE_COLLECTION]
+    owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    if not _acquire_lease(state, owner):
+        retrains_total.inc('skipped')
+        return None
+
+    try:
+        with metrics.timed('busyness_retrain'):
+            previous = state.find_one({'_id': STATE_ID}) or {}
+            today = datetime.now().strftime('%Y-%m-%d')
+            # Recount from the last aggregated day, which was still partial at the time.
+            # Hourly counts keep their own watermark: without one (e.g. on a deployment
+            # that retrained before hourly counts existed) all of timeEntered is recounted
+            aggregate_daily_counts(database['patients'], since=previous.get('last_aggregated_day'))
+            aggregate_hourly_counts(database['patients'], since=previous.get('last_hourly_aggregated_day'))
+
+            data = load_training_data(database, history_csv, until=today)
+            if len(data) < MIN_TRAINING_DAYS:
+                raise ValueError(f"Not enough history to train: {len(data)} days (need {MIN_TRAINING_DAYS})")
+
+            version = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+            predictor = BusynessPredictor(model=estimator_from_report(BUSYNESS_MODEL_SELECTION))
+            predictor.version = version
+            scores = predictor.train(data)
+
+            hourly = load_hourly_training_data(database, until=datetime.now().replace(minute=0, second=0, microsecond=0))
+            hourly_scores = None
+            if len(hourly) >= MIN_HOURLY_TRAINING_DAYS * 24:
+                hourly_scores = predictor.train_hourly(hourly)
+
+            os.makedirs(model_dir, exist_ok=True)
+            artifact_path = os.path.join(model_dir, f'busyness_model-{version}.bin')
+            predictor.save_model(artifact_path)
+            publish_model(artifact_path, model_path)
+            _prune_versions(model_dir, BUSYNESS_MODEL_KEEP)
+
+        record = {
+            "version": version,
+            "trained_at": datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            "days": len(data),
+            "first_day": pd.Timestamp(data['date'].iloc[0]).strftime('%Y-%m-%d'),
+            "last_day": pd.Timestamp(data['date'].iloc[-1]).strftime('%Y-%m-%d'),
+            "mse": float(scores['mse']),
+            "r2": float(scores['r2']),
+            "model": repr(predictor.model),
+            "hourly": {
+                "hours": len(hourly),
+                "mse": float(hourly_scores['mse']),
+                "r2": float(hourly_scores['r2'])
+            } if hourly_scores else None,
+            "artifact": artifact_path
+        }
+        database[VERSIONS_COLLECTION].insert_one(dict(record))
+        state.update_one(
+            {'_id': STATE_ID},
+            {'$set': {
+                'last_aggregated_day': today,
+                'last_hourly_aggregated_day': today,
+                'current_version': version
+            }}
+        )
+        retrains_total.inc('success')
+        _set_last_run(status="success", **record)
+        print(f"Busyness model {version} published to {model_path} ({len(data)} days, R² {scores['r2']:.2f})")
+        return record
+    except Exception as e:
+        retrains_total.inc('error')
+        _set_last_run(status="error", error=str(e))
+        raise
+    finally:
+        _release_lease(state, owner)
+
+
+def _set_last_run(**fields):
+    fields["finished_at"] = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+    with _last_run_lock:
+        _last_run.clear()
+        _last_run.update(fields)
+
+
+def last_run():
+    """Outcome of this process's last retraining run ({} if none yet)"""
+    with _last_run_lock:
+        return dict(_last_run)
+
+
+def schedule_retraining(database, model_path, interval_seconds):
+    """Retrain every interval_seconds in one background thread (the lease keeps workers from overlapping)"""
+    def run():
+        while True:
+            time.sleep(interval_seconds)
+            try:
+                retrain(database, model_path)
+            except Exception as e:
+                print(f"Scheduled busyness retraining failed: {str(e)}")
+
+    threading.Thread(target=run, name="busyness-retrain", daemon=True).start()
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    load_dotenv()
+    client = MongoClient(os.getenv('MONGO_URI', 'mongodb://localhost:27017/'))
+    result = retrain(client["patientdb"], os.getenv('BUSYNESS_MODEL_PATH', 'busyness_model.bin'))
+    if result is None:
+        print("Another retraining run is in progress")
+    else:
+        print(f"Model {result['version']}: MSE {result['mse']:.2f}, R² {result['r2']:.2f} over {result['days']} days")
@@ -0,0 +1,190 @@
+# IP geolocation lookups with a per-IP TTL cache and a pooled HTTP session
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+# Upstream lookup URL; point it at a local stub server for tests
+IPINFO_URL = os.getenv('IPINFO_URL', 'https://ipinfo.io/{ip}/json')
+IPINFO_CONNECT_TIMEOUT = float(os.getenv('IPINFO_CONNECT_TIMEOUT', '1.0'))
+IPINFO_READ_TIMEOUT = float(os.getenv('IPINFO_READ_TIMEOUT', '2.0'))
+
+LOCATION_CACHE_TTL_SECONDS = float(os.getenv('LOCATION_CACHE_TTL_SECONDS', '3600'))
+# Failed lookups are cached briefly so an upstream outage is not hammered
+LOCATION_FAILURE_TTL_SECONDS = float(os.getenv('LOCATION_FAILURE_TTL_SECONDS', '60'))
+# Least recently used IPs are evicted past this many
+LOCATION_CACHE_MAX_ENTRIES = int(os.getenv('LOCATION_CACHE_MAX_ENTRIES', '10000'))
+
+_session = requests.Session()
+_session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=16))
+_session.mount('http://', HTTPAdapter(pool_connections=4, pool_maxsize=16))
+_session.headers.update({'Accept': 'application/json'})
+
+_cache = OrderedDict()  # ip -> (location, expires_at), in LRU order
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "upstream_errors": 0, "upstream_ms_total": 0.0, "evictions": 0, "expired": 0}
+
+
+def _parse_location(data):
+    # Extract location and timezone data safely
+    loc = data.get('loc', '0,0')
+    if loc and ',' in loc:
+        lat, lon = loc.split(',')
+    else:
+        lat, lon = '0', '0'
+
+    return {
+        "latitude": lat,
+        "longitude": lon,
+        "timezone": data.get('timezone', 'UTC')
+    }
+
+
+def _fetch_location(ip):
+    """Query the upstream service; raises on HTTP or network errors"""
+    with metrics.timed('ipinfo_lookup'):
+        response = _session.get(
+            IPINFO_URL.format(ip=ip),
+            timeout=(IPINFO_CONNECT_TIMEOUT, IPINFO_READ_TIMEOUT)
+        )
+        response.raise_for_status()
+        return _parse_location(response.json())
+
+
+def _cached_lookup(ip, start):
+    """(location, timing) on a cache hit, otherwise None (counted as a miss)"""
+    with _lock:
+        entry = _cache.get(ip)
+        if entry is not None:
+            if entry[1] > time.monotonic():
+                _cache.move_to_end(ip)
+                _stats["hits"] += 1
+                return dict(entry[0]), {
+                    "cached": True,
+                    "upstream_ms": None,
+                    "total_ms": round((time.perf_counter() - start) * 1000, 3)
+                }
+            del _cache[ip]
+            _stats["expired"] += 1
+        _stats["misses"] += 1
+    return None
+
+
+def _failed_lookup(error):
+    print(f"Location error: {str(error)}")
+    # Fallback to UTC if location service fails
+    metrics.fallbacks_total.inc('location_utc')
+    with _lock:
+        _stats["upstream_errors"] += 1
+    return {"timezone": "UTC"}, LOCATION_FAILURE_TTL_SECONDS
+
+
+def _store(ip, location, ttl):
+    """Cache a lookup, evicting expired entries first, then the least recently used"""
+    now = time.monotonic()
+    _cache[ip] = (location, now + ttl)
+    _cache.move_to_end(ip)
+    if len(_cache) > LOCATION_CACHE_MAX_ENTRIES:
+        for expired in [key for key, (_, expires_at) in _cache.items() if expires_at <= now]:
+            del _cache[expired]
+            _stats["expired"] += 1
+    while len(_cache) > LOCATION_CACHE_MAX_ENTRIES:
+        _cache.popitem(last=False)
+        _stats["evictions"] += 1
+
+
+def _store_lookup(ip, location, ttl, start, upstream_start):
+    upstream_ms = (time.perf_counter() - upstream_start) * 1000
+    with _lock:
+        _stats["upstream_ms_total"] += upstream_ms
+        _store(ip, location, ttl)
+
+    return dict(location), {
+        "cached": False,
+        "upstream_ms": round(upstream_ms, 1),
+        "total_ms": round((time.perf_counter() - start) * 1000, 1)
+    }
+
+
+def lookup_location(ip):
+    """
+    Location and timezone for an IP address
+    Returns:
+        tuple: (location, timing) where location has latitude, longitude and
+        timezone (timezone only, as UTC, if the lookup failed) and timing
+        reports whether the cache was hit and the upstream latency in ms
+    """
+    start = time.perf_counter()
+    cached = _cached_lookup(ip, start)
+    if cached is not None:
+        return cached
+
+    upstream_start = time.perf_counter()
+    try:
+        location, ttl = _fetch_location(ip), LOCATION_CACHE_TTL_SECONDS
+    except Exception as e:
+        location, ttl = _failed_lookup(e)
+    return _store_lookup(ip, location, ttl, start, upstream_start)
+
+
+# One pooled async client per event loop, created on first use (asgi.py)
+_async_clients = {}
+
+
+def _get_async_client():
+    import httpx
+
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = httpx.AsyncClient(
+            headers={'Accept': 'application/json'},
+            timeout=httpx.Timeout(IPINFO_READ_TIMEOUT, connect=IPINFO_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=16, max_keepalive_connections=16)
+        )
+    return client
+
+
+async def _fetch_location_async(ip):
+    with metrics.timed('ipinfo_lookup'):
+        response = await _get_async_client().get(IPINFO_URL.format(ip=ip))
+        response.raise_for_status()
+        return _parse_location(response.json())
+
+
+async def lookup_location_async(ip):
+    """lookup_location for the event loop, sharing the same cache"""
+    start = time.perf_counter()
+    cached = _cached_lookup(ip, start)
+    if cached is not None:
+        return cached
+
+    upstream_start = time.perf_counter()
+    try:
+        location, ttl = await _fetch_location_async(ip), LOCATION_CACHE_TTL_SECONDS
+    except Exception as e:
+        location, ttl = _failed_lookup(e)
+    return _store_lookup(ip, location, ttl, start, upstream_start)
+
+
+async def close_async_client():
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+def get_location_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats["size"] = len(_cache)
+    stats["upstream_ms_avg"] = (
+        round(stats["upstream_ms_total"] / stats["misses"], 1) if stats["misses"] else 0.0
+    )
+    stats["upstream_ms_total"] = round(stats["upstream_ms_total"], 1)
+    return stats
@@ -0,0 +1,151 @@
+# Normalization of intake form payloads into patient records, shared by
+# single and batch intake
+from datetime import datetime
+
+from triage_cache import make_key
+
+# Update fields that feed the triage model; changing them can trigger a re-triage
+TRIAGE_INPUT_FIELDS = ('vitals', 'symptoms', 'bloodPressure', 'symptom_text')
+
+# Fields an update payload may not overwrite: identity, and the triage state
+# and results, which only the rules and the triage jobs write (priorityOverride
+# follows the payload's priority, see app.apply_priority)
+PROTECTED_FIELDS = (
+    '_id', 'id', 'triageKey', 'triage_status', 'triage_error', 'esi', 'esi_explanation',
+    'triageSource', 'triageUsage', 'triageTimings', 'triageCompletedAt', 'priorityOverride'
+)
+
+
+def format_blood_pressure(vitals):
+    """Turn the structured {systolic, diastolic} form value into '120/80' ('N/A' if incomplete)"""
+    if vitals.get('bloodPressure') and isinstance(vitals['bloodPressure'], dict):
+        bp_systolic = vitals['bloodPressure'].get('systolic')
+        bp_diastolic = vitals['bloodPressure'].get('diastolic')
+        if bp_systolic and bp_diastolic:
+            return f"{bp_systolic}/{bp_diastolic}"
+    return "N/A"
+
+
+def format_symptom_text(symptoms):
+    """Flatten a symptoms string or {selected, notes} object into searchable text"""
+    symptom_text = ""
+    if symptoms:
+        # Check if symptoms is a string or object
+        if isinstance(symptoms, str):
+            symptom_text = symptoms
+        else:
+            selected_symptoms = symptoms.get('selected', [])
+            notes = symptoms.get('notes', '')
+            if isinstance(selected_symptoms, list):
+                symptom_text = ", ".join(selected_symptoms)
+            else:
+                symptom_text = str(selected_symptoms)
+
+            if notes:
+                symptom_text += f". Additional notes: {notes}"
+    return symptom_text
+
+
+def build_patient_record(post_data, now=None):
+    """
+    Build the patient document for an intake payload, without triage results
+    Args:
+        post_data (dict): Intake form payload
+        now (datetime, optional): Intake time, defaults to the current time
+    Returns:
+        dict: Patient record with status 'waiting' and triage_status 'pending_triage'
+    """
+    if not isinstance(post_data, dict):
+        raise ValueError("Patient payload must be a JSON object")
+
+    now = now or datetime.now()
+    vitals = post_data.get('vitals') or {}
+    symptoms = post_data.get('symptoms', {})
+
+    record = {
+        "firstName": post_data.get('firstName'),
+        "lastName": post_data.get('lastName'),
+        "age": post_data.get('age'),
+        "dateOfBirth": post_data.get('dateOfBirth'),
+        "phoneNumber": post_data.get('phoneNumber'),
+        "timeEntered": now.strftime("%Y-%m-%dT%H:%M:%S"),  # ISO format for frontend
+        "dateOfVisit": now.strftime("%Y-%m-%d"),
+        "vitals": vitals,
+        "bloodPressure": format_blood_pressure(vitals),
+        "symptoms": symptoms,
+        "symptom_text": format_symptom_text(symptoms),  # Keep the text version for searching
+        "allergies": post_data.get('allergies', []),
+        "medications": post_data.get('medications', []),
+        "medicalHistory": post_data.get('medicalHistory', []),
+        "notes": post_data.get('notes', ''),
+        "status": "waiting",  # Default status
+        "priority": None,  # Set from the ESI once triaged
+        "esi": None,
+        "esi_explanation": None,
+        # Multi-select fields
+        "substance_use": post_data.get('substance_use', []),
+        "family_history": post_data.get('family_history', []),
+        "treatmentPlan": None,
+        "triage_status": "pending_triage"
+    }
+    # Fingerprint of the inputs triaged, compared on updates
+    record["triageKey"] = triage_key(model_inputs(record))
+    return record
+
+
+def parse_priority(value):
+    """ESI level 1-5 from an update payload, or None (empty) to go back to the triaged level"""
+    if value is None or value == '':
+        return None
+    try:
+        priority = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("priority must be an ESI level from 1 to 5")
+    if not 1 <= priority <= 5:
+        raise ValueError("priority must be an ESI level from 1 to 5")
+    return priority
+
+
+def build_patient_update(data):
+    """
+    Normalize a partial update payload the same way build_patient_record does
+    Args:
+        data (dict): Fields to change
+    Returns:
+        tuple: (fields to $set, whether any of them feed the triage model)
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Update payload must be a JSON object")
+
+    for key in data:
+        if not isinstance(key, str) or key.startswith('$') or '.' in key:
+            raise ValueError(f"Invalid field name: {key}")
+    update = {key: value for key, value in data.items() if key not in PROTECTED_FIELDS}
+    if 'priority' in update:
+        update['priority'] = parse_priority(update['priority'])
+    if 'vitals' in update:
+        update['vitals'] = update['vitals'] or {}
+        update['bloodPressure'] = format_blood_pressure(update['vitals'])
+    if 'symptoms' in update:
+        update['symptom_text'] = format_symptom_text(update['symptoms'])
+    return update, any(field in update for field in TRIAGE_INPUT_FIELDS)
+
+
+def model_inputs(record):
+    """Positional arguments for the model/rules functions for a patient record"""
+    vitals = record.get('vitals') or {}
+    return [
+        vitals.get('temperature'),
+        vitals.get('pulse'),
+        vitals.get('respirationRate'),
+        record.get('bloodPressure', "N/A"),
+        record.get('symptom_text', "")
+    ]
+
+
+def triage_key(inputs):
+    """
+    Key of the normalized model inputs (the triage cache's normalization), so
+    edits that would not change the model request do not change the key
+    """
+    return make_key('triage_inputs', *inputs)
@@ -1,70 +1,211 @@
-import googlemaps
 import os
+import threading
+import time
+from collections import OrderedDict
 from dotenv import load_dotenv
 
-import geocoder
+import metrics
 
 
 # Replace with your actual API key
 load_dotenv()
 
 API_KEY = os.getenv('MAPS_API_KEY')
-if not API_KEY:
-    raise ValueError("MAPS_API_KEY not found in environment variables")
 
-# Initialize Google Maps client
-gmaps = googlemaps.Client(key=API_KEY)
+# Google Maps client, built on first use (see get_maps_client)
+gmaps = None
+
+# Nearby-search results are cached per location bucket; 2 decimal places is ~1 km
+ER_CACHE_TTL_SECONDS = float(os.getenv('ER_CACHE_TTL_SECONDS', '86400'))
+GEO_BUCKET_PRECISION = int(os.getenv('GEO_BUCKET_PRECISION', '2'))
+# Least recently used buckets are evicted past this many
+ER_CACHE_MAX_ENTRIES = int(os.getenv('ER_CACHE_MAX_ENTRIES', '1024'))
+
+
+def _locate_by_ip():
+    import geocoder
 
-def get_current_gps_coordinates():
     g = geocoder.ip('me')
-    if g.latlng:
-        return g.latlng
-    else:
-        return None
+    return g.latlng
+
+
+# Current location lookup; swapped out together with gmaps by configure()
+_locator = _locate_by_ip
+
+_lock = threading.Lock()
+_coordinates_lock = threading.Lock()
+_coordinates = None
+_er_cache = OrderedDict()  # bucket key -> (emergency rooms, expires_at), in LRU order
+_in_flight = {}  # bucket key -> threading.Event set when the upstream call finishes
+_stats = {"hits": 0, "misses": 0, "shared": 0, "upstream_errors": 0, "evictions": 0, "expired": 0}
+
 
+def get_maps_client():
+    """Shared Google Maps client; raises ValueError if MAPS_API_KEY is unset"""
+    global gmaps
+    if gmaps is None:
+        with _lock:
+            if gmaps is None:
+                if not API_KEY:
+                    raise ValueError("MAPS_API_KEY not found in environment variables")
+                import googlemaps
+                gmaps = googlemaps.Client(key=API_KEY)
+    return gmaps
 
 
-def find_nearest_emergency_rooms(radius=5000, max_results=5):
+def client_status():
+    """'ready', 'not_initialized' (key present, client not built yet) or 'missing_key'"""
+    if gmaps is not None:
+        return "ready"
+    return "not_initialized" if API_KEY else "missing_key"
+
+
+def configure(maps_client=None, locator=None):
+    """
+    Replace the Google Maps client and/or the current-location function,
+    e.g. with local fakes in tests. Clears cached coordinates and results.
+    """
+    global gmaps, _locator, _coordinates
+    with _lock:
+        if maps_client is not None:
+            gmaps = maps_client
+        if locator is not None:
+            _locator = locator
+        _coordinates = None
+        _er_cache.clear()
+
+
+def get_current_gps_coordinates(refresh=False):
+    """Facility coordinates, resolved once and reused (None if unavailable)"""
+    global _coordinates
+    if _coordinates is not None and not refresh:
+        return _coordinates
+    with _coordinates_lock:
+        # Another request may have resolved them while we waited
+        if _coordinates is not None and not refresh:
+            return _coordinates
+        with metrics.timed('current_location'):
+            latlng = _locator()
+        if latlng:
+            _coordinates = tuple(latlng)
+            return _coordinates
+        else:
+            return None
+
+
+def _bucket_key(latitude, longitude, radius, max_results):
+    return (
+        round(latitude, GEO_BUCKET_PRECISION),
+        round(longitude, GEO_BUCKET_PRECISION),
+        radius,
+        max_results
+    )
+
+
+def _fetch_emergency_rooms(location, radius, max_results):
+    with metrics.timed('maps_places_nearby'):
+        results = get_maps_client().places_nearby(
+            location=location,
+            radius=radius,
+            keyword="emergency room",
+            type="hospital"
+        )
+
+    # Extract and return names of hospitals
+    return [
+        {
+            'name': place['name'],
+            'vicinity': place.get('vicinity', place.get('formatted_address', '')),
+            'place_id': place.get('place_id', ''),
+            # add more fields if needed
+        }
+        for place in results.get("results", [])[:max_results]
+    ]
+
+
+def _store(key, emergency_rooms):
+    """Cache a bucket's results, evicting expired buckets first, then the least recently used"""
+    now = time.monotonic()
+    _er_cache[key] = (emergency_rooms, now + ER_CACHE_TTL_SECONDS)
+    _er_cache.move_to_end(key)
+    if len(_er_cache) > ER_CACHE_MAX_ENTRIES:
+        for expired in [bucket for bucket, (_, expires_at) in _er_cache.items() if expires_at <= now]:
+            del _er_cache[expired]
+            _stats["expired"] += 1
+    while len(_er_cache) > ER_CACHE_MAX_ENTRIES:
+        _er_cache.popitem(last=False)
+        _stats["evictions"] += 1
+
+
+def find_nearest_emergency_rooms(radius=5000, max_results=5, latitude=None, longitude=None):
     """
     Find nearby emergency rooms based on current location.
 
     Args:
-        latitude (float): User's current latitude
-        longitude (float): User's current longitude
         radius (int): Search radius in meters
         max_results (int): Max number of emergency rooms to return
+        latitude (float, optional): Search latitude, defaults to the current location
+        longitude (float, optional): Search longitude, defaults to the current location
 
     Returns:
-        List[str]: Names of nearby emergency rooms
+        List[dict]: Name, vicinity and place_id of nearby emergency rooms
     """
-    latitude, longitude = get_current_gps_coordinates()
-    location = (latitude, longitude)
+    if latitude is None or longitude is None:
+        coordinates = get_current_gps_coordinates()
+        if coordinates is None:
+            print("Error fetching emergency rooms: current location unavailable")
+            return []
+        latitude, longitude = coordinates
+
+    key = _bucket_key(latitude, longitude, radius, max_results)
+
+    while True:
+        with _lock:
+            entry = _er_cache.get(key)
+            if entry is not None:
+                if entry[1] > time.monotonic():
+                    _er_cache.move_to_end(key)
+                    _stats["hits"] += 1
+                    return list(entry[0])
+                del _er_cache[key]
+                _stats["expired"] += 1
+            # Requests for the same bucket arriving together share one upstream call
+            pending = _in_flight.get(key)
+            if pending is None:
+                pending = _in_flight[key] = threading.Event()
+                _stats["misses"] += 1
+                break
+            _stats["shared"] += 1
+        pending.wait()
+        with _lock:
+            if key not in _er_cache:
+                # The shared call failed; return no results rather than retrying here
+                return []
 
     try:
-        results = gmaps.places_nearby(
-            location=location,
-            radius=radius,
-            keyword="emergency room",
-            type="hospital"
-        )
-
-        # Extract and return names of hospitals
-        emergency_rooms = [
-            {
-                'name': place['name'],
-                'vicinity': place.get('vicinity', place.get('formatted_address', '')),
-                'place_id': place.get('place_id', ''),
-                # add more fields if needed
-            }
-            for place in results.get("results", [])[:max_results]
-        ]
-
-        return emergency_rooms
+        emergency_rooms = _fetch_emergency_rooms((latitude, longitude), radius, max_results)
+        with _lock:
+            _store(key, emergency_rooms)
+        return list(emergency_rooms)
 
     except Exception as e:
         print(f"Error fetching emergency rooms: {e}")
+        with _lock:
+            _stats["upstream_errors"] += 1
         return []
 
+    finally:
+        with _lock:
+            _in_flight.pop(key, None)
+        pending.set()
+
+
+def get_emergency_room_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats["buckets"] = len(_er_cache)
+    return stats
+
 
 if __name__ == "__main__":
     # Example: downtown Los Angeles
@@ -72,4 +213,4 @@ if __name__ == "__main__":
     er_list = find_nearest_emergency_rooms()
     print("Nearest Emergency Rooms:")
     for i, name in enumerate(er_list, 1):
-        print(f"{i}. {name['name']} - {name['vicinity']}")
\ No newline at end of file
+        print(f"{i}. {name['name']} - {name['vicinity']}")
@@ -0,0 +1,223 @@
+# Low-overhead latency histograms and counters, exported in the Prometheus
+# text format by the /metrics endpoint. Stage timings taken while a request
+# is being handled are also collected per request for the slow-request log.
+import contextvars
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds in seconds; covers in-memory lookups up to slow model calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+METRIC_PREFIX = "triageai_"
+
+_lock = threading.Lock()
+_metrics = {}  # name -> Counter / Histogram, in registration order
+_gauge_sources = []  # (prefix, help, callable returning a stats dict)
+
+# Stage timings of the request being handled in this context, or None
+_request_stages = contextvars.ContextVar("request_stages", default=None)
+
+
+def _label_text(labelnames, values):
+    if not labelnames:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+        for name, value in zip(labelnames, values)
+    )
+    return "{" + pairs + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def snapshot(self):
+        """{label values tuple: count}"""
+        with self._lock:
+            return dict(self._values)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_label_text(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._series = {}  # labels -> [bucket counts..., count, sum]
+
+    def observe(self, seconds, *labels):
+        # Counts are stored per bucket and accumulated only when rendering
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                index = i
+                break
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += seconds
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._series.items())
+        bucket_names = self.labelnames + ("le",)
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), series[:-1]):
+                cumulative += count
+                lines.append(
+                    f"{self.name}_bucket{_label_text(bucket_names, labels + (_format_value(bound),))} {cumulative}"
+                )
+            label_text = _label_text(self.labelnames, labels)
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+            lines.append(f"{self.name}_sum{label_text} {round(series[-1], 6)}")
+        return lines
+
+
+def _register(metric):
+    with _lock:
+        existing = _metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        _metrics[metric.name] = metric
+        return metric
+
+
+def counter(name, help, labelnames=()):
+    """Process-wide counter, created on first use"""
+    return _register(Counter(METRIC_PREFIX + name, help, labelnames))
+
+
+def histogram(name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+    """Process-wide histogram, created on first use"""
+    return _register(Histogram(METRIC_PREFIX + name, help, labelnames, buckets))
+
+
+# Shared series used across modules
+stage_seconds = histogram(
+    "stage_seconds", "Time spent in one stage of request handling or background work", ("stage",)
+)
+errors_total = counter("errors_total", "Failed calls to a dependency or stage", ("stage",))
+fallbacks_total = counter("fallbacks_total", "Default values served in place of a failed result", ("kind",))
+request_seconds = histogram(
+    "http_request_seconds", "HTTP request latency by endpoint", ("endpoint", "method", "status")
+)
+
+
+def observe_stage(stage, seconds):
+    stage_seconds.observe(seconds, stage)
+    stages = _request_stages.get()
+    if stages is not None:
+        stages.append((stage, seconds))
+
+
+@contextmanager
+def timed(stage):
+    """Record the time spent in the block under stage; exceptions count as errors"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        errors_total.inc(stage)
+        raise
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+def begin_request():
+    """Start collecting stage timings for the request handled in this context"""
+    return _request_stages.set([])
+
+
+def end_request(token):
+    """Stop collecting and return the (stage, seconds) pairs recorded"""
+    stages = _request_stages.get() or []
+    _request_stages.reset(token)
+    return stages
+
+
+def record_request(endpoint, method, path, status, elapsed, stages, slow_request_ms=0):
+    """Observe one finished request; print its stage breakdown if slower than slow_request_ms"""
+    request_seconds.observe(elapsed, endpoint or 'unmatched', method, str(status))
+    if slow_request_ms and elapsed * 1000 > slow_request_ms:
+        breakdown = ", ".join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in stages)
+        print(f"Slow request: {method} {path} {status} "
+              f"took {elapsed * 1000:.1f}ms [{breakdown or 'no stages recorded'}]")
+
+
+def propagate(func):
+    """Wrap func so stages it records in another thread count toward the current request"""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(func, *args, **kwargs)
+
+
+def register_gauges(prefix, help, stats_fn):
+    """Export every numeric field of stats_fn() as a gauge named <prefix>_<field>"""
+    with _lock:
+        _gauge_sources.append((METRIC_PREFIX + prefix, help, stats_fn))
+
+
+def _render_gauges():
+    lines = []
+    with _lock:
+        sources = list(_gauge_sources)
+    for prefix, help, stats_fn in sources:
+        try:
+            stats = stats_fn()
+        except Exception as e:
+            print(f"Metrics: {prefix} stats unavailable: {str(e)}")
+            continue
+        for field, value in stats.items():
+            if isinstance(value, bool):
+                value = int(value)
+            if not isinstance(value, (int, float)):
+                continue
+            name = f"{prefix}_{field}"
+            lines.extend([f"# HELP {name} {help}: {field}", f"# TYPE {name} gauge", f"{name} {_format_value(value)}"])
+    return lines
+
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    with _lock:
+        metrics = list(_metrics.values())
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    lines.extend(_render_gauges())
+    return "\n".join(lines) + "\n"
@@ -1,41 +1,398 @@
+import asyncio
+import json
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from google import genai
-from io import BytesIO
-from PIL import Image
-import base64
+from triage_cache import TriageCache, make_key
+from triage_rules import provisional_triage, rule_based_triage
+from resilience import CircuitBreaker, ResilientCall
+import metrics
 
 # Load environment variables
 load_dotenv()
 
-# Get API key from environment variable
-api_key = os.getenv('GOOGLE_API_KEY')
-if not api_key:
-    raise ValueError("GOOGLE_API_KEY not found in environment variables")
+# GenAI client, built on first use so importing this module stays cheap and a
+# missing key only affects the model calls (which fall back) instead of startup
+_client = None
+_client_lock = threading.Lock()
 
-client = genai.Client(api_key=api_key)
 
-def generate_triage(temperature, pulse, respiration, bloodPressure, symptoms):
+def get_client():
+    """Shared google.genai client; raises ValueError if GOOGLE_API_KEY is unset"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                api_key = os.getenv('GOOGLE_API_KEY')
+                if not api_key:
+                    raise ValueError("GOOGLE_API_KEY not found in environment variables")
+                from google import genai
+                _client = genai.Client(api_key=api_key)
+    return _client
+
+
+def configure(genai_client):
+    """Replace the GenAI client, e.g. with a local fake in benchmarks"""
+    global _client
+    with _client_lock:
+        _client = genai_client
+
+
+def client_status():
+    """'ready', 'not_initialized' (key present, client not built yet) or 'missing_key'"""
+    if _client is not None:
+        return "ready"
+    return "not_initialized" if os.getenv('GOOGLE_API_KEY') else "missing_key"
+
+
+# Every Gemini call gets a deadline, jittered retries and optional hedging,
+# behind one circuit breaker; see resilience.py
+MODEL_CALL_DEADLINE_SECONDS = float(os.getenv('MODEL_CALL_DEADLINE_SECONDS', '8'))
+MODEL_MAX_ATTEMPTS = int(os.getenv('MODEL_MAX_ATTEMPTS', '3'))
+MODEL_RETRY_BACKOFF_SECONDS = float(os.getenv('MODEL_RETRY_BACKOFF_SECONDS', '0.25'))
+MODEL_HEDGE = os.getenv('MODEL_HEDGE', 'false').lower() in ('1', 'true', 'yes')
+MODEL_BREAKER_FAILURES = int(os.getenv('MODEL_BREAKER_FAILURES', '5'))
+MODEL_BREAKER_RESET_SECONDS = float(os.getenv('MODEL_BREAKER_RESET_SECONDS', '30'))
+
+# Threads running the blocking upstream calls, so deadlines can be enforced
+model_call_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('MODEL_CALL_THREADS', '16')),
+    thread_name_prefix='model-call'
+)
+
+gemini_breaker = CircuitBreaker(MODEL_BREAKER_FAILURES, MODEL_BREAKER_RESET_SECONDS)
+model_calls_total = metrics.counter(
+    "model_calls_total", "Gemini call outcomes (success, error, timeout, retry, hedge, short_circuit)",
+    ("call", "outcome")
+)
+
+
+model_tokens_total = metrics.counter(
+    "model_tokens_total", "Gemini tokens billed, by call and direction (input/output)", ("call", "direction")
+)
+
+
+class MalformedResponse(Exception):
+    """The model's reply did not match the requested JSON schema (retryable)"""
+
+
+def _is_retryable(exc):
+    # google.genai APIError carries the HTTP status; other client errors will not improve on retry
+    code = getattr(exc, 'code', None)
+    if isinstance(code, int):
+        return code in (408, 429) or code >= 500
+    return not isinstance(exc, ValueError)
+
+
+def _resilient_call(name):
+    return ResilientCall(
+        name, model_call_executor, gemini_breaker,
+        deadline_seconds=MODEL_CALL_DEADLINE_SECONDS,
+        max_attempts=MODEL_MAX_ATTEMPTS,
+        backoff_seconds=MODEL_RETRY_BACKOFF_SECONDS,
+        hedge=MODEL_HEDGE,
+        retryable=_is_retryable,
+        counter=model_calls_total
+    )
+
+
+assessment_call = _resilient_call('assessment')
+treatment_plan_call = _resilient_call('treatment_plan')
+
+
+def get_model_call_stats():
+    """Breaker state, outcome counts and hedging thresholds for the Gemini calls"""
+    calls = {}
+    for (call, outcome), count in model_calls_total.snapshot().items():
+        calls.setdefault(call, {})[outcome] = count
+    p95 = {}
+    for resilient in (assessment_call, treatment_plan_call):
+        value = resilient.latency.percentile(95)
+        p95[resilient.name] = round(value * 1000, 1) if value is not None else None
+    tokens = {}
+    for (call, direction), count in model_tokens_total.snapshot().items():
+        tokens.setdefault(call, {})[direction] = count
+    for call, counts in tokens.items():
+        successes = calls.get(call, {}).get("success", 0)
+        if successes:
+            counts["per_call"] = round((counts.get("input", 0) + counts.get("output", 0)) / successes, 1)
+    return {
+        "breaker": gemini_breaker.stats(),
+        "calls": calls,
+        "tokens": tokens,
+        "p95_ms": p95,
+        "hedging": MODEL_HEDGE,
+        "deadline_seconds": MODEL_CALL_DEADLINE_SECONDS
+    }
+
+
+# Responses are cached on normalized vitals/symptoms so repeat presentations
+# (e.g. a flu surge) skip the network entirely
+triage_cache = TriageCache(
+    max_entries=int(os.getenv('TRIAGE_CACHE_MAX_ENTRIES', '1024')),
+    ttl_seconds=float(os.getenv('TRIAGE_CACHE_TTL_SECONDS', '3600'))
+)
+
+MODEL_NAME = os.getenv('GEMINI_MODEL', 'gemini-2.0-flash')
+
+# Static ESI rubric, sent as the system instruction rather than repeated in
+# every prompt; the per-patient prompt carries only the presentation
+TRIAGE_SYSTEM_INSTRUCTION = (
+    "You are an emergency department triage assistant. Assign an Emergency Severity Index (ESI) level. "
+    "1 (resuscitation): needs immediate life-saving intervention, e.g. cardiopulmonary arrest, major trauma, "
+    "severe respiratory distress, seizures. "
+    "2 (emergent): high-risk situation, confusion, lethargy or disorientation, or severe pain or distress, "
+    "e.g. stroke, head injury, asthma, sexual assault. "
+    "3 (urgent): needs quick attention but can wait up to 30 minutes, e.g. signs of infection, mild "
+    "respiratory distress, moderate pain. "
+    "4: less urgent. 5: non-urgent. "
+    "Give a one-sentence explanation based on the inputs and a one-sentence tentative treatment plan."
+)
+
+ASSESSMENT_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "esi": {"type": "INTEGER", "minimum": 1, "maximum": 5},
+        "explanation": {"type": "STRING"},
+        "treatment_plan": {"type": "STRING"}
+    },
+    "required": ["esi", "explanation", "treatment_plan"],
+    "propertyOrdering": ["esi", "explanation", "treatment_plan"]
+}
+
+ASSESSMENT_CONFIG = {
+    "system_instruction": TRIAGE_SYSTEM_INSTRUCTION,
+    "response_mime_type": "application/json",
+    "response_schema": ASSESSMENT_SCHEMA,
+    "temperature": 0
+}
+
+
+def _presentation(temperature, pulse, respiration, bloodPressure, symptoms):
+    return (
+        f"Temperature: {temperature}. Pulse: {pulse}. Respiration: {respiration}. "
+        f"Blood pressure: {bloodPressure}. Symptoms: {symptoms}."
+    )
+
+
+def _treatment_plan_prompt(temperature, pulse, respiration, bloodPressure, symptoms):
+    return [{
+        "text": f"Generate a summarized tentative treatment plan based on the patient's temperature: {temperature}, pulse: {pulse}, respiration: {respiration}, blood pressure: {bloodPressure}, symptoms: {symptoms}. One short sentence, just the treatment plan, no other text."
+    }]
+
+
+def _record_usage(call, response):
+    """Count the tokens billed for one response; returns them as a dict (or None)"""
+    metadata = getattr(response, 'usage_metadata', None)
+    if metadata is None:
+        return None
+    usage = {
+        "input_tokens": getattr(metadata, 'prompt_token_count', None) or 0,
+        "output_tokens": getattr(metadata, 'candidates_token_count', None) or 0
+    }
+    model_tokens_total.inc(call, "input", amount=usage["input_tokens"])
+    model_tokens_total.inc(call, "output", amount=usage["output_tokens"])
+    return usage
+
+
+def parse_assessment(text):
+    """
+    Validate the model's JSON reply
+    Returns:
+        dict: esi (int 1-5), explanation and treatment_plan
+    Raises:
+        MalformedResponse: if the reply does not match ASSESSMENT_SCHEMA
+    """
     try:
-        parts = [{
-            "text": f"Categorize the patient into a triage level using the Emergency Severity Index (ESI) [Level 1 (resuscitation) requires immediate, life-saving intervention and includes patients with cardiopulmonary arrest, major trauma, severe  respiratory distress, and seizures.  Level 2 (emergent) requires an immediate nursing assessment and rapid treatment and includes patients who are in a high-risk situation, are  confused, lethargic, or disoriented, or have severe pain or distress, including  patients with stroke, head injuries, asthma, and sexual-assault injuries.  Level 3 (urgent) includes patients who need quick attention but can wait as long as 30 minutes for assessment and treatment and includes patients with signs of infection, mild respiratory distress, or moderate pain.  Levels 4 and 5 are considered “less urgent” and “non urgent,” respectively. Use the patient's temperature: {temperature}, pulse: {pulse}, respiration: {respiration}, blood pressure: {bloodPressure}, symptoms: {symptoms} to determine the triage level. Just display the ESI number and a short explanation for the category in the format: [Integer <1-5>] - [Explanation based on input]."
-        }]
+        data = json.loads(text)
+        esi = data["esi"]
+        if isinstance(esi, str):
+            esi = int(esi.strip())
+        if isinstance(esi, bool) or not isinstance(esi, int) or not 1 <= esi <= 5:
+            raise ValueError(f"esi out of range: {esi!r}")
+        return {
+            "esi": esi,
+            "explanation": str(data["explanation"]).strip(),
+            "treatment_plan": str(data["treatment_plan"]).strip()
+        }
+    except (TypeError, ValueError, KeyError) as e:
+        raise MalformedResponse(f"Unusable assessment reply: {str(e)}") from e
 
 
-        response = client.models.generate_content(model='gemini-2.0-flash', contents=parts)
-        return response.text
+def _assessment_from_response(response):
+    usage = _record_usage('assessment', response)
+    assessment = parse_assessment(response.text)
+    assessment["usage"] = usage
+    return assessment
+
+
+def _assessment(esi, explanation, treatment_plan, source, start, model_ms=None, usage=None):
+    return {
+        "esi": esi,
+        "explanation": explanation,
+        "treatment_plan": treatment_plan,
+        "source": source,
+        "usage": usage,
+        "timings": {
+            "model_ms": model_ms,
+            "total_ms": round((time.perf_counter() - start) * 1000, 1)
+        }
+    }
+
+
+def _fallback_assessment(args, start):
+    # Upstream failed or the breaker is open: estimate from the vitals rather than a flat ESI 3
+    esi, explanation = provisional_triage(*args)
+    metrics.fallbacks_total.inc('triage_provisional')
+    metrics.fallbacks_total.inc('treatment_plan_unavailable')
+    return _assessment(esi, explanation, "No treatment plan available", "fallback", start)
+
+
+def _treatment_plan_fallback():
+    metrics.fallbacks_total.inc('treatment_plan_unavailable')
+    return "No treatment plan available"
+
+
+def generate_assessment(temperature, pulse, respiration, bloodPressure, symptoms, use_rules=True):
+    """
+    ESI level, explanation and treatment plan from one schema-constrained model call
+    use_rules=False skips the local ESI rules when the caller already ran them
+    Returns:
+        dict: esi (int), explanation, treatment_plan, source ('rules', 'cache',
+        'model' or 'fallback'), usage (input/output tokens of the model call,
+        or None) and timings in milliseconds
+    """
+    start = time.perf_counter()
+    args = (temperature, pulse, respiration, bloodPressure, symptoms)
+
+    # Clear-cut presentations get their ESI locally; only the plan needs the model
+    if use_rules:
+        fast_path = rule_based_triage(*args)
+        if fast_path is not None:
+            return _assessment(*fast_path, generate_treatment_plan(*args), "rules", start)
+
+    cache_key = make_key('assessment', *args)
+    cached = triage_cache.get(cache_key)
+    if cached is not None:
+        return _assessment(cached["esi"], cached["explanation"], cached["treatment_plan"], "cache", start)
+
+    try:
+        model_start = time.perf_counter()
+        with metrics.timed('gemini_assessment'):
+            assessment = assessment_call.call(lambda: _assessment_from_response(
+                get_client().models.generate_content(
+                    model=MODEL_NAME, contents=_presentation(*args), config=ASSESSMENT_CONFIG
+                )
+            ))
+        model_ms = round((time.perf_counter() - model_start) * 1000, 1)
     except Exception as e:
-        print(f"Error in generate_triage: {str(e)}")
-        return "3 - Default triage level due to processing error"
+        print(f"Error in generate_assessment: {str(e)}")
+        return _fallback_assessment(args, start)
+
+    usage = assessment.pop("usage")
+    triage_cache.set(cache_key, assessment)
+    return _assessment(
+        assessment["esi"], assessment["explanation"], assessment["treatment_plan"],
+        "model", start, model_ms, usage
+    )
 
 
 def generate_treatment_plan(temperature, pulse, respiration, bloodPressure, symptoms):
+    args = (temperature, pulse, respiration, bloodPressure, symptoms)
+    cache_key = make_key('treatment_plan', *args)
+    cached = triage_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    def request_plan():
+        response = get_client().models.generate_content(model=MODEL_NAME, contents=_treatment_plan_prompt(*args))
+        _record_usage('treatment_plan', response)
+        return response.text
+
+    try:
+        with metrics.timed('gemini_treatment_plan'):
+            treatment_plan = treatment_plan_call.call(request_plan)
+        triage_cache.set(cache_key, treatment_plan)
+        return treatment_plan
+    except Exception as e:
+        print(f"Error in generate treatment plan: {str(e)}")
+        return _treatment_plan_fallback()
+
+
+# Async variants for the ASGI server (asgi.py): the same prompts, cache and
+# fallbacks, awaiting client.aio so a pending model call holds no thread
+
+async def _cache_get_async(cache_key):
+    # The persistent tier is a blocking pymongo lookup; keep it off the event loop
+    if triage_cache.collection is not None:
+        return await asyncio.to_thread(triage_cache.get, cache_key)
+    return triage_cache.get(cache_key)
+
+
+async def _cache_set_async(cache_key, value):
+    if triage_cache.collection is not None:
+        await asyncio.to_thread(triage_cache.set, cache_key, value)
+    else:
+        triage_cache.set(cache_key, value)
+
+
+async def generate_assessment_async(temperature, pulse, respiration, bloodPressure, symptoms, use_rules=True):
+    """Async generate_assessment"""
+    start = time.perf_counter()
+    args = (temperature, pulse, respiration, bloodPressure, symptoms)
+
+    if use_rules:
+        fast_path = rule_based_triage(*args)
+        if fast_path is not None:
+            return _assessment(*fast_path, await generate_treatment_plan_async(*args), "rules", start)
+
+    cache_key = make_key('assessment', *args)
+    cached = await _cache_get_async(cache_key)
+    if cached is not None:
+        return _assessment(cached["esi"], cached["explanation"], cached["treatment_plan"], "cache", start)
+
+    async def request_assessment():
+        response = await get_client().aio.models.generate_content(
+            model=MODEL_NAME, contents=_presentation(*args), config=ASSESSMENT_CONFIG
+        )
+        return _assessment_from_response(response)
+
     try:
-        parts = [{
-            "text": f"Generate a summarized tentative treatment plan based on the patient's temperature: {temperature}, pulse: {pulse}, respiration: {respiration}, blood pressure: {bloodPressure}, symptoms: {symptoms}. One short sentence, just the treatment plan, no other text."
-        }]
-        response = client.models.generate_content(model='gemini-2.0-flash', contents=parts)
+        model_start = time.perf_counter()
+        with metrics.timed('gemini_assessment'):
+            assessment = await assessment_call.call_async(request_assessment)
+        model_ms = round((time.perf_counter() - model_start) * 1000, 1)
+    except Exception as e:
+        print(f"Error in generate_assessment: {str(e)}")
+        return _fallback_assessment(args, start)
+
+    usage = assessment.pop("usage")
+    await _cache_set_async(cache_key, assessment)
+    return _assessment(
+        assessment["esi"], assessment["explanation"], assessment["treatment_plan"],
+        "model", start, model_ms, usage
+    )
+
+
+async def generate_treatment_plan_async(temperature, pulse, respiration, bloodPressure, symptoms):
+    args = (temperature, pulse, respiration, bloodPressure, symptoms)
+    cache_key = make_key('treatment_plan', *args)
+    cached = await _cache_get_async(cache_key)
+    if cached is not None:
+        return cached
+
+    async def request_plan():
+        response = await get_client().aio.models.generate_content(model=MODEL_NAME, contents=_treatment_plan_prompt(*args))
+        _record_usage('treatment_plan', response)
         return response.text
+
+    try:
+        with metrics.timed('gemini_treatment_plan'):
+            treatment_plan = await treatment_plan_call.call_async(request_plan)
+        await _cache_set_async(cache_key, treatment_plan)
+        return treatment_plan
     except Exception as e:
         print(f"Error in generate treatment plan: {str(e)}")
-        return "No treatment plan available"
+        return _treatment_plan_fallback()
@@ -0,0 +1,204 @@
+# In-process fan-out of patient changes (insert/update/delete) to live
+# subscribers such as the SSE stream. Changes come from a Mongo change
+# stream when the server supports one, otherwise from the request handlers.
+import asyncio
+import json
+import queue
+import threading
+from collections import deque
+
+# Sent to a subscriber whose queue overflowed; it must reload a full snapshot
+RESYNC = {"type": "resync"}
+
+
+class Subscription:
+    def __init__(self, max_pending):
+        self._queue = queue.Queue(maxsize=max_pending)
+
+    def get(self, timeout=None):
+        """Next event, or None if nothing arrived within timeout"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def offer(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            # Drop the backlog; the subscriber starts over from a snapshot
+            with self._queue.mutex:
+                self._queue.queue.clear()
+            self._queue.put_nowait(RESYNC)
+
+
+class AsyncSubscription:
+    """
+    Subscription read from an event loop: events land in an asyncio.Queue,
+    so a waiting subscriber holds no thread. publish() may run on any
+    thread, so events are handed to the loop with call_soon_threadsafe.
+    """
+
+    def __init__(self, max_pending, loop):
+        self._queue = asyncio.Queue(maxsize=max_pending)
+        self._loop = loop
+
+    async def get(self, timeout=None):
+        """Next event, or None if nothing arrived within timeout"""
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def offer(self, event):
+        try:
+            self._loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # The loop has closed; the subscriber is gone
+            pass
+
+    def _put(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Drop the backlog; the subscriber starts over from a snapshot
+            while not self._queue.empty():
+                self._queue.get_nowait()
+            self._queue.put_nowait(RESYNC)
+
+
+class PatientEventBus:
+    def __init__(self, max_pending=1000, history_size=1000):
+        self.max_pending = max_pending
+        self.change_stream_active = False
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._listeners = []
+        self._sequence = 0
+        # Recent events for clients reconnecting with Last-Event-ID
+        self._history = deque(maxlen=history_size)
+
+    @property
+    def sequence(self):
+        return self._sequence
+
+    def subscribe(self):
+        """Subscription for a thread that blocks on get()"""
+        subscription = Subscription(self.max_pending)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def subscribe_async(self):
+        """Subscription awaited on the running event loop"""
+        subscription = AsyncSubscription(self.max_pending, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def add_listener(self, callback):
+        """Call callback(event) synchronously for every published event"""
+        with self._lock:
+            self._listeners.append(callback)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, event_type, patient_id, patient=None, fields=None, source="local"):
+        """
+        Fan an event out to every subscriber.
+        Local events are ignored while a change stream is the source of truth,
+        since the same change will arrive through the stream.
+        """
+        if source == "local" and self.change_stream_active:
+            return
+        with self._lock:
+            self._sequence += 1
+            event = {"id": self._sequence, "type": event_type, "patient_id": str(patient_id)}
+            if patient is not None:
+                event["patient"] = patient
+            if fields is not None:
+                event["fields"] = fields
+            self._history.append(event)
+            subscribers = list(self._subscribers)
+            listeners = list(self._listeners)
+        for callback in listeners:
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"Patient event listener failed: {str(e)}")
+        for subscription in subscribers:
+            subscription.offer(event)
+
+    def replay_since(self, last_event_id):
+        """Events after last_event_id, or None if they are no longer in the history"""
+        try:
+            last_event_id = int(last_event_id)
+        except (TypeError, ValueError):
+            return None
+        with self._lock:
+            if last_event_id > self._sequence:
+                return None
+            events = [event for event in self._history if event["id"] > last_event_id]
+            oldest = self._history[0]["id"] if self._history else self._sequence + 1
+        if last_event_id + 1 < oldest:
+            return None
+        return events
+
+    def watch_collection(self, collection):
+        """
+        Source events from a Mongo change stream in one background thread.
+        Change streams need a replica set; on a standalone server the request
+        handlers keep publishing events themselves.
+        """
+        def run():
+            try:
+                with collection.watch(full_document='updateLookup') as stream:
+                    self.change_stream_active = True
+                    print("Patient change stream active")
+                    for change in stream:
+                        self._publish_change(change)
+            except Exception as e:
+                print(f"Patient change stream unavailable: {str(e)}")
+                print("Warning: live patient events and the patient queue now only see this process's "
+                      "changes; with more than one worker they will diverge")
+            finally:
+                self.change_stream_active = False
+
+        threading.Thread(target=run, name="patient-change-stream", daemon=True).start()
+
+    def _publish_change(self, change):
+        operation = change.get("operationType")
+        patient_id = change.get("documentKey", {}).get("_id")
+        if operation in ("insert", "replace"):
+            self.publish("insert" if operation == "insert" else "update", patient_id,
+                         patient=serialize(change.get("fullDocument")), source="change_stream")
+        elif operation == "update":
+            description = change.get("updateDescription", {})
+            fields = dict(description.get("updatedFields", {}))
+            for removed in description.get("removedFields", []):
+                fields[removed] = None
+            self.publish("update", patient_id, fields=serialize(fields), source="change_stream")
+        elif operation == "delete":
+            self.publish("delete", patient_id, source="change_stream")
+
+
+def serialize(document):
+    """JSON-safe copy of a Mongo document (ObjectId/datetime become strings)"""
+    if document is None:
+        return None
+    return json.loads(json.dumps(document, default=str))
+
+
+def format_sse(event_type, data, event_id=None):
+    """One Server-Sent Events message"""
+    message = ""
+    if event_id is not None:
+        message += f"id: {event_id}\n"
+    message += f"event: {event_type}\ndata: {json.dumps(data, default=str)}\n\n"
+    return message
@@ -0,0 +1,156 @@
+# Query building for patient listing/export: filters, projection,
+# keyset pagination and the indexes that back them
+import base64
+import csv
+import io
+import json
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
+
+MAX_PAGE_SIZE = 500
+
+# Columns for CSV export when no 'fields' parameter is given
+DEFAULT_EXPORT_COLUMNS = [
+    "_id", "firstName", "lastName", "age", "timeEntered", "dateOfVisit",
+    "status", "priority", "esi", "bloodPressure", "symptom_text", "treatmentPlan"
+]
+
+# Compound indexes created at startup; create_index is a no-op when they exist.
+# Each filtered listing has one whose equality/$in prefix is followed by the
+# sort_order keys (timeEntered, _id), so pages come off the index unsorted
+# in memory (see benchmarks/query_plans.py)
+PATIENT_INDEXES = [
+    [("status", ASCENDING), ("priority", ASCENDING), ("timeEntered", ASCENDING), ("_id", ASCENDING)],
+    [("status", ASCENDING), ("timeEntered", ASCENDING), ("_id", ASCENDING)],
+    [("priority", ASCENDING), ("timeEntered", ASCENDING), ("_id", ASCENDING)],
+    [("timeEntered", ASCENDING), ("_id", ASCENDING)],
+]
+
+
+def ensure_patient_indexes(collection):
+    for keys in PATIENT_INDEXES:
+        collection.create_index(keys)
+
+
+def _split(value):
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def build_patient_filter(args):
+    """
+    Mongo filter from query parameters
+    Args:
+        args: Request query parameters. Supported keys: status, priority, esi
+            (comma-separated lists) and since/until (timeEntered bounds,
+            'YYYY-MM-DD' or 'YYYY-MM-DDTHH:MM:SS')
+    Raises:
+        ValueError: If a parameter cannot be parsed
+    """
+    query = {}
+
+    if args.get('status'):
+        query['status'] = {'$in': _split(args['status'])}
+
+    if args.get('priority'):
+        try:
+            query['priority'] = {'$in': [int(p) for p in _split(args['priority'])]}
+        except ValueError:
+            raise ValueError("priority must be a comma-separated list of integers")
+
+    if args.get('esi'):
+        query['esi'] = {'$in': _split(args['esi'])}
+
+    # timeEntered is stored as an ISO string, so string comparison orders it correctly
+    time_range = {}
+    if args.get('since'):
+        time_range['$gte'] = args['since']
+    if args.get('until'):
+        until = args['until']
+        # A bare date includes the whole day
+        time_range['$lte'] = until + 'T23:59:59' if len(until) == 10 else until
+    if time_range:
+        query['timeEntered'] = time_range
+
+    return query
+
+
+def build_projection(args):
+    """Inclusion projection from a comma-separated 'fields' parameter (None for full documents)"""
+    if not args.get('fields'):
+        return None
+    return {field: 1 for field in _split(args['fields'])}
+
+
+def parse_page_size(args):
+    """The 'limit' parameter capped at MAX_PAGE_SIZE, or None when not paginating"""
+    if not args.get('limit'):
+        return None
+    try:
+        limit = int(args['limit'])
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    if limit < 1:
+        raise ValueError("limit must be positive")
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def encode_cursor(document):
+    """Opaque keyset cursor pointing just after document"""
+    payload = json.dumps({"t": document.get('timeEntered'), "id": str(document['_id'])})
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return payload["t"], ObjectId(payload["id"])
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def apply_cursor(query, cursor, descending=False):
+    """Restrict query to documents after the cursor in (timeEntered, _id) order"""
+    time_entered, object_id = decode_cursor(cursor)
+    after = '$lt' if descending else '$gt'
+    keyset = {'$or': [
+        {'timeEntered': {after: time_entered}},
+        {'timeEntered': time_entered, '_id': {after: object_id}},
+    ]}
+    return {'$and': [query, keyset]} if query else keyset
+
+
+def sort_order(args):
+    """Sort spec for listing: (timeEntered, _id), newest first with order=desc"""
+    direction = DESCENDING if args.get('order') == 'desc' else ASCENDING
+    return [('timeEntered', direction), ('_id', direction)]
+
+
+def iter_ndjson(cursor):
+    """Yield one JSON line per document"""
+    for document in cursor:
+        yield json.dumps(document, default=str) + "\n"
+
+
+def iter_csv(cursor, columns):
+    """Yield a CSV header then one row per document; nested values are JSON-encoded"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        value = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return value
+
+    writer.writerow(columns)
+    yield flush()
+    for document in cursor:
+        row = []
+        for column in columns:
+            value = document.get(column)
+            if isinstance(value, (dict, list)):
+                value = json.dumps(value, default=str)
+            row.append("" if value is None else value)
+        writer.writerow(row)
+        yield flush()
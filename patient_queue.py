@@ -0,0 +1,189 @@
+# In-memory priority index of waiting patients, kept current from the
+# patient event bus so picking the next patient needs no collection scan
+import heapq
+import threading
+import time
+from datetime import datetime
+
+# Fields kept per patient; enough to order the queue and show who is next
+SUMMARY_FIELDS = ["firstName", "lastName", "priority", "esi", "status", "timeEntered", "triage_status"]
+
+
+def _priority(summary):
+    try:
+        return int(summary.get("priority"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _entered_epoch(time_entered):
+    try:
+        return datetime.strptime(time_entered, "%Y-%m-%dT%H:%M:%S").timestamp()
+    except (TypeError, ValueError):
+        return time.time()
+
+
+class PatientPriorityQueue:
+    """
+    Waiting patients ordered by ESI priority with aging.
+
+    A patient's effective priority improves by one level every
+    aging_minutes_per_level minutes of waiting, by at most max_aging_levels
+    and never past ESI 1, so low-acuity patients are not starved while ESI 1
+    always goes first. Patients are held in one heap per ESI level ordered by
+    arrival; within a level the longest-waiting patient always has the best
+    effective priority, so the next patient is the best of the (at most five)
+    level heads: O(log n) updates and an O(1) peek. Stale heap entries left by
+    updates and removals are dropped lazily. aging_minutes_per_level=0
+    turns aging off.
+    """
+
+    def __init__(self, aging_minutes_per_level=60, max_aging_levels=2):
+        if aging_minutes_per_level < 0 or max_aging_levels < 0:
+            raise ValueError("aging_minutes_per_level and max_aging_levels must not be negative")
+        self.aging_seconds = aging_minutes_per_level * 60
+        self.max_aging_levels = max_aging_levels
+        self._lock = threading.Lock()
+        self._levels = {}  # priority -> heap of (entered epoch, sequence, patient_id)
+        self._queued = {}  # patient_id -> sequence of its live heap entry
+        self._patients = {}  # patient_id -> summary, for every known patient
+        self._sequence = 0
+        self._stale = 0
+
+    def rebuild(self, collection):
+        """Load every patient from Mongo, replacing the current index"""
+        projection = {field: 1 for field in SUMMARY_FIELDS}
+        patients = {
+            str(patient['_id']): self._summary(patient)
+            for patient in collection.find({}, projection)
+        }
+        with self._lock:
+            self._patients = patients
+            self._levels = {}
+            self._queued = {}
+            self._stale = 0
+            for patient_id, summary in patients.items():
+                if self._is_waiting(summary):
+                    self._sequence += 1
+                    self._levels.setdefault(_priority(summary), []).append(
+                        (_entered_epoch(summary.get("timeEntered")), self._sequence, patient_id)
+                    )
+                    self._queued[patient_id] = self._sequence
+            for heap in self._levels.values():
+                heapq.heapify(heap)
+
+    def handle_event(self, event):
+        """Apply an event from PatientEventBus"""
+        patient_id = event["patient_id"]
+        if event["type"] == "delete":
+            self.remove(patient_id)
+        elif event.get("patient") is not None:
+            self.upsert(patient_id, event["patient"])
+        elif event.get("fields") is not None:
+            self.upsert(patient_id, event["fields"], partial=True)
+
+    def upsert(self, patient_id, fields, partial=False):
+        """Add or reposition a patient from a full document or changed fields"""
+        with self._lock:
+            summary = self._patients.get(patient_id, {}) if partial else {}
+            summary = dict(summary, **self._summary(fields, only_present=partial))
+            summary["_id"] = patient_id
+            self._patients[patient_id] = summary
+            if self._queued.pop(patient_id, None) is not None:
+                self._stale += 1
+            if self._is_waiting(summary):
+                self._sequence += 1
+                heapq.heappush(
+                    self._levels.setdefault(_priority(summary), []),
+                    (_entered_epoch(summary.get("timeEntered")), self._sequence, patient_id)
+                )
+                self._queued[patient_id] = self._sequence
+            self._compact()
+
+    def remove(self, patient_id):
+        with self._lock:
+            self._patients.pop(patient_id, None)
+            if self._queued.pop(patient_id, None) is not None:
+                self._stale += 1
+            self._compact()
+
+    def peek(self):
+        """Next patient to be seen, or None if nobody is waiting"""
+        now = time.time()
+        with self._lock:
+            best = None
+            for level, heap in self._levels.items():
+                # Drop stale heads so heap[0] is the longest-waiting live patient
+                while heap and self._queued.get(heap[0][2]) != heap[0][1]:
+                    heapq.heappop(heap)
+                    self._stale -= 1
+                if heap:
+                    rank = self._rank(level, heap[0][0], now)
+                    if best is None or rank < best[0]:
+                        best = (rank, heap[0][2])
+            return self._describe(best[1], now) if best else None
+
+    def top(self, limit):
+        """First limit waiting patients in queue order"""
+        now = time.time()
+        with self._lock:
+            candidates = []
+            for level, heap in self._levels.items():
+                live = (entry for entry in heap if self._queued.get(entry[2]) == entry[1])
+                candidates.extend(
+                    (self._rank(level, entered, now), patient_id)
+                    for entered, _, patient_id in heapq.nsmallest(limit, live)
+                )
+            return [self._describe(patient_id, now) for _, patient_id in sorted(candidates)[:limit]]
+
+    def stats(self):
+        with self._lock:
+            awaiting_triage = sum(
+                1 for summary in self._patients.values()
+                if summary.get("status") == "waiting" and _priority(summary) is None
+            )
+            return {
+                "waiting": len(self._queued),
+                "awaiting_triage": awaiting_triage,
+                "known_patients": len(self._patients),
+                "stale_entries": self._stale,
+                "aging_minutes_per_level": self.aging_seconds / 60,
+                "max_aging_levels": self.max_aging_levels
+            }
+
+    def _summary(self, document, only_present=False):
+        return {
+            field: document.get(field) for field in SUMMARY_FIELDS
+            if not only_present or field in document
+        }
+
+    def _is_waiting(self, summary):
+        # Patients still awaiting their ESI are not ranked until triage completes
+        return summary.get("status") == "waiting" and _priority(summary) is not None
+
+    def _effective_priority(self, level, entered, now):
+        if not self.aging_seconds:
+            return float(level)
+        aged = min(max(0.0, now - entered) / self.aging_seconds, self.max_aging_levels)
+        return max(1.0, level - aged)
+
+    def _rank(self, level, entered, now):
+        # Ties on effective priority go to the more acute, then the earlier patient
+        return (self._effective_priority(level, entered, now), level, entered)
+
+    def _describe(self, patient_id, now):
+        summary = dict(self._patients[patient_id])
+        entered = _entered_epoch(summary.get("timeEntered"))
+        summary["wait_minutes"] = round(max(0.0, now - entered) / 60, 1)
+        summary["effective_priority"] = round(
+            self._effective_priority(_priority(summary), entered, now), 2
+        )
+        return summary
+
+    def _compact(self):
+        # Rebuild the heaps once stale entries outnumber live ones
+        if self._stale > 64 and self._stale > len(self._queued):
+            for level, heap in self._levels.items():
+                self._levels[level] = [entry for entry in heap if self._queued.get(entry[2]) == entry[1]]
+                heapq.heapify(self._levels[level])
+            self._stale = 0
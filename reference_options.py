@@ -0,0 +1,124 @@
+# Reference options for the intake form's multi-select fields, seeded into
+# Mongo at startup and served from an in-process cache
+import hashlib
+import json
+import os
+import threading
+import time
+
+from pymongo import UpdateOne
+
+# Reference options for multi-select fields
+DEFAULT_REFERENCE_OPTIONS = {
+    "allergies": [
+        "Penicillin", "Latex", "Peanuts", "Shellfish", "Dairy",
+        "Eggs", "Soy", "Tree Nuts", "Wheat/Gluten"
+    ],
+    "substance_use": ["Alcohol", "Tobacco", "Recreational Drugs"],
+    "family_history": [
+        "Heart Disease", "Diabetes", "Cancer", "High Blood Pressure",
+        "Stroke", "Mental Health Conditions", "Asthma", "Arthritis"
+    ],
+    "symptoms": [
+        "Fever", "Cough", "Shortness of breath", "Fatigue", "Headache",
+        "Muscle aches", "Sore throat", "Loss of taste/smell", "Nausea", "Diarrhea"
+    ]
+}
+
+VALID_CATEGORIES = list(DEFAULT_REFERENCE_OPTIONS)
+
+# Without a change stream the cache reloads from Mongo at most this often
+OPTIONS_CACHE_REFRESH_SECONDS = float(os.getenv('OPTIONS_CACHE_REFRESH_SECONDS', '300'))
+
+
+def seed_reference_options(collection):
+    """
+    Insert any missing default categories in one bulk write. Existing
+    categories are left untouched, so this is safe to run on every start
+    and from several workers at once.
+    """
+    result = collection.bulk_write([
+        UpdateOne({"category": category}, {"$setOnInsert": {"options": options}}, upsert=True)
+        for category, options in DEFAULT_REFERENCE_OPTIONS.items()
+    ], ordered=False)
+    return result.upserted_count > 0
+
+
+def _etag(value):
+    payload = json.dumps(value, sort_keys=True).encode('utf-8')
+    return hashlib.sha1(payload).hexdigest()
+
+
+class OptionsCache:
+    """
+    All reference option categories held in memory. The version counter is
+    bumped by invalidate(), called from the change-stream watcher when
+    available, and the data is reloaded from Mongo on the next read.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.version = 0
+        self._lock = threading.Lock()
+        self._options = None
+        self._etags = {}
+        self._loaded_at = 0.0
+        self._watching = False
+
+    def _load(self):
+        options = {category: list(values) for category, values in DEFAULT_REFERENCE_OPTIONS.items()}
+        for document in self.collection.find({"category": {"$in": VALID_CATEGORIES}}):
+            options[document["category"]] = document.get("options", [])
+
+        # ETags come from the content, so they agree across worker processes
+        etags = {category: _etag(values) for category, values in options.items()}
+        etags[None] = _etag(options)
+        return options, etags
+
+    def _snapshot(self):
+        """Current (options, etags), reloading first if invalidated or stale"""
+        with self._lock:
+            stale = (
+                not self._watching
+                and time.monotonic() - self._loaded_at > OPTIONS_CACHE_REFRESH_SECONDS
+            )
+            if self._options is None or stale:
+                self._options, self._etags = self._load()
+                self._loaded_at = time.monotonic()
+            return self._options, self._etags
+
+    def get(self, category):
+        """(options, etag) for one category"""
+        options, etags = self._snapshot()
+        return options.get(category, []), etags.get(category)
+
+    def get_all(self):
+        """(options by category, etag) for every category"""
+        options, etags = self._snapshot()
+        return options, etags[None]
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+            self._options = None
+
+    def watch_changes(self):
+        """
+        Invalidate on every change to the collection via a change stream.
+        Change streams need a replica set; on a standalone server the cache
+        falls back to reloading every OPTIONS_CACHE_REFRESH_SECONDS.
+        """
+        def run():
+            try:
+                with self.collection.watch() as stream:
+                    self._watching = True
+                    for _ in stream:
+                        self.invalidate()
+            except Exception as e:
+                print(f"Reference options change stream unavailable: {str(e)}")
+            finally:
+                if self._watching:
+                    self._watching = False
+                    self.invalidate()
+
+        threading.Thread(target=run, name="options-watch", daemon=True).start()
@@ -0,0 +1,273 @@
+# Deadlines, jittered retries, hedged requests and a circuit breaker for
+# calls to a flaky upstream (the Gemini API in model.py)
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling upstream while the circuit breaker is open"""
+
+
+class DeadlineExceeded(TimeoutError):
+    """The call did not succeed within its deadline"""
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures and rejects calls for
+    reset_seconds, then lets a single probe call through (half-open): its
+    success closes the circuit, its failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_seconds=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._stats = {"opened": 0, "rejected": 0}
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == "open" and time.monotonic() - self._opened_at >= self.reset_seconds:
+            self._state = "half_open"
+            self._probe_in_flight = False
+        return self._state
+
+    def allow(self):
+        """True if a call may go upstream now"""
+        with self._lock:
+            state = self._current_state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self._stats["rejected"] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = "closed"
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            state = self._current_state()
+            if state == "half_open" or (state == "closed" and self._failures >= self.failure_threshold):
+                self._state = "open"
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+                self._stats["opened"] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            state = self._current_state()
+            stats.update({
+                "open": state == "open",
+                "half_open": state == "half_open",
+                "consecutive_failures": self._failures
+            })
+        return stats
+
+
+class LatencyTracker:
+    """Recent successful call latencies, for the hedging threshold"""
+
+    def __init__(self, window=200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct, min_samples=1):
+        with self._lock:
+            if len(self._samples) < min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class ResilientCall:
+    """
+    Runs one kind of upstream call with:
+      - a deadline covering every attempt, retry backoff and hedge
+      - up to max_attempts tries with full-jitter exponential backoff, only
+        for errors retryable(exc) accepts and only while the deadline allows
+      - optional hedging: if an attempt is still running after the recent
+        p95 latency, a second identical request is sent and the first
+        response wins
+      - a circuit breaker (may be shared between calls to the same upstream)
+    Outcomes are counted in counter(name, outcome) when a counter is given.
+    Sync calls run on executor so the deadline can be enforced; an attempt
+    that overruns it keeps its thread until the upstream call returns.
+    """
+
+    def __init__(self, name, executor, breaker, deadline_seconds=8.0, max_attempts=3,
+                 backoff_seconds=0.2, hedge=False, hedge_percentile=95, hedge_min_samples=20,
+                 retryable=None, counter=None):
+        self.name = name
+        self.executor = executor
+        self.breaker = breaker
+        self.deadline_seconds = deadline_seconds
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.retryable = retryable or (lambda exc: True)
+        self.counter = counter
+        self.latency = LatencyTracker()
+
+    def _count(self, outcome):
+        if self.counter is not None:
+            self.counter.inc(self.name, outcome)
+
+    def _hedge_after(self):
+        if not self.hedge:
+            return None
+        return self.latency.percentile(self.hedge_percentile, self.hedge_min_samples)
+
+    def _backoff(self, attempt):
+        return random.uniform(0, self.backoff_seconds * (2 ** (attempt - 1)))
+
+    def _should_retry(self, exc, attempt, deadline, backoff):
+        if isinstance(exc, DeadlineExceeded) or attempt >= self.max_attempts:
+            return False
+        if not self.retryable(exc):
+            return False
+        return time.monotonic() + backoff < deadline
+
+    def _timed(self, func):
+        start = time.perf_counter()
+        result = func()
+        self.latency.add(time.perf_counter() - start)
+        return result
+
+    def call(self, func):
+        """func() with deadline, retries, hedging and the breaker; raises on failure"""
+        if not self.breaker.allow():
+            self._count("short_circuit")
+            raise CircuitOpenError(f"{self.name}: circuit open")
+
+        deadline = time.monotonic() + self.deadline_seconds
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                result = self._attempt(func, deadline)
+            except Exception as e:
+                self.breaker.record_failure()
+                self._count("timeout" if isinstance(e, DeadlineExceeded) else "error")
+                backoff = self._backoff(attempt)
+                if not self._should_retry(e, attempt, deadline, backoff) or not self.breaker.allow():
+                    raise
+                self._count("retry")
+                time.sleep(backoff)
+                continue
+            self.breaker.record_success()
+            self._count("success")
+            return result
+
+    def _attempt(self, func, deadline):
+        pending = {self.executor.submit(self._timed, func)}
+        hedge_after = self._hedge_after()
+        hedge_at = time.monotonic() + hedge_after if hedge_after is not None else None
+        hedged = None
+
+        error = None
+        while pending:
+            now = time.monotonic()
+            if now >= deadline:
+                raise DeadlineExceeded(f"{self.name}: no response within {self.deadline_seconds}s")
+            wake_at = min(deadline, hedge_at) if hedge_at is not None else deadline
+            done, pending = wait(pending, timeout=wake_at - now, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if hedged is not None:
+                        self._count("hedge_won" if future is hedged else "hedge_lost")
+                    return future.result()
+                error = future.exception()
+            if hedge_at is not None and not done and time.monotonic() >= hedge_at:
+                # Still waiting past the usual latency: race a second request
+                self._count("hedge")
+                hedged = self.executor.submit(self._timed, func)
+                pending.add(hedged)
+                hedge_at = None
+        raise error
+
+    async def call_async(self, coroutine_factory):
+        """Async call(): coroutine_factory() makes a fresh upstream coroutine per attempt"""
+        if not self.breaker.allow():
+            self._count("short_circuit")
+            raise CircuitOpenError(f"{self.name}: circuit open")
+
+        deadline = time.monotonic() + self.deadline_seconds
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                result = await self._attempt_async(coroutine_factory, deadline)
+            except Exception as e:
+                self.breaker.record_failure()
+                self._count("timeout" if isinstance(e, DeadlineExceeded) else "error")
+                backoff = self._backoff(attempt)
+                if not self._should_retry(e, attempt, deadline, backoff) or not self.breaker.allow():
+                    raise
+                self._count("retry")
+                await asyncio.sleep(backoff)
+                continue
+            self.breaker.record_success()
+            self._count("success")
+            return result
+
+    async def _timed_async(self, coroutine_factory):
+        start = time.perf_counter()
+        result = await coroutine_factory()
+        self.latency.add(time.perf_counter() - start)
+        return result
+
+    async def _attempt_async(self, coroutine_factory, deadline):
+        pending = {asyncio.ensure_future(self._timed_async(coroutine_factory))}
+        hedge_after = self._hedge_after()
+        hedge_at = time.monotonic() + hedge_after if hedge_after is not None else None
+        hedged = None
+        try:
+            error = None
+            while pending:
+                now = time.monotonic()
+                if now >= deadline:
+                    raise DeadlineExceeded(f"{self.name}: no response within {self.deadline_seconds}s")
+                wake_at = min(deadline, hedge_at) if hedge_at is not None else deadline
+                done, pending = await asyncio.wait(pending, timeout=wake_at - now, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if hedged is not None:
+                            self._count("hedge_won" if task is hedged else "hedge_lost")
+                        return task.result()
+                    error = task.exception()
+                if hedge_at is not None and not done and time.monotonic() >= hedge_at:
+                    self._count("hedge")
+                    hedged = asyncio.ensure_future(self._timed_async(coroutine_factory))
+                    pending.add(hedged)
+                    hedge_at = None
+            raise error
+        finally:
+            # Unlike threads, losing or overdue async requests can be cancelled
+            for task in pending:
+                task.cancel()
@@ -0,0 +1,173 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+
+def _to_number(value):
+    """Convert a vitals value from the intake form to a float, or None"""
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _round_to(value, step):
+    number = _to_number(value)
+    if number is None:
+        return None
+    return round(round(number / step) * step, 1)
+
+
+def canonical_blood_pressure(bloodPressure):
+    """Normalize '120 / 80', '120/80.0' etc. to '120/80' ('N/A' if unusable)"""
+    if not bloodPressure or not isinstance(bloodPressure, str) or '/' not in bloodPressure:
+        return "N/A"
+    systolic, _, diastolic = bloodPressure.partition('/')
+    systolic, diastolic = _to_number(systolic.strip()), _to_number(diastolic.strip())
+    if systolic is None or diastolic is None:
+        return "N/A"
+    return f"{int(round(systolic))}/{int(round(diastolic))}"
+
+
+def normalize_symptoms(symptoms):
+    """
+    Split the intake symptom text into a sorted symptom list plus free-text notes
+    so 'Cough, Fever' and 'fever, cough' share a cache entry
+    """
+    text = (symptoms or '').strip()
+    selected, _, notes = text.partition('. Additional notes:')
+    symptom_list = sorted({s.strip().lower() for s in selected.split(',') if s.strip()})
+    return symptom_list, ' '.join(notes.lower().split())
+
+
+def normalize_inputs(temperature, pulse, respiration, bloodPressure, symptoms):
+    """Normalized form of the model inputs used to build cache keys"""
+    symptom_list, notes = normalize_symptoms(symptoms)
+    return {
+        "temperature": _round_to(temperature, 0.1),
+        "pulse": _round_to(pulse, 1),
+        "respiration": _round_to(respiration, 1),
+        "bloodPressure": canonical_blood_pressure(bloodPressure),
+        "symptoms": symptom_list,
+        "notes": notes
+    }
+
+
+def make_key(kind, temperature, pulse, respiration, bloodPressure, symptoms):
+    """Content-addressed key for a model request of the given kind"""
+    normalized = normalize_inputs(temperature, pulse, respiration, bloodPressure, symptoms)
+    payload = json.dumps({"kind": kind, "inputs": normalized}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class TriageCache:
+    """
+    Two-tier cache for model responses: an in-process LRU with a TTL,
+    optionally backed by a Mongo collection so entries survive restarts
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=3600, collection=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.collection = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "memory_hits": 0,
+            "mongo_hits": 0,
+            "evictions": 0,
+            "expired": 0
+        }
+        if collection is not None:
+            self.attach_collection(collection)
+
+    def attach_collection(self, collection):
+        """Use a Mongo collection as the persistent second tier"""
+        try:
+            # Mongo removes expired documents on its own through the TTL index
+            collection.create_index("expiresAt", expireAfterSeconds=0)
+            self.collection = collection
+        except Exception as e:
+            print(f"Triage cache: persistent tier disabled: {str(e)}")
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    self._stats["memory_hits"] += 1
+                    return value
+                del self._entries[key]
+                self._stats["expired"] += 1
+
+        value = self._get_persistent(key)
+        with self._lock:
+            if value is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["hits"] += 1
+            self._stats["mongo_hits"] += 1
+        self._set_memory(key, value)
+        return value
+
+    def set(self, key, value):
+        """Store value in both tiers"""
+        self._set_memory(key, value)
+        if self.collection is not None:
+            try:
+                self.collection.replace_one(
+                    {"_id": key},
+                    {
+                        "_id": key,
+                        "value": value,
+                        "expiresAt": datetime.utcnow() + timedelta(seconds=self.ttl_seconds)
+                    },
+                    upsert=True
+                )
+            except Exception as e:
+                print(f"Triage cache: failed to persist entry: {str(e)}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        stats["max_entries"] = self.max_entries
+        stats["ttl_seconds"] = self.ttl_seconds
+        stats["persistent"] = self.collection is not None
+        return stats
+
+    def _set_memory(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def _get_persistent(self, key):
+        if self.collection is None:
+            return None
+        try:
+            doc = self.collection.find_one({"_id": key, "expiresAt": {"$gt": datetime.utcnow()}})
+        except Exception as e:
+            print(f"Triage cache: persistent lookup failed: {str(e)}")
+            return None
+        return doc.get("value") if doc else None
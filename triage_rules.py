@@ -0,0 +1,234 @@
+# Deterministic ESI rules that settle clear-cut presentations locally,
+# before any model call. Anything the rules cannot decide goes to the model.
+import threading
+
+import numpy as np
+
+from triage_cache import normalize_symptoms
+
+# Vitals that on their own make a presentation ESI 1.
+# (field, comparison, threshold, explanation); temperature is in °F
+CRITICAL_RULES = [
+    ("pulse", ">", 150, "pulse above 150 bpm"),
+    ("pulse", "<", 40, "pulse below 40 bpm"),
+    ("respiration", "<", 8, "respiration rate below 8/min"),
+    ("respiration", ">", 35, "respiration rate above 35/min"),
+    ("systolic", "<", 80, "systolic blood pressure below 80 mmHg"),
+    ("temperature", ">=", 106, "temperature of 106°F or higher"),
+    ("temperature", "<", 90, "temperature below 90°F"),
+]
+
+# Inclusive ranges every vital must fall in for the low-acuity fast path
+NORMAL_RANGES = {
+    "temperature": (97.0, 99.5),
+    "pulse": (60, 100),
+    "respiration": (12, 20),
+    "systolic": (90, 140),
+    "diastolic": (60, 90),
+}
+
+# Single complaints that, with normal vitals and no notes, need no resources
+MINOR_SYMPTOMS = {
+    "cough", "sore throat", "fatigue", "headache", "muscle aches", "loss of taste/smell"
+}
+
+VITAL_FIELDS = ["temperature", "pulse", "respiration", "systolic", "diastolic"]
+
+_OPERATORS = {
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "<": lambda a, b: a < b,
+}
+
+_stats_lock = threading.Lock()
+_stats = {
+    "evaluated": 0,
+    "fast_path": 0,
+    "fast_path_esi_1": 0,
+    "fast_path_esi_5": 0,
+    "model_fallthrough": 0,
+    # Re-triages after an update, counted apart so the above stay per intake
+    "retriage_evaluated": 0,
+    "retriage_fast_path": 0
+}
+
+
+def _to_number(value):
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_vitals(temperature, pulse, respiration, bloodPressure):
+    """Numeric vitals keyed by VITAL_FIELDS (None where missing or unparseable)"""
+    systolic = diastolic = None
+    if isinstance(bloodPressure, str) and '/' in bloodPressure:
+        sys_text, _, dia_text = bloodPressure.partition('/')
+        systolic, diastolic = _to_number(sys_text.strip()), _to_number(dia_text.strip())
+    return {
+        "temperature": _to_number(temperature),
+        "pulse": _to_number(pulse),
+        "respiration": _to_number(respiration),
+        "systolic": systolic,
+        "diastolic": diastolic
+    }
+
+
+def _record(esi):
+    with _stats_lock:
+        _stats["evaluated"] += 1
+        if esi is None:
+            _stats["model_fallthrough"] += 1
+        else:
+            _stats["fast_path"] += 1
+            _stats[f"fast_path_esi_{esi}"] += 1
+
+
+def record_retriage(esi):
+    """Count one re-triage decision (esi None if the model decides)"""
+    with _stats_lock:
+        _stats["retriage_evaluated"] += 1
+        if esi is not None:
+            _stats["retriage_fast_path"] += 1
+
+
+def is_minor_complaint(symptoms):
+    symptom_list, notes = normalize_symptoms(symptoms)
+    return len(symptom_list) == 1 and symptom_list[0] in MINOR_SYMPTOMS and not notes
+
+
+def critical_findings(vitals):
+    """Explanations of the CRITICAL_RULES triggered by parsed vitals"""
+    return [
+        explanation for field, op, threshold, explanation in CRITICAL_RULES
+        if vitals[field] is not None and _OPERATORS[op](vitals[field], threshold)
+    ]
+
+
+def fast_path_explanation(esi, vitals):
+    """Explanation text for a level decided by the rules"""
+    if esi == 1:
+        return "Life-threatening vital signs: " + "; ".join(critical_findings(vitals))
+    return "Normal vital signs with a single minor complaint; no resources expected"
+
+
+def rule_based_triage(temperature, pulse, respiration, bloodPressure, symptoms, record=True):
+    """
+    Decide the ESI level locally when the case is unambiguous
+    record=False leaves the intake counters alone (see record_retriage)
+    Returns:
+        tuple: (esi, explanation), or None if the model should decide
+    """
+    vitals = parse_vitals(temperature, pulse, respiration, bloodPressure)
+
+    esi = None
+    if critical_findings(vitals):
+        esi = 1
+    elif all(
+        vitals[field] is not None and low <= vitals[field] <= high
+        for field, (low, high) in NORMAL_RANGES.items()
+    ) and is_minor_complaint(symptoms):
+        esi = 5
+
+    if record:
+        _record(esi)
+    return (esi, fast_path_explanation(esi, vitals)) if esi else None
+
+
+def provisional_triage(temperature, pulse, respiration, bloodPressure, symptoms):
+    """
+    Conservative ESI estimate from the vitals alone, used when the model is
+    unavailable. Never below ESI 3 unless the fast path would allow it.
+    Returns:
+        tuple: (esi, explanation)
+    """
+    vitals = parse_vitals(temperature, pulse, respiration, bloodPressure)
+    critical = critical_findings(vitals)
+    if critical:
+        return 1, fast_path_explanation(1, vitals)
+
+    abnormal = [
+        field for field, (low, high) in NORMAL_RANGES.items()
+        if vitals[field] is not None and not low <= vitals[field] <= high
+    ]
+    if not abnormal and all(vitals[field] is not None for field in NORMAL_RANGES) and is_minor_complaint(symptoms):
+        return 5, fast_path_explanation(5, vitals)
+
+    esi = 2 if len(abnormal) >= 2 else 3
+    findings = f"abnormal {', '.join(abnormal)}" if abnormal else "no abnormal vital signs"
+    return esi, f"Provisional estimate while the triage model is unavailable ({findings}); confirm by nurse assessment"
+
+
+def rule_based_triage_many(vitals_matrix, minor_complaint):
+    """
+    Vectorized form of rule_based_triage for a batch of patients
+    Args:
+        vitals_matrix (np.ndarray): shape (n, 5), columns in VITAL_FIELDS order,
+            NaN where a vital is missing
+        minor_complaint (np.ndarray): shape (n,), True where the patient has a
+            single minor complaint and no notes
+    Returns:
+        np.ndarray: ESI level per patient, 0 where the model should decide
+    """
+    vitals_matrix = np.asarray(vitals_matrix, dtype=float)
+    columns = {field: vitals_matrix[:, i] for i, field in enumerate(VITAL_FIELDS)}
+
+    # Comparisons against NaN are False, so missing vitals never trigger a rule
+    with np.errstate(invalid='ignore'):
+        critical = np.zeros(len(vitals_matrix), dtype=bool)
+        for field, op, threshold, _ in CRITICAL_RULES:
+            critical |= _OPERATORS[op](columns[field], threshold)
+
+        normal = np.ones(len(vitals_matrix), dtype=bool)
+        for field, (low, high) in NORMAL_RANGES.items():
+            normal &= (columns[field] >= low) & (columns[field] <= high)
+
+    esi = np.zeros(len(vitals_matrix), dtype=int)
+    esi[normal & np.asarray(minor_complaint, dtype=bool)] = 5
+    esi[critical] = 1
+
+    with _stats_lock:
+        _stats["evaluated"] += len(esi)
+        _stats["fast_path"] += int(np.count_nonzero(esi))
+        _stats["fast_path_esi_1"] += int(np.count_nonzero(esi == 1))
+        _stats["fast_path_esi_5"] += int(np.count_nonzero(esi == 5))
+        _stats["model_fallthrough"] += int(np.count_nonzero(esi == 0))
+    return esi
+
+
+def rule_based_triage_batch(inputs_list):
+    """
+    rule_based_triage for many patients with a single vectorized rules pass
+    Args:
+        inputs_list (list): (temperature, pulse, respiration, bloodPressure, symptoms) per patient
+    Returns:
+        list: (esi, explanation) per patient, or None where the model should decide
+    """
+    if not inputs_list:
+        return []
+
+    parsed = [parse_vitals(*inputs[:4]) for inputs in inputs_list]
+    vitals_matrix = [
+        [np.nan if vitals[field] is None else vitals[field] for field in VITAL_FIELDS]
+        for vitals in parsed
+    ]
+    minor_complaint = [is_minor_complaint(inputs[4]) for inputs in inputs_list]
+    levels = rule_based_triage_many(vitals_matrix, minor_complaint)
+
+    return [
+        (int(esi), fast_path_explanation(int(esi), vitals)) if esi else None
+        for esi, vitals in zip(levels, parsed)
+    ]
+
+
+def get_rule_stats():
+    """Counters for how many intakes (and, separately, re-triages) the rules settled locally"""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["fast_path_ratio"] = (
+        round(stats["fast_path"] / stats["evaluated"], 3) if stats["evaluated"] else 0.0
+    )
+    return stats
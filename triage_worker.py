@@ -0,0 +1,105 @@
+import itertools
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+
+class TriageWorkerPool:
+    """
+    Bounded pool of background threads draining a queue of triage jobs.
+    Each job is (job_id, payload) and is handed to process_job(job_id, payload).
+    """
+
+    def __init__(self, process_job, num_workers=4, max_queue_size=500):
+        self.process_job = process_job
+        self.num_workers = num_workers
+        self.max_queue_size = max_queue_size
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        # Keyed by a per-submission ticket, since one job_id (patient) can be
+        # queued again while an earlier job for it is still waiting or running
+        self._tickets = itertools.count()
+        # ticket -> (job_id, enqueue time (monotonic)) for jobs not yet picked up
+        self._waiting = OrderedDict()
+        # ticket -> job_id for running jobs
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._threads = []
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0}
+
+    def start(self):
+        """Start the worker threads (idempotent)"""
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.num_workers):
+                thread = threading.Thread(
+                    target=self._run, name=f"triage-worker-{i}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, job_id, payload):
+        """
+        Queue a job without blocking
+        Returns:
+            bool: False if the queue is full and the job was not accepted
+        """
+        self.start()
+        with self._lock:
+            ticket = next(self._tickets)
+            try:
+                self._queue.put_nowait((ticket, job_id, payload))
+            except queue.Full:
+                self._stats["rejected"] += 1
+                return False
+            self._waiting[ticket] = (job_id, time.monotonic())
+            self._stats["submitted"] += 1
+        return True
+
+    def position(self, job_id):
+        """
+        1-based position of the latest waiting job for job_id, 0 if one is
+        running and none is waiting, None if unknown
+        """
+        with self._lock:
+            position = None
+            for i, (waiting_id, _) in enumerate(self._waiting.values(), start=1):
+                if waiting_id == job_id:
+                    position = i
+            if position is None and job_id in self._in_flight.values():
+                return 0
+        return position
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            oldest = next((enqueued for _, enqueued in self._waiting.values()), None)
+            stats = dict(self._stats)
+            stats.update({
+                "depth": len(self._waiting),
+                "in_flight": len(self._in_flight),
+                "oldest_age_seconds": round(now - oldest, 3) if oldest is not None else 0.0,
+                "workers": self.num_workers,
+                "max_queue_size": self.max_queue_size
+            })
+        return stats
+
+    def _run(self):
+        while True:
+            ticket, job_id, payload = self._queue.get()
+            with self._lock:
+                self._waiting.pop(ticket, None)
+                self._in_flight[ticket] = job_id
+            try:
+                self.process_job(job_id, payload)
+                succeeded = True
+            except Exception as e:
+                print(f"Triage job {job_id} failed: {str(e)}")
+                succeeded = False
+            finally:
+                with self._lock:
+                    self._in_flight.pop(ticket, None)
+                self._queue.task_done()
+            with self._lock:
+                self._stats["completed" if succeeded else "failed"] += 1